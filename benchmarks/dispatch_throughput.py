@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Compare the throughput of dispatching handler invocations on the default asyncio event loop and on uvloop.
+
+Usage: python benchmarks/dispatch_throughput.py [--messages N] [--max-in-flight N]
+"""
+import argparse
+import asyncio
+import time
+
+from nitric.bidi import BoundedAsyncQueue
+from nitric.dispatch import Dispatcher
+from nitric.event_loop import resolve_loop_factory
+
+
+async def dispatch(messages: int, max_in_flight: int) -> float:
+    """Dispatch messages through a Dispatcher and a response queue, returning the messages handled per second."""
+    dispatcher = Dispatcher(max_in_flight=max_in_flight, name="benchmark")
+    responses: BoundedAsyncQueue[int] = BoundedAsyncQueue()
+
+    async def handler(message: int) -> None:
+        await asyncio.sleep(0)
+        await responses.add_item(message)
+
+    async def send() -> None:
+        sent = 0
+        async for _ in responses:
+            sent += 1
+            if sent == messages:
+                return
+
+    sender = asyncio.ensure_future(send())
+    started = time.perf_counter()
+    for message in range(messages):
+        await dispatcher.submit(handler, message)
+    await dispatcher.join()
+    await sender
+    return messages / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """Run the benchmark on each available event loop."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--max-in-flight", type=int, default=100)
+    args = parser.parse_args()
+
+    for name in ("asyncio", "uvloop"):
+        factory = resolve_loop_factory(name)
+        if name != "asyncio" and factory is None:
+            continue
+        with asyncio.Runner(loop_factory=factory) as runner:
+            rate = runner.run(dispatch(args.messages, args.max_in_flight))
+        print(f"{name:<8} {rate:>12,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
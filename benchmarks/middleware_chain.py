@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Measure the per-request overhead of a composed middleware chain.
+
+The chain linked once by compose_middleware is compared with the previous implementation, which re-linked the chain
+with functools.reduce on every request.
+
+Usage: python benchmarks/middleware_chain.py [--requests N] [--middleware N]
+"""
+import argparse
+import asyncio
+import functools
+import time
+from typing import Any, Callable, List, Optional
+
+from nitric.context import HttpContext, HttpRequest, _convert_to_middleware, compose_middleware
+
+
+def compose_with_reduce(*middlewares: Any) -> Callable[..., Any]:
+    """Compose middleware the way compose_middleware did before chains were linked up front."""
+    converted = [_convert_to_middleware(middleware) for middleware in middlewares]
+
+    async def composed(ctx: Any, nxt: Optional[Any] = None) -> Any:
+        def reduce_chain(acc_next: Any, cur: Any) -> Any:
+            async def chained_middleware(ctx: Any, nxt: Optional[Any] = None) -> Any:
+                result = (await nxt(ctx)) if nxt is not None else ctx
+                output_context = await cur(result, acc_next)
+                if not output_context:
+                    return result
+                return output_context
+
+            return chained_middleware
+
+        middleware_chain = functools.reduce(reduce_chain, reversed(converted), nxt)
+        return await middleware_chain(ctx)
+
+    return composed
+
+
+async def passthrough(ctx: HttpContext, nxt: Any) -> HttpContext:
+    """Do nothing but call the next middleware."""
+    return await nxt(ctx)
+
+
+async def handler(ctx: HttpContext) -> HttpContext:
+    """Respond with an empty body."""
+    ctx.res.body = b""
+    return ctx
+
+
+async def measure(composed: Callable[..., Any], requests: int) -> float:
+    """Call the composed chain for each request, returning the mean time per request in microseconds."""
+    contexts: List[HttpContext] = [
+        HttpContext(HttpRequest(data=b"", method="GET", path="/", params={}, query={}, headers={}))
+        for _ in range(requests)
+    ]
+    started = time.perf_counter()
+    for ctx in contexts:
+        await composed(ctx)
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+def main() -> None:
+    """Run the benchmark for both implementations."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--middleware", type=int, default=8)
+    args = parser.parse_args()
+
+    chain = [passthrough] * args.middleware + [handler]
+    for name, compose in (("reduce per request", compose_with_reduce), ("linked once", compose_middleware)):
+        per_request = asyncio.run(measure(compose(*chain), args.requests))
+        print(f"{name:<20} {per_request:>8.2f}us per request")
+
+
+if __name__ == "__main__":
+    main()
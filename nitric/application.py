@@ -17,18 +17,70 @@
 # limitations under the License.
 #
 import asyncio
-from typing import Any, Dict, List, Type, TypeVar
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Any, Dict, List, Optional, Type, TypeVar
 
+from nitric.config import settings
 from nitric.context import FunctionServer
+from nitric.event_loop import LoopFactory, resolve_loop_factory
 from nitric.exception import NitricUnavailableException
+from nitric.monitor import LoopLagMonitor
 
 BT = TypeVar("BT")
 
+_UNAVAILABLE_HINT = 'If you\'re running locally use "nitric start" or "nitric run" to start your application'
+
+
+class NitricHandle:
+    """A handle on the workers started by Nitric.start(), which run as tasks on the event loop that started them."""
+
+    _workers: asyncio.Future[Any]
+    _stopping: Optional[asyncio.Future[None]]
+
+    def __init__(self, workers: asyncio.Future[Any]):
+        """Construct a new NitricHandle for the gathered worker tasks."""
+        self._workers = workers
+        self._stopping = None
+
+    def done(self) -> bool:
+        """Return True once every worker has completed or been stopped."""
+        return self._workers.done()
+
+    async def wait(self) -> None:
+        """Wait until every worker has completed or been stopped, raising the first error raised by a worker."""
+        try:
+            await asyncio.shield(self._workers)
+        except asyncio.CancelledError:
+            # the workers being cancelled by stop() isn't an error, but the caller being cancelled is
+            if self._stopping is None or not self._workers.done():
+                raise
+        except ConnectionRefusedError as cre:
+            raise NitricUnavailableException(_UNAVAILABLE_HINT) from cre
+
+    async def stop(self, grace_period: Optional[float] = None) -> None:
+        """
+        Drain and stop the workers, then close the channel.
+
+        Workers stop accepting new messages and have up to grace_period seconds (NITRIC_DRAIN_GRACE_PERIOD by default)
+        to complete in-flight work. Calling stop again waits for the first call to complete.
+        """
+        if self._stopping is None:
+            self._stopping = asyncio.ensure_future(Nitric._drain(self._workers, grace_period))
+        await asyncio.shield(self._stopping)
+
 
 class Nitric:
     """Represents a nitric app."""
 
     _has_run = False
+    _min_process_restart_interval = 1.0
+    _max_process_restart_interval = 30.0
+    _loop_factory: Optional[LoopFactory] = None
+    _handle: Optional[NitricHandle] = None
 
     _workers: List[FunctionServer] = []
     _cache: Dict[str, Dict[str, Any]] = {
@@ -76,26 +128,209 @@ class Nitric:
         return cls._has_run
 
     @classmethod
-    def run(cls) -> None:
+    def run(cls, processes: Optional[int] = None, loop_factory: Optional[LoopFactory] = None) -> None:
         """
         Start the nitric application.
 
         This will execute in an existing event loop if there is one, otherwise it will attempt to create its own.
+
+        When processes is greater than 1 (or NITRIC_PROCESSES is set), that many worker processes are forked. Each one
+        opens its own channel and streams for every registered worker, so requests are balanced across them, and any
+        process that crashes is restarted.
+
+        When loop_factory is given (or NITRIC_EVENT_LOOP is set, e.g. to uvloop), the workers run on a new event loop
+        created by it.
         """
         if cls._has_run:
             print("The Nitric application has already been started, Nitric.run() should only be called once.")
         cls._has_run = True
+
+        cls._loop_factory = loop_factory if loop_factory is not None else resolve_loop_factory(settings.EVENT_LOOP)
+
+        if processes is None:
+            processes = settings.PROCESSES
+        if processes > 1:
+            cls._run_prefork(processes)
+            return
+
+        cls._run_workers()
+
+    @classmethod
+    def _run_workers(cls) -> None:
+        """Run every registered worker until they complete."""
         try:
-            try:
-                loop = asyncio.get_running_loop()
-            except RuntimeError:
-                loop = asyncio.get_event_loop()
+            if cls._loop_factory is not None:
+                loop = cls._loop_factory()
+                asyncio.set_event_loop(loop)
+            else:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = asyncio.get_event_loop()
 
-            loop.run_until_complete(asyncio.gather(*[wkr.start() for wkr in cls._workers]))
+            loop.run_until_complete(cls._serve_until_terminated())
         except KeyboardInterrupt:
 
             print("\nexiting")
         except ConnectionRefusedError as cre:
-            raise NitricUnavailableException(
-                'If you\'re running locally use "nitric start" or "nitric run" to start your application'
-            ) from cre
+            raise NitricUnavailableException(_UNAVAILABLE_HINT) from cre
+
+    @classmethod
+    async def start(cls) -> NitricHandle:
+        """
+        Start the nitric application on the running event loop, without blocking.
+
+        Every registered worker is started as a task on the current loop, so they can share it with other async
+        servers. The channel, which resources may have created on another loop when they were declared, is moved to
+        this loop. Use the returned handle, or Nitric.stop(), to stop them. When NITRIC_LOOP_LAG_THRESHOLD is set, the
+        loop is also monitored for handlers that block it for longer than that many seconds.
+        """
+        from nitric.channel import ChannelManager  # pylint: disable=import-outside-toplevel
+
+        if cls._handle is not None:
+            print("The Nitric application has already been started, Nitric.start() should only be called once.")
+            return cls._handle
+        cls._has_run = True
+        ChannelManager._bind_to_loop(asyncio.get_running_loop())
+
+        workers = asyncio.gather(*[wkr.start() for wkr in cls._workers])
+        if settings.LOOP_LAG_THRESHOLD > 0:
+            monitor = LoopLagMonitor()
+            monitor.start()
+            workers.add_done_callback(lambda _: monitor.stop())
+
+        cls._handle = NitricHandle(workers)
+        return cls._handle
+
+    @classmethod
+    async def stop(cls, grace_period: Optional[float] = None) -> None:
+        """Drain and stop the workers started by Nitric.start(), then close the channel, so it can be started again."""
+        if cls._handle is not None:
+            await cls._handle.stop(grace_period)
+            cls._handle = None
+
+    @classmethod
+    async def _serve_until_terminated(cls) -> None:
+        """Run every registered worker until they complete, draining them if the process receives SIGTERM."""
+        loop = asyncio.get_running_loop()
+        terminated = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, terminated.set)
+            handles_sigterm = True
+        except (NotImplementedError, RuntimeError, ValueError):
+            # signal handlers can only be added from the main thread, and not on every platform
+            handles_sigterm = False
+
+        handle = await cls.start()
+        completion = asyncio.ensure_future(handle.wait())
+        termination = asyncio.ensure_future(terminated.wait())
+        try:
+            await asyncio.wait([completion, termination], return_when=asyncio.FIRST_COMPLETED)
+            if terminated.is_set():
+                await handle.stop()
+            await completion
+        finally:
+            termination.cancel()
+            if handles_sigterm:
+                loop.remove_signal_handler(signal.SIGTERM)
+
+    @classmethod
+    async def _drain(cls, workers: asyncio.Future[Any], grace_period: Optional[float] = None) -> None:
+        """
+        Drain every registered worker, then close their streams and the channel.
+
+        Workers stop accepting new messages and have up to grace_period seconds (NITRIC_DRAIN_GRACE_PERIOD by default)
+        to complete in-flight work and send its responses.
+        """
+        from nitric.channel import ChannelManager  # pylint: disable=import-outside-toplevel
+
+        if grace_period is None:
+            grace_period = settings.DRAIN_GRACE_PERIOD
+
+        print(f"Draining workers, waiting up to {grace_period}s for in-flight work to complete")
+        await asyncio.gather(*[wkr.drain(grace_period) for wkr in cls._workers])
+
+        # every response has been sent, so the streams can be closed before the channel they share
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+        ChannelManager._close_channel()
+
+    @classmethod
+    def _run_worker_process(cls) -> None:
+        """Entrypoint for a forked worker process."""
+        # The channel and event loop inherited from the parent can't be shared, start with fresh ones.
+        from nitric.channel import ChannelManager  # pylint: disable=import-outside-toplevel
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        ChannelManager._detach()
+        if cls._loop_factory is None:
+            asyncio.set_event_loop(asyncio.new_event_loop())
+        cls._run_workers()
+
+    @classmethod
+    def _start_worker_process(cls, ctx: Any, index: int) -> BaseProcess:
+        proc = ctx.Process(target=cls._run_worker_process, name=f"nitric-worker-{index}")
+        proc.start()
+        return proc
+
+    @classmethod
+    def _run_prefork(cls, processes: int) -> None:
+        """
+        Fork the worker processes and supervise them, restarting any that crash.
+
+        Restarts back off exponentially, from 1 to 30 seconds. A process that keeps crashing is restarted up to
+        NITRIC_PROCESS_RESTART_LIMIT times in a row, then the others are stopped and this process exits with its exit
+        code. A process that ran for at least 30 seconds before crashing starts a new run of restarts.
+        """
+        ctx = multiprocessing.get_context("fork")
+        procs: Dict[int, BaseProcess] = {}
+        started: Dict[int, float] = {}
+        failures: Dict[int, int] = {}
+        for index in range(processes):
+            procs[index] = cls._start_worker_process(ctx, index)
+            started[index] = time.monotonic()
+            failures[index] = 0
+
+        def _terminate(_signum: int, _frame: Any) -> None:
+            # leave the supervision loop, the children are sent SIGTERM and drained below
+            raise SystemExit(0)
+
+        previous_handler = signal.signal(signal.SIGTERM, _terminate)
+        try:
+            while procs:
+                wait([proc.sentinel for proc in procs.values()])
+                for index, proc in list(procs.items()):
+                    if proc.exitcode is None:
+                        continue
+                    if proc.exitcode == 0:
+                        del procs[index]
+                        continue
+
+                    if time.monotonic() - started[index] >= cls._max_process_restart_interval:
+                        failures[index] = 0
+                    failures[index] += 1
+                    if failures[index] > settings.PROCESS_RESTART_LIMIT:
+                        print(
+                            f"Worker process {proc.name} exited with code {proc.exitcode} after "
+                            f"{settings.PROCESS_RESTART_LIMIT} restarts, exiting"
+                        )
+                        # a process killed by a signal has a negative exit code
+                        raise SystemExit(proc.exitcode if proc.exitcode > 0 else 1)
+
+                    delay = min(
+                        cls._min_process_restart_interval * 2 ** (failures[index] - 1),
+                        cls._max_process_restart_interval,
+                    )
+                    print(f"Worker process {proc.name} exited with code {proc.exitcode}, restarting in {delay}s")
+                    time.sleep(delay)
+                    procs[index] = cls._start_worker_process(ctx, index)
+                    started[index] = time.monotonic()
+        except KeyboardInterrupt:
+            print("\nexiting")
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            for proc in procs.values():
+                if proc.is_alive():
+                    proc.terminate()
+            for proc in procs.values():
+                proc.join()
@@ -0,0 +1,209 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, MutableMapping, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from nitric.proto.apis.v1 import HeaderValue
+from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
+from nitric.proto.apis.v1 import HttpResponse as ProtoHttpResponse
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+AsgiApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+_ASGI = {"version": "3.0", "spec_version": "2.3"}
+
+
+def http_scope(request: ProtoHttpRequest, root_path: str, state: Optional[Dict[str, Any]] = None) -> Scope:
+    """
+    Translate a request from the Nitric Membrane into an ASGI HTTP connection scope.
+
+    The membrane has already parsed the query string, so it's re-encoded from the query params and may differ from the
+    original in ordering and escaping.
+    """
+    headers: List[Tuple[bytes, bytes]] = [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for (name, header) in request.headers.items()
+        for value in header.value
+    ]
+    query = [(name, value) for (name, param) in request.query_params.items() for value in param.value]
+    scheme = next((value.decode("latin-1") for (name, value) in headers if name == b"x-forwarded-proto"), "http")
+
+    scope: Scope = {
+        "type": "http",
+        "asgi": _ASGI,
+        "http_version": "1.1",
+        "method": request.method.upper(),
+        "scheme": scheme,
+        "path": request.path,
+        "raw_path": request.path.encode("utf-8"),
+        "query_string": urlencode(query).encode("ascii"),
+        "root_path": root_path,
+        "headers": headers,
+        "client": None,
+        "server": None,
+    }
+    if state is not None:
+        scope["state"] = dict(state)
+    return scope
+
+
+class _ResponseCollector:
+    """Collects the events an ASGI app sends for a response into a single HttpResponse."""
+
+    status: Optional[int]
+    headers: Dict[str, HeaderValue]
+    chunks: List[bytes]
+    complete: asyncio.Event
+
+    def __init__(self):
+        self.status = None
+        self.headers = {}
+        self.chunks = []
+        self.complete = asyncio.Event()
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if self.status is not None:
+                raise RuntimeError("ASGI app started the response more than once")
+            self.status = message["status"]
+            for name, value in message.get("headers", []):
+                key = name.decode("latin-1")
+                if key in self.headers:
+                    self.headers[key].value.append(value.decode("latin-1"))
+                else:
+                    self.headers[key] = HeaderValue(value=[value.decode("latin-1")])
+        elif message["type"] == "http.response.body":
+            if self.status is None:
+                raise RuntimeError("ASGI app sent a response body before starting the response")
+            if self.complete.is_set():
+                raise RuntimeError("ASGI app sent a response body after completing the response")
+            body = message.get("body", b"")
+            if body:
+                self.chunks.append(body)
+            if not message.get("more_body", False):
+                self.complete.set()
+
+    def to_proto(self) -> ProtoHttpResponse:
+        if self.status is None:
+            raise RuntimeError("ASGI app returned without starting a response")
+        # joining a single chunk returns it as is
+        body = self.chunks[0] if len(self.chunks) == 1 else b"".join(self.chunks)
+        return ProtoHttpResponse(status=self.status, headers=self.headers, body=body)
+
+
+async def call_asgi(
+    app: AsgiApp, request: ProtoHttpRequest, root_path: str, state: Optional[Dict[str, Any]] = None
+) -> ProtoHttpResponse:
+    """
+    Serve a request from the Nitric Membrane with an ASGI app, and return the response it sent.
+
+    The request body is passed to the app as is, in a single http.request event, without being copied.
+    """
+    response = _ResponseCollector()
+    body_received = False
+
+    async def receive() -> Message:
+        nonlocal body_received
+        if not body_received:
+            body_received = True
+            return {"type": "http.request", "body": request.body, "more_body": False}
+        # the whole request has been received, the client disconnects once it has the response
+        await response.complete.wait()
+        return {"type": "http.disconnect"}
+
+    await app(http_scope(request, root_path, state), receive, response.send)
+    return response.to_proto()
+
+
+class Lifespan:
+    """
+    Runs an ASGI app's lifespan protocol, so its startup and shutdown handlers run with the worker serving it.
+
+    Apps that don't support the lifespan protocol raise on its scope, and are served without it.
+    """
+
+    app: AsgiApp
+    state: Dict[str, Any]
+    _events: asyncio.Queue[Message]
+    _startup: Optional[asyncio.Future[Optional[str]]]
+    _shutdown: Optional[asyncio.Future[Optional[str]]]
+    _task: Optional[asyncio.Task[None]]
+
+    def __init__(self, app: AsgiApp):
+        """Construct a new Lifespan for app."""
+        self.app = app
+        self.state = {}
+        self._events = asyncio.Queue()
+        self._startup = None
+        self._shutdown = None
+        self._task = None
+
+    async def startup(self) -> None:
+        """Run the app's startup handlers, raising RuntimeError if they fail."""
+        loop = asyncio.get_running_loop()
+        self._startup = loop.create_future()
+        self._shutdown = loop.create_future()
+        self._task = loop.create_task(self._run(), name="asgi lifespan")
+        await self._events.put({"type": "lifespan.startup"})
+        started: Set[asyncio.Future[Any]] = {self._startup, self._task}
+        await asyncio.wait(started, return_when=asyncio.FIRST_COMPLETED)
+        if not self._startup.done():
+            # the app returned or raised without completing startup, it doesn't support lifespan
+            self._task = None
+            return
+        failure = self._startup.result()
+        if failure is not None:
+            raise RuntimeError(f"ASGI app failed to start: {failure}")
+
+    async def shutdown(self) -> None:
+        """Run the app's shutdown handlers, if it started up."""
+        if self._task is None or self._shutdown is None or self._task.done():
+            return
+        await self._events.put({"type": "lifespan.shutdown"})
+        stopped: Set[asyncio.Future[Any]] = {self._shutdown, self._task}
+        await asyncio.wait(stopped, return_when=asyncio.FIRST_COMPLETED)
+        failure = self._shutdown.result() if self._shutdown.done() else None
+        if failure is not None:
+            logging.error("ASGI app failed to shut down: %s", failure)
+
+    async def _run(self) -> None:
+        scope: Scope = {"type": "lifespan", "asgi": _ASGI, "state": self.state}
+        try:
+            await self.app(scope, self._events.get, self._send)
+        except Exception as e:  # pylint: disable=broad-except
+            if self._startup is not None and self._startup.done():
+                logging.exception("An unhandled error occurred in an ASGI app's lifespan: %s", e)
+
+    async def _send(self, message: Message) -> None:
+        futures = {
+            "lifespan.startup.complete": (self._startup, None),
+            "lifespan.startup.failed": (self._startup, message.get("message", "")),
+            "lifespan.shutdown.complete": (self._shutdown, None),
+            "lifespan.shutdown.failed": (self._shutdown, message.get("message", "")),
+        }
+        future, failure = futures.get(message["type"], (None, None))
+        if future is not None and not future.done():
+            future.set_result(failure)
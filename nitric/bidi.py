@@ -17,31 +17,168 @@
 # limitations under the License.
 #
 import asyncio
-from typing import Generic, List, TypeVar
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Generic, Optional, TypeVar
+
+from nitric.config import settings
 
 T = TypeVar("T")
 
 
-class AsyncNotifierList(Generic[T]):
-    """An async iterable that notifies when new items are added."""
+class BoundedAsyncQueue(Generic[T]):
+    """
+    An async iterable FIFO queue with a maximum capacity.
+
+    Adding an item to a full queue waits until the consumer has made room for it, applying backpressure to the
+    producer instead of growing without bound. Once closed, iteration stops after the remaining items have been
+    consumed and new items are discarded.
+    """
+
+    capacity: int
+    items: Deque[T]
+    high_water_mark: int
+    closed: bool
+
+    def __init__(self, capacity: Optional[int] = None):
+        """Create a new BoundedAsyncQueue, defaulting to the configured response queue capacity."""
+        self.capacity = capacity if capacity is not None else settings.RESPONSE_QUEUE_CAPACITY
+        if self.capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.items = deque()
+        self.high_water_mark = 0
+        self.closed = False
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._empty = asyncio.Event()
+        self._empty.set()
+
+    @property
+    def depth(self) -> int:
+        """Return the number of items currently waiting in the queue."""
+        return len(self.items)
+
+    def close(self) -> None:
+        """Close the queue, ending iteration once it's empty."""
+        self.closed = True
+        self._not_empty.set()
+        self._not_full.set()
 
-    def __init__(self):
-        """Create a new AsyncNotifierList."""
-        self.items: List[T] = []  # type: ignore
-        self.new_item_event: asyncio.Event = asyncio.Event()  # type: ignore
+    async def flush(self) -> None:
+        """Wait until the consumer has taken every item currently in the queue."""
+        await self._empty.wait()
 
     async def add_item(self, item: T) -> None:
-        """Add a new item to the list."""
+        """Add a new item to the queue, waiting for space if it's full."""
+        while len(self.items) >= self.capacity and not self.closed:
+            await self._not_full.wait()
+        if self.closed:
+            return
         self.items.append(item)
-        self.new_item_event.set()
+        self.high_water_mark = max(self.high_water_mark, len(self.items))
+        if len(self.items) >= self.capacity:
+            self._not_full.clear()
+        self._empty.clear()
+        self._not_empty.set()
 
     def __aiter__(self):
         return self
 
-    async def __anext__(self):
+    async def __anext__(self) -> T:
         while not self.items:
-            await self.new_item_event.wait()  # Wait for an item to be added
-        item = self.items.pop(0)
+            if self.closed:
+                raise StopAsyncIteration
+            await self._not_empty.wait()  # Wait for an item to be added
+        item = self.items.popleft()
         if not self.items:
-            self.new_item_event.clear()  # Reset the event if there are no more items
+            self._empty.set()
+            if not self.closed:
+                self._not_empty.clear()  # Reset the event if there are no more items
+        self._not_full.set()
         return item
+
+
+# Retained for backwards compatibility, AsyncNotifierList was the original unbounded implementation.
+AsyncNotifierList = BoundedAsyncQueue
+
+
+class StreamSupervisor:
+    """
+    Keeps a worker's bidi stream open, re-opening it whenever it drops.
+
+    Reconnection attempts are spaced out using exponential backoff with full jitter, which resets once a new stream
+    has been registered. The number of restarts and the total time spent without a registered stream are tracked.
+    """
+
+    name: str
+    restarts: int
+    downtime: float
+    _stopped: bool
+    _attempt: int
+    _disconnected_at: Optional[float]
+    _has_connected: bool
+
+    def __init__(self, name: str):
+        """Construct a new StreamSupervisor for the named worker."""
+        self.name = name
+        self.restarts = 0
+        self.downtime = 0.0
+        self._stopped = False
+        self._attempt = 0
+        self._disconnected_at = None
+        self._has_connected = False
+
+    @property
+    def connected(self) -> bool:
+        """Return True if the current stream has been registered with the server."""
+        return self._has_connected and self._disconnected_at is None
+
+    def registered(self) -> None:
+        """Record that the current stream has been registered, resetting the backoff."""
+        if self._disconnected_at is not None:
+            self.downtime += time.monotonic() - self._disconnected_at
+            self._disconnected_at = None
+        self._has_connected = True
+        self._attempt = 0
+
+    @property
+    def stopped(self) -> bool:
+        """Return True once the supervisor has been stopped, e.g. because the worker is draining."""
+        return self._stopped
+
+    def stop(self) -> None:
+        """Stop re-opening the stream once the current one ends."""
+        self._stopped = True
+
+    def _backoff(self) -> float:
+        ceiling = min(
+            settings.STREAM_RECONNECT_MAX_BACKOFF, settings.STREAM_RECONNECT_INITIAL_BACKOFF * 2**self._attempt
+        )
+        self._attempt += 1
+        return random.uniform(0, ceiling)
+
+    async def run(self, serve: Callable[[], Awaitable[None]]) -> None:
+        """Run serve, which opens and handles a single stream, until the supervisor is stopped."""
+        while not self._stopped:
+            try:
+                await serve()
+                print(f"Stream for {self.name} closed by the server")
+            except ConnectionRefusedError:
+                # never reached the server at all, most likely it isn't running
+                if not self._has_connected:
+                    raise
+                print(f"Unable to reconnect stream for {self.name}")
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Stream for {self.name} terminated: {getattr(e, 'message', None) or repr(e)}")
+
+            if self._disconnected_at is None:
+                self._disconnected_at = time.monotonic()
+            if self._stopped:
+                break
+
+            delay = self._backoff()
+            print(f"Reconnecting stream for {self.name} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            self.restarts += 1
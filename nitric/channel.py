@@ -1,3 +1,4 @@
+import asyncio
 import atexit
 import re
 from urllib.parse import urlparse
@@ -36,6 +37,29 @@ class ChannelManager:
         cls.channel = Channel(host=channel_url.hostname, port=channel_url.port)
         atexit.register(cls._close_channel)
 
+    @classmethod
+    def _detach(cls):
+        """Forget the channel's connection without closing it, e.g. after forking, when it's shared with the parent."""
+        if cls.channel is not None:
+            # grpclib's Channel has a class level default of None for its connection
+            cls.channel.__dict__.pop("_protocol", None)
+
+    @classmethod
+    def _bind_to_loop(cls, loop: asyncio.AbstractEventLoop):
+        """
+        Move the channel to loop, closing its connection if it has one on another loop.
+
+        grpclib binds a channel to the event loop that was current when it was created, e.g. while resources were
+        declared, before Nitric.run() created the loop the workers run on. Resources and refs keep the channel they were
+        created with, so the same channel is moved, rather than replaced.
+        """
+        channel = cls.channel
+        if channel is None or channel._loop is loop:
+            return
+        channel.close()
+        channel._loop = loop
+        channel._connect_lock = asyncio.Lock()
+
     @classmethod
     def _close_channel(cls):
         """Close the channel instance."""
@@ -27,6 +27,21 @@ class Settings:
     def __init__(self):
         """Construct a new Nitric settings helper object."""
         self.SERVICE_ADDRESS = os.environ.get("SERVICE_ADDRESS", "127.0.0.1:50051")
+        self.PROCESSES = int(os.environ.get("NITRIC_PROCESSES", "1"))
+        self.PROCESS_RESTART_LIMIT = int(os.environ.get("NITRIC_PROCESS_RESTART_LIMIT", "5"))
+        self.RESPONSE_QUEUE_CAPACITY = int(os.environ.get("NITRIC_RESPONSE_QUEUE_CAPACITY", "1024"))
+        self.THREAD_POOL_SIZE = int(os.environ.get("NITRIC_THREAD_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+        self.ADAPTIVE_CONCURRENCY = os.environ.get("NITRIC_ADAPTIVE_CONCURRENCY", "false").lower() in ("1", "true")
+        self.CONCURRENCY_LIMIT_INITIAL = int(os.environ.get("NITRIC_CONCURRENCY_LIMIT_INITIAL", "20"))
+        self.CONCURRENCY_LIMIT_MIN = int(os.environ.get("NITRIC_CONCURRENCY_LIMIT_MIN", "1"))
+        self.CONCURRENCY_LIMIT_MAX = int(os.environ.get("NITRIC_CONCURRENCY_LIMIT_MAX", "1000"))
+        self.EVENT_LOOP = os.environ.get("NITRIC_EVENT_LOOP", "asyncio")
+        self.JSON_CODEC = os.environ.get("NITRIC_JSON_CODEC", "json")
+        self.LOOP_LAG_INTERVAL = float(os.environ.get("NITRIC_LOOP_LAG_INTERVAL", "0.5"))
+        self.LOOP_LAG_THRESHOLD = float(os.environ.get("NITRIC_LOOP_LAG_THRESHOLD", "0"))
+        self.DRAIN_GRACE_PERIOD = float(os.environ.get("NITRIC_DRAIN_GRACE_PERIOD", "30"))
+        self.STREAM_RECONNECT_INITIAL_BACKOFF = float(os.environ.get("NITRIC_STREAM_RECONNECT_INITIAL_BACKOFF", "0.1"))
+        self.STREAM_RECONNECT_MAX_BACKOFF = float(os.environ.get("NITRIC_STREAM_RECONNECT_MAX_BACKOFF", "30"))
 
 
 settings = Settings()
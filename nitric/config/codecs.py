@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Pluggable JSON codecs, used to encode and decode JSON throughout the SDK."""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import decimal
+import importlib.util
+import json
+import uuid
+from typing import Any, Callable, Dict, Optional, Protocol, Union
+
+from nitric.config import settings
+
+JsonInput = Union[bytes, bytearray, memoryview, str]
+TypeEncoder = Callable[[Any], Any]
+
+
+class JsonCodec(Protocol):
+    """Encodes values to JSON bytes and decodes them again, raising ValueError on invalid JSON."""
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode value as JSON."""
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a JSON document."""
+
+
+CodecFactory = Callable[[TypeEncoder], JsonCodec]
+
+_type_encoders: Dict[type, TypeEncoder] = {
+    datetime.datetime: datetime.datetime.isoformat,
+    datetime.date: datetime.date.isoformat,
+    datetime.time: datetime.time.isoformat,
+    decimal.Decimal: str,
+    uuid.UUID: str,
+}
+
+
+def _encode_type(value: Any) -> Any:
+    """Convert a value the codec can't encode itself, using the registered type encoders."""
+    for cls in type(value).__mro__:
+        encoder = _type_encoders.get(cls)
+        if encoder is not None:
+            return encoder(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StdlibJsonCodec:
+    """The standard library's json module."""
+
+    def __init__(self, default: TypeEncoder):
+        """Construct a new StdlibJsonCodec."""
+        self._encoder = json.JSONEncoder(default=default)
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode value as JSON."""
+        return self._encoder.encode(value).encode("utf-8")
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a JSON document."""
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+class OrjsonCodec:
+    """orjson, which encodes straight to bytes."""
+
+    def __init__(self, default: TypeEncoder):
+        """Construct a new OrjsonCodec."""
+        import orjson  # pylint: disable=import-outside-toplevel
+
+        self._orjson = orjson
+        self._default = default
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode value as JSON."""
+        return self._orjson.dumps(value, default=self._default)
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a JSON document."""
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec:
+    """msgspec's JSON encoder and decoder."""
+
+    def __init__(self, default: TypeEncoder):
+        """Construct a new MsgspecCodec."""
+        import msgspec  # pylint: disable=import-outside-toplevel
+
+        self._decode_error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder(enc_hook=default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode value as JSON."""
+        return self._encoder.encode(value)
+
+    def loads(self, data: JsonInput) -> Any:
+        """Decode a JSON document."""
+        try:
+            return self._decoder.decode(data)
+        except self._decode_error as e:
+            raise ValueError(str(e)) from e
+
+
+_codec_factories: Dict[str, CodecFactory] = {
+    "json": StdlibJsonCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+# optional codecs, in the order they're preferred when the codec is "auto"
+_optional_codecs = ["orjson", "msgspec"]
+_codec: Optional[JsonCodec] = None
+
+
+def register_json_codec(name: str, factory: CodecFactory) -> None:
+    """
+    Register a JSON codec, so it can be selected by name.
+
+    factory is called with the function that encodes the types registered with register_json_type, which the codec
+    should call for values it can't encode itself.
+    """
+    _codec_factories[name] = factory
+
+
+def register_json_type(cls: type, encoder: TypeEncoder) -> None:
+    """
+    Encode values of cls, and its subclasses, as the JSON compatible value encoder returns for them.
+
+    Codecs that natively support a type, such as orjson and msgspec do datetimes, encode it themselves.
+    """
+    _type_encoders[cls] = encoder
+
+
+def use_json_codec(name: str) -> JsonCodec:
+    """
+    Use the named JSON codec throughout the SDK, and return it.
+
+    The standard library's json module is used by default. "auto" uses orjson or msgspec, whichever is installed,
+    falling back to the standard library. Naming an optional codec that isn't installed falls back to the standard
+    library with a warning.
+
+    The optional codecs aren't drop-in replacements: they encode without whitespace between items, and raise on values
+    the json module accepts, such as dicts with keys that aren't strings and integers that don't fit in 64 bits.
+    """
+    global _codec  # pylint: disable=global-statement
+
+    if name == "auto":
+        name = next((codec for codec in _optional_codecs if importlib.util.find_spec(codec) is not None), "json")
+    elif name not in _codec_factories:
+        raise ValueError(f'Unknown JSON codec "{name}", expected auto, {", ".join(_codec_factories)}')
+    elif name in _optional_codecs and importlib.util.find_spec(name) is None:
+        print(
+            f"WARNING: the {name} JSON codec was requested but {name} isn't installed, using the standard library's "
+            f"json module. Install nitric[{name}] to use it."
+        )
+        name = "json"
+
+    _codec = _codec_factories[name](_encode_type)
+    return _codec
+
+
+def json_codec() -> JsonCodec:
+    """Return the JSON codec in use, defaulting to the configured codec."""
+    if _codec is None:
+        return use_json_codec(settings.JSON_CODEC)
+    return _codec
@@ -18,15 +18,16 @@
 #
 from __future__ import annotations
 
-import functools
+import asyncio
+import contextvars
 import inspect
-import json
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Any, Dict, Generic, List, Optional, Protocol, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Protocol, Sequence, TypeVar, Union
 
 from opentelemetry import propagate
 
+from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
 from nitric.proto.schedules.v1 import ServerMessage as ScheduleServerMessage
 from nitric.proto.topics.v1 import ClientMessage as TopicClientMessage
 from nitric.proto.topics.v1 import MessageResponse as TopicResponse
@@ -36,6 +37,8 @@ from nitric.proto.batch.v1 import (
     ClientMessage as BatchClientMessage,
     JobResponse as BatchJobResponse,
 )
+from nitric.config.codecs import json_codec
+from nitric.executor import handler_executor, middleware_executor
 from nitric.utils import dict_from_struct
 
 Record = Dict[str, Union[str, List[str]]]
@@ -72,40 +75,117 @@ class TriggerContext(Protocol):
 # ====== HTTP ======
 
 
+_UNPARSED: Any = object()
+
+
 class HttpRequest:
-    """Represents a translated Http Request forwarded from the Nitric Membrane."""
+    """
+    Represents a translated Http Request forwarded from the Nitric Membrane.
+
+    Requests from the membrane keep a reference to its message, its headers, query and params are only translated
+    when first accessed. The body's text and JSON are decoded once, on first access.
+    """
+
+    method: str
+    path: str
+    _data: bytes
+    _params: Optional[Dict[str, str]]
+    _query: Optional[Record]
+    _headers: Optional[Record]
+    _proto: Optional[ProtoHttpRequest]
+    _text: Optional[str]
+    _json: Any
 
     def __init__(
         self,
         data: bytes,
         method: str,
         path: str,
-        params: Dict[str, str],
-        query: Record,
-        headers: Record,
+        params: Optional[Dict[str, str]] = None,
+        query: Optional[Record] = None,
+        headers: Optional[Record] = None,
     ):
         """Construct a new HttpRequest."""
         self.data = data
         self.method = method
         self.path = path
-        self.params = params
-        self.query = query
-        self.headers = headers
+        self._params = params
+        self._query = query
+        self._headers = headers
+        self._proto = None
+
+    @staticmethod
+    def _from_proto(msg: ProtoHttpRequest) -> HttpRequest:
+        """Construct a new HttpRequest that translates the membrane's request message as it's accessed."""
+        request = HttpRequest(data=msg.body, method=msg.method, path=msg.path)
+        request._proto = msg
+        return request
+
+    @property
+    def data(self) -> bytes:
+        """Get the body of the request as bytes."""
+        return self._data
+
+    @data.setter
+    def data(self, value: bytes):
+        self._data = value
+        self._text = None
+        self._json = _UNPARSED
+
+    @property
+    def data_view(self) -> memoryview:
+        """Get the body of the request as a memoryview, which can be sliced without copying."""
+        return memoryview(self._data)
+
+    @property
+    def params(self) -> Dict[str, str]:
+        """Get the request's path params."""
+        if self._params is None:
+            self._params = dict(self._proto.path_params) if self._proto is not None else {}
+        return self._params
+
+    @params.setter
+    def params(self, value: Dict[str, str]):
+        self._params = value
+
+    @property
+    def query(self) -> Record:
+        """Get the request's query params."""
+        if self._query is None:
+            self._query = {k: v.value for (k, v) in self._proto.query_params.items()} if self._proto is not None else {}
+        return self._query
+
+    @query.setter
+    def query(self, value: Record):
+        self._query = value
+
+    @property
+    def headers(self) -> Record:
+        """Get the request's headers."""
+        if self._headers is None:
+            self._headers = {k: v.value for (k, v) in self._proto.headers.items()} if self._proto is not None else {}
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: Record):
+        self._headers = value
 
     @property
     def json(self) -> Optional[Any]:
         """Get the body of the request as JSON, returns None if request body is not JSON."""
-        try:
-            return json.loads(self.body)
-        except json.JSONDecodeError:
-            return None
-        except TypeError:
-            return None
+        if self._json is _UNPARSED:
+            try:
+                self._json = json_codec().loads(self._data)
+            except (ValueError, TypeError):
+                self._json = None
+        return self._json
 
     @property
     def body(self):
         """Get the body of the request as text."""
-        return self.data.decode("utf-8")
+        if self._text is None:
+            self._text = self._data.decode("utf-8")
+        return self._text
 
 
 class HttpResponse:
@@ -129,7 +209,7 @@ class HttpResponse:
         elif isinstance(value, bytes):
             self._body = value
         else:
-            self._body = json.dumps(value).encode("utf-8")
+            self._body = json_codec().dumps(value)
             self.headers["Content-Type"] = ["application/json"]
 
 
@@ -317,14 +397,73 @@ IntervalHandler = Handler[IntervalContext]
 WebsocketHandler = Handler[WebsocketContext]
 
 
+def _is_async(fn: Any) -> bool:
+    """Return True if the provided function or callable object is a coroutine function."""
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "__call__", None))
+
+
+def _as_async_handler(handler: Handler[C]) -> Handler[C]:
+    """
+    Return an async version of a handler.
+
+    Synchronous (def) handlers are run on the handler thread pool, so blocking code doesn't stall the event loop. A
+    synchronous handler that times out keeps its thread until it returns, as threads can't be cancelled.
+    """
+    if _is_async(handler):
+        return handler
+
+    async def async_handler(ctx: C) -> C | None:
+        result = await handler_executor.run(handler, ctx)
+        return (await result) if inspect.isawaitable(result) else result  # type: ignore
+
+    return async_handler  # type: ignore
+
+
+# the number of synchronous middleware above the current point in a chain, which picks their thread pool
+_sync_middleware_depth: contextvars.ContextVar[int] = contextvars.ContextVar("nitric_sync_middleware_depth", default=0)
+
+
+def _as_async_middleware(middleware: Middleware[C]) -> Middleware[C]:
+    """
+    Return an async version of a middleware.
+
+    Synchronous (def) middleware are run on a middleware thread pool. The nxt function they receive is synchronous,
+    blocking that thread until the rest of the chain has run on the event loop, so synchronous middleware further down
+    the chain run on the pool for the next depth, and synchronous handlers on the handler thread pool.
+    """
+    if _is_async(middleware):
+        return middleware
+
+    async def async_middleware(ctx: C, nxt: Optional[Middleware[C]] = None) -> C:
+        loop = asyncio.get_running_loop()
+        depth = _sync_middleware_depth.get()
+
+        async def rest_of_chain(next_ctx: C) -> C:
+            # runs in its own task, so the depth is only raised for the rest of this chain
+            _sync_middleware_depth.set(depth + 1)
+            return await nxt(next_ctx)  # type: ignore
+
+        def sync_nxt(next_ctx: C) -> C:
+            if nxt is None:
+                return next_ctx
+            return asyncio.run_coroutine_threadsafe(rest_of_chain(next_ctx), loop).result()
+
+        result = await middleware_executor(depth).run(middleware, ctx, sync_nxt)
+        return (await result) if inspect.isawaitable(result) else result  # type: ignore
+
+    return async_middleware  # type: ignore
+
+
 def _convert_to_middleware(handler: Handler[C] | Middleware[C]) -> Middleware[C]:
     """Convert a handler to a middleware, if it's already a middleware it's returned unchanged."""
     if not _is_handler(handler):
         # it's not a middleware, don't convert it.
-        return handler  # type: ignore
+        return _as_async_middleware(handler)  # type: ignore
+
+    async_handler = _as_async_handler(handler)  # type: ignore
 
     async def middleware(ctx: C, nxt: Middleware[C]) -> C:
-        context = await handler(ctx)  # type: ignore
+        context = await async_handler(ctx)  # type: ignore
         return await nxt(context) if nxt else context  # type: ignore
 
     return middleware  # type: ignore
@@ -338,30 +477,44 @@ def _is_handler(unknown: Middleware[C] | Handler[C]) -> bool:
     return len(positional) == 1
 
 
+def _link(middleware: Middleware[C], nxt: Optional[Middleware[C]]) -> Middleware[C]:
+    """Link a middleware to the next in its chain, keeping the previous context if it returns None."""
+
+    async def link(ctx: C) -> C:
+        # type ignored because mypy appears to misidentify the correct return type
+        output_context = await middleware(ctx, nxt)  # type: ignore
+        if not output_context:
+            return ctx
+        return output_context  # type: ignore
+
+    return link  # type: ignore
+
+
+def _link_chain(middlewares: Sequence[Middleware[C]], nxt: Optional[Middleware[C]]) -> Optional[Middleware[C]]:
+    """Link a sequence of middleware into a chain ending with nxt, returning its first link."""
+    chain = nxt
+    for middleware in reversed(middlewares):
+        chain = _link(middleware, chain)
+    return chain
+
+
 def compose_middleware(*middlewares: Middleware[C] | Handler[C]) -> Middleware[C]:
     """
     Compose multiple middleware functions into a single middleware function.
 
     The resulting middleware will effectively be a chain of the provided middleware,
     where each calls the next in the chain when they're successful.
+
+    The chain is linked once, here, rather than on every call. Only calls that pass their own next middleware need
+    it linked again, to end with that middleware.
     """
-    middlewares = [_convert_to_middleware(middleware) for middleware in middlewares]  # type: ignore
+    converted = [_convert_to_middleware(middleware) for middleware in middlewares]  # type: ignore
+    chain = _link_chain(converted, None)
 
     async def composed(ctx: C, nxt: Optional[Middleware[C]] = None) -> C:
-        last_middleware = nxt
-
-        def reduce_chain(acc_next: Middleware[C], cur: Middleware[C]) -> Middleware[C]:
-            async def chained_middleware(ctx: C, nxt: Optional[Middleware[C]] = None) -> C:
-                result = (await nxt(ctx)) if nxt is not None else ctx  # type: ignore
-                # type ignored because mypy appears to misidentify the correct return type
-                output_context = await cur(result, acc_next)  # type: ignore
-                if not output_context:
-                    return result  # type: ignore
-                return output_context  # type: ignore
-
-            return chained_middleware
-
-        middleware_chain = functools.reduce(reduce_chain, reversed(middlewares), last_middleware)  # type: ignore
+        middleware_chain = chain if nxt is None else _link_chain(converted, nxt)
+        if middleware_chain is None:
+            return ctx
         # type ignored because mypy appears to misidentify the correct return type
         return await middleware_chain(ctx)  # type: ignore
 
@@ -410,3 +563,6 @@ class FunctionServer(ABC):
     @abstractmethod
     async def start(self) -> None:
         """Start the worker."""
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop accepting new work and wait up to grace_period seconds for in-flight work to complete."""
@@ -0,0 +1,460 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Coroutine, Deque, Dict, Hashable, List, Optional, Set, Tuple, TypeVar
+
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.config import settings
+from nitric.exception import HandlerTimeoutException
+from nitric.metrics import handler_timeouts
+
+C = TypeVar("C")
+R = TypeVar("R")
+
+
+async def run_handler(handler: Callable[[C], Awaitable[R]], ctx: C, timeout: Optional[float], name: str) -> R:
+    """
+    Run a handler, cancelling it if it doesn't complete within timeout seconds.
+
+    Raises a HandlerTimeoutException when the timeout expires, and counts it against the named handler.
+    """
+    if timeout is None:
+        return await handler(ctx)
+
+    deadline = asyncio.timeout(timeout)
+    try:
+        async with deadline:
+            return await handler(ctx)
+    except TimeoutError:
+        if not deadline.expired():
+            # raised by the handler itself rather than the deadline
+            raise
+        handler_timeouts.add(name)
+        raise HandlerTimeoutException(name, timeout) from None
+
+
+async def drain(
+    supervisor: StreamSupervisor, dispatcher: Dispatcher, responses: BoundedAsyncQueue[Any], grace_period: float
+) -> None:
+    """
+    Drain a worker's stream.
+
+    Stops the supervisor, so the worker rejects new messages and won't reconnect, then waits up to grace_period seconds
+    for in-flight invocations to complete and their responses to be sent, before closing the stream's responses.
+    """
+    supervisor.stop()
+    try:
+        async with asyncio.timeout(grace_period):
+            await dispatcher.join()
+            await responses.flush()
+    except TimeoutError:
+        print(
+            f"Drain of {supervisor.name} timed out after {grace_period}s "
+            f"with {dispatcher.in_flight} invocations in flight and {responses.depth} responses unsent"
+        )
+    responses.close()
+
+
+class LimiterClient:
+    """A worker's share of an AdaptiveLimiter, and the recent and baseline latencies it's judged by."""
+
+    name: str
+    weight: float
+    reserved: int
+    in_flight: int
+    recent: Optional[float]
+    baseline: Optional[float]
+
+    def __init__(self, name: str, weight: float = 1.0, reserved: int = 0):
+        """Construct a new LimiterClient."""
+        if weight <= 0:
+            raise ValueError("weight must be greater than 0")
+        if reserved < 0:
+            raise ValueError("reserved must not be negative")
+        self.name = name
+        self.weight = weight
+        self.reserved = reserved
+        self.in_flight = 0
+        self.recent = None
+        self.baseline = None
+
+
+class AdaptiveLimiter:
+    """
+    A concurrency limit shared by every worker in the process, adapted to observed handler latency.
+
+    The limit follows additive-increase/multiplicative-decrease: it grows by roughly one for every limit's worth of
+    invocations that complete while the limit is in use, and shrinks by backoff_ratio, at most once per limit's worth
+    of invocations, when the limit is nearly all in use and recent latency has risen above tolerance times the
+    baseline. Each client keeps its own recent latency, an average over roughly the last 10 invocations, and baseline,
+    an average over roughly the last 100, so a single slow invocation, or a handler that's slow by nature, isn't
+    mistaken for overload.
+
+    Each worker is a client with a weight and a number of reserved slots. Reserved slots can only be used by their
+    client, so critical workers always have capacity. When the limit is saturated, freed slots go to the waiting
+    client with the least work in flight relative to its weight.
+    """
+
+    enabled: bool
+    min_limit: int
+    max_limit: int
+    tolerance: float
+    backoff_ratio: float
+    in_flight: int
+    _limit: float
+    _since_backoff: int
+    _clients: Dict[str, LimiterClient]
+    _waiters: List[Tuple[LimiterClient, asyncio.Future[None]]]
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        tolerance: float = 2.0,
+        backoff_ratio: float = 0.9,
+        enabled: bool = True,
+    ):
+        """Construct a new AdaptiveLimiter."""
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        self.enabled = enabled
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self._limit = float(initial_limit)
+        self._since_backoff = 0
+        self._clients = {}
+        self._waiters = []
+
+    @property
+    def limit(self) -> int:
+        """Return the current concurrency limit."""
+        return int(self._limit)
+
+    def client(self, name: str, weight: float = 1.0, reserved: int = 0) -> LimiterClient:
+        """Return the named client, creating it if it doesn't exist yet."""
+        if name not in self._clients:
+            self._clients[name] = LimiterClient(name, weight=weight, reserved=reserved)
+        return self._clients[name]
+
+    def configure(self, name: str, weight: Optional[float] = None, reserved: Optional[int] = None) -> LimiterClient:
+        """Set the weight and/or reserved slots of the named client."""
+        current = self.client(name)
+        if weight is not None:
+            if weight <= 0:
+                raise ValueError("weight must be greater than 0")
+            current.weight = weight
+        if reserved is not None:
+            if reserved < 0:
+                raise ValueError("reserved must not be negative")
+            current.reserved = reserved
+        self._wake()
+        return current
+
+    def _can_admit(self, client: LimiterClient) -> bool:
+        if client.in_flight < client.reserved:
+            return True
+        # slots reserved by other clients, but not in use, are held back for them
+        held_back = sum(
+            max(other.reserved - other.in_flight, 0) for other in self._clients.values() if other is not client
+        )
+        return self.in_flight + held_back < self.limit
+
+    def _admit(self, client: LimiterClient) -> None:
+        client.in_flight += 1
+        self.in_flight += 1
+
+    def _wake(self) -> None:
+        while self._waiters:
+            eligible = [waiter for waiter in self._waiters if self._can_admit(waiter[0])]
+            if not eligible:
+                return
+            # the first of the waiters with the least work in flight for their weight, so ties stay FIFO
+            waiter = min(eligible, key=lambda w: w[0].in_flight / w[0].weight)
+            self._waiters.remove(waiter)
+            client, future = waiter
+            self._admit(client)
+            future.set_result(None)
+
+    async def acquire(self, client: LimiterClient) -> None:
+        """Wait until the client may start another invocation."""
+        if not self.enabled:
+            return
+        if not self._waiters and self._can_admit(client):
+            self._admit(client)
+            return
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        waiter = (client, future)
+        self._waiters.append(waiter)
+        # the client may be eligible even though others are waiting, e.g. for a reserved slot
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted just as the caller was cancelled, give it back
+                self._release_slot(client)
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, client: LimiterClient, latency: float) -> None:
+        """Record that an invocation by the client completed after latency seconds."""
+        if not self.enabled:
+            return
+        self._adapt(client, latency)
+        self._release_slot(client)
+
+    def _release_slot(self, client: LimiterClient) -> None:
+        client.in_flight -= 1
+        self.in_flight -= 1
+        self._wake()
+
+    def _adapt(self, client: LimiterClient, latency: float) -> None:
+        # exponentially weighted moving averages, over a short and a long window
+        client.recent = latency if client.recent is None else client.recent + (latency - client.recent) * 0.1
+        client.baseline = latency if client.baseline is None else client.baseline + (latency - client.baseline) * 0.01
+        self._since_backoff += 1
+
+        congested = client.recent > client.baseline * self.tolerance
+        if congested and self.in_flight >= self._limit * 0.9:
+            # latency only signals overload while the limit is nearly all in use, and a backoff takes a limit's worth
+            # of invocations to show in their latency
+            if self._since_backoff >= self._limit:
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                self._since_backoff = 0
+        elif not congested and self.in_flight >= self._limit / 2:
+            # only grow while the limit is actually being used
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+
+limiter = AdaptiveLimiter(
+    initial_limit=settings.CONCURRENCY_LIMIT_INITIAL,
+    min_limit=settings.CONCURRENCY_LIMIT_MIN,
+    max_limit=settings.CONCURRENCY_LIMIT_MAX,
+    enabled=settings.ADAPTIVE_CONCURRENCY,
+)
+
+
+class Dispatcher:
+    """Runs handler invocations as independent tasks, with a bounded number in flight at once."""
+
+    max_in_flight: int
+    name: str
+    _slots: asyncio.Semaphore
+    _tasks: Set[asyncio.Task[None]]
+    _accepted: int
+    _waiting: int
+    _limiter: AdaptiveLimiter
+    _limiter_client: LimiterClient
+
+    def __init__(
+        self,
+        max_in_flight: int = 1,
+        name: str = "",
+        weight: float = 1.0,
+        reserved: int = 0,
+        adaptive_limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        """
+        Construct a new Dispatcher.
+
+        Invocations also take a slot from the process-wide adaptive limiter, as the named client with the given weight
+        and reserved slots.
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.name = name
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._accepted = 0
+        self._waiting = 0
+        self._limiter = adaptive_limiter if adaptive_limiter is not None else limiter
+        self._limiter_client = self._limiter.client(name, weight=weight, reserved=reserved)
+
+    @property
+    def in_flight(self) -> int:
+        """Return the number of dispatched invocations that have not yet completed."""
+        return self._accepted
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of enqueued invocations still waiting for a slot."""
+        return self._waiting
+
+    def add_slots(self, slots: int) -> None:
+        """Raise max_in_flight by slots, e.g. as a worker takes on more handlers."""
+        self.max_in_flight += slots
+        for _ in range(slots):
+            self._slots.release()
+
+    async def submit(self, fn: Callable[..., Awaitable[None]], *args: Any) -> None:
+        """
+        Start fn(*args) in a new task once a slot is free.
+
+        Waits while max_in_flight invocations are already running, which stops the caller from reading further
+        messages off its stream until capacity is available.
+        """
+        await self._acquire()
+        self._spawn(self._run(fn, *args))
+
+    def enqueue(
+        self,
+        fn: Callable[..., Awaitable[None]],
+        *args: Any,
+        max_wait: Optional[float] = None,
+        expired: Optional[Callable[..., Awaitable[None]]] = None,
+    ) -> None:
+        """
+        Start fn(*args) in a new task once a slot is free, without waiting for one.
+
+        Unlike submit, the caller can keep reading messages while invocations wait; waiting reports how many have
+        queued up. An invocation that waits longer than max_wait seconds for a slot is abandoned as soon as it expires,
+        and expired(*args) is run instead, outside the in-flight limit.
+        """
+        self._waiting += 1
+        self._spawn(self._enqueued(fn, args, max_wait, expired))
+
+    async def _enqueued(
+        self,
+        fn: Callable[..., Awaitable[None]],
+        args: Tuple[Any, ...],
+        max_wait: Optional[float],
+        expired: Optional[Callable[..., Awaitable[None]]],
+    ) -> None:
+        try:
+            async with asyncio.timeout(max_wait):
+                await self._acquire()
+        except TimeoutError:
+            if expired is not None:
+                try:
+                    await expired(*args)
+                except Exception as e:  # pylint: disable=broad-except
+                    logging.exception("An unhandled error occurred in a dispatched handler: %s", e)
+            return
+        finally:
+            self._waiting -= 1
+        await self._run(fn, *args)
+
+    async def _acquire(self) -> None:
+        await self._slots.acquire()
+        self._accepted += 1
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> None:
+        # named after the worker, so the loop lag monitor can attribute blocking handlers
+        task = asyncio.create_task(coro, name=self.name or None)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, fn: Callable[..., Awaitable[None]], *args: Any) -> None:
+        try:
+            await self._limiter.acquire(self._limiter_client)
+            started = time.monotonic()
+            try:
+                await fn(*args)
+            finally:
+                self._limiter.release(self._limiter_client, time.monotonic() - started)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in a dispatched handler: %s", e)
+        finally:
+            self._accepted -= 1
+            self._slots.release()
+
+    async def join(self) -> None:
+        """Wait for all in-flight invocations to complete."""
+        while self._tasks:
+            pending = [task for task in self._tasks if not task.done()]
+            if pending:
+                await asyncio.wait(pending)
+            else:
+                # let the done callbacks of completed tasks remove them from the set
+                await asyncio.sleep(0)
+
+
+class KeyedDispatcher(Dispatcher):
+    """
+    A Dispatcher that keeps invocations sharing a key in the order they were submitted.
+
+    Invocations with different keys run concurrently, up to max_in_flight. Each key has its own lane, which is
+    created on the first submission for that key and removed as soon as it has been drained. Invocations waiting in a
+    lane count towards max_in_flight, so a single busy key can't grow its lane without bound.
+    """
+
+    _lanes: Dict[Hashable, Deque[Tuple[Callable[..., Awaitable[None]], Tuple[Any, ...]]]]
+
+    def __init__(
+        self,
+        max_in_flight: int = 1,
+        name: str = "",
+        weight: float = 1.0,
+        reserved: int = 0,
+        adaptive_limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        """Construct a new KeyedDispatcher."""
+        super().__init__(
+            max_in_flight=max_in_flight, name=name, weight=weight, reserved=reserved, adaptive_limiter=adaptive_limiter
+        )
+        self._lanes = {}
+
+    @property
+    def lanes(self) -> int:
+        """Return the number of keys with invocations queued or running."""
+        return len(self._lanes)
+
+    async def submit_keyed(self, key: Optional[Hashable], fn: Callable[..., Awaitable[None]], *args: Any) -> None:
+        """
+        Start fn(*args) once a slot is free and every earlier invocation with the same key has completed.
+
+        Invocations with a key of None are not ordered against anything else.
+        """
+        if key is None:
+            await self.submit(fn, *args)
+            return
+
+        await self._acquire()
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append((fn, args))
+            return
+
+        self._lanes[key] = deque([(fn, args)])
+        self._spawn(self._drain_lane(key))
+
+    async def _drain_lane(self, key: Hashable) -> None:
+        lane = self._lanes[key]
+        try:
+            while lane:
+                fn, args = lane.popleft()
+                await self._run(fn, *args)
+        finally:
+            # release the slots held by anything left behind if the lane was cancelled
+            for _ in lane:
+                self._accepted -= 1
+                self._slots.release()
+            del self._lanes[key]
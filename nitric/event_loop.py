@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import importlib
+from typing import Callable, Optional
+
+LoopFactory = Callable[[], asyncio.AbstractEventLoop]
+
+
+def resolve_loop_factory(name: str) -> Optional[LoopFactory]:
+    """
+    Return the event loop factory for a NITRIC_EVENT_LOOP setting.
+
+    "asyncio" returns None, meaning asyncio's default loop is used. "uvloop" returns uvloop's factory, falling back to
+    the default loop with a warning if uvloop isn't installed. Anything else must name a factory as "module:function".
+    """
+    if name == "asyncio":
+        return None
+
+    if name == "uvloop":
+        try:
+            import uvloop  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            print(
+                "WARNING: uvloop was requested but isn't installed, using the default asyncio event loop. "
+                "Install nitric[uvloop] to use it."
+            )
+            return None
+        return uvloop.new_event_loop
+
+    module_name, _, factory_name = name.partition(":")
+    if not factory_name:
+        raise ValueError(f'Unknown event loop "{name}", expected asyncio, uvloop or a "module:function" factory')
+    factory: LoopFactory = getattr(importlib.import_module(module_name), factory_name)
+    return factory
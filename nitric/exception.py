@@ -157,6 +157,16 @@ class NitricUnavailableException(Exception):
         super().__init__("Unable to connect to nitric server." + (" " + message if message else ""))
 
 
+class HandlerTimeoutException(Exception):
+    """A trigger handler didn't complete within its timeout and was cancelled."""
+
+    def __init__(self, handler: str, timeout: float):
+        """Construct a new HandlerTimeoutException for the named handler and the timeout it exceeded."""
+        super().__init__(f"The handler for {handler} timed out after {timeout}s")
+        self.handler = handler
+        self.timeout = timeout
+
+
 class NitricNotRunningException(Exception):
     """The Nitric application wasn't started before the program exited."""
 
@@ -0,0 +1,99 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, TypeVar
+
+from nitric.config import settings
+
+R = TypeVar("R")
+
+
+class HandlerExecutor:
+    """A lazily created thread pool that tracks how much of it is in use."""
+
+    max_workers: int
+    thread_name_prefix: str
+    active: int
+    completed: int
+    _pool: Optional[ThreadPoolExecutor]
+
+    def __init__(self, max_workers: Optional[int] = None, thread_name_prefix: str = "nitric-handler"):
+        """Construct a new HandlerExecutor, defaulting to the configured thread pool size."""
+        self.max_workers = max_workers if max_workers is not None else settings.THREAD_POOL_SIZE
+        if self.max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.thread_name_prefix = thread_name_prefix
+        self.active = 0
+        self.completed = 0
+        self._pool = None
+
+    @property
+    def utilisation(self) -> float:
+        """Return the fraction of the pool's threads currently busy, calls waiting for a thread count towards it."""
+        return self.active / self.max_workers
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # created on first use, so processes forked before then don't inherit a pool without its threads
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix)
+        return self._pool
+
+    async def run(self, fn: Callable[..., R], *args: Any) -> R:
+        """
+        Run fn(*args) on the pool, preserving the caller's context variables, and wait for the result.
+
+        Threads can't be interrupted, so if the caller is cancelled, e.g. by a handler timeout, fn keeps its thread
+        until it returns.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, fn, *args)
+        self.active += 1
+        try:
+            return await loop.run_in_executor(self._get_pool(), call)
+        finally:
+            self.active -= 1
+            self.completed += 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the pool, a new one will be created if it's used again."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+handler_executor = HandlerExecutor()
+
+# Synchronous middleware block their thread while the rest of their chain runs, which may need a thread of its own for
+# a synchronous handler, or middleware, further down. Each depth of synchronous middleware has its own pool, so a
+# thread only ever waits on threads from the pools below it, and can't take every thread its chain is waiting for.
+_middleware_executors: List[HandlerExecutor] = []
+
+
+def middleware_executor(depth: int) -> HandlerExecutor:
+    """Return the pool for synchronous middleware with depth synchronous middleware above them in their chain."""
+    while len(_middleware_executors) <= depth:
+        _middleware_executors.append(
+            HandlerExecutor(thread_name_prefix=f"nitric-middleware-{len(_middleware_executors)}")
+        )
+    return _middleware_executors[depth]
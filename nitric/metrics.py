@@ -0,0 +1,108 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import DefaultDict, Dict
+
+from opentelemetry import metrics
+
+# Instruments record to the globally configured OpenTelemetry MeterProvider (a no-op unless one has been set),
+# and keep their own per-handler totals so they can be inspected in process.
+_meter = metrics.get_meter("nitric")
+
+HANDLER_ATTRIBUTE = "nitric.handler"
+
+
+class Counter:
+    """A monotonic count, broken down by handler."""
+
+    name: str
+    _values: DefaultDict[str, int]
+
+    def __init__(self, name: str, description: str):
+        """Construct a new Counter."""
+        self.name = name
+        self._values = defaultdict(int)
+        self._instrument = _meter.create_counter(name, description=description)
+
+    def add(self, handler: str, amount: int = 1) -> None:
+        """Increase the count for a handler."""
+        self._values[handler] += amount
+        self._instrument.add(amount, {HANDLER_ATTRIBUTE: handler})
+
+    def get(self, handler: str) -> int:
+        """Return the count for a handler."""
+        return self._values.get(handler, 0)
+
+    def values(self) -> Dict[str, int]:
+        """Return the counts for every handler."""
+        return dict(self._values)
+
+
+class Histogram:
+    """A distribution of recorded values, broken down by handler."""
+
+    name: str
+    _counts: DefaultDict[str, int]
+    _totals: DefaultDict[str, float]
+    _maximums: DefaultDict[str, float]
+
+    def __init__(self, name: str, description: str, unit: str = ""):
+        """Construct a new Histogram."""
+        self.name = name
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(float)
+        self._maximums = defaultdict(float)
+        self._instrument = _meter.create_histogram(name, unit=unit, description=description)
+
+    def record(self, handler: str, value: float) -> None:
+        """Record a value for a handler."""
+        self._counts[handler] += 1
+        self._totals[handler] += value
+        self._maximums[handler] = max(self._maximums[handler], value)
+        self._instrument.record(value, {HANDLER_ATTRIBUTE: handler})
+
+    def count(self, handler: str) -> int:
+        """Return the number of values recorded for a handler."""
+        return self._counts.get(handler, 0)
+
+    def total(self, handler: str) -> float:
+        """Return the sum of the values recorded for a handler."""
+        return self._totals.get(handler, 0.0)
+
+    def maximum(self, handler: str) -> float:
+        """Return the largest value recorded for a handler."""
+        return self._maximums.get(handler, 0.0)
+
+
+handler_timeouts = Counter(
+    "nitric.handler.timeouts", "Number of handler invocations cancelled because they exceeded their timeout"
+)
+requests_shed = Counter(
+    "nitric.handler.shed", "Number of requests rejected without running their handler because the worker was overloaded"
+)
+schedule_skipped_ticks = Counter(
+    "nitric.schedule.skipped", "Number of schedule ticks acknowledged without running, because of the overlap policy"
+)
+schedule_run_duration = Histogram("nitric.schedule.duration", "Time taken by scheduled function runs", unit="s")
+loop_lag = Histogram(
+    "nitric.loop.lag", "How late the event loop ran a scheduled heartbeat, by the handler that blocked it", unit="s"
+)
+loop_blocked = Counter("nitric.loop.blocked", "Number of times a handler blocked the event loop beyond the threshold")
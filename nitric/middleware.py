@@ -0,0 +1,445 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Built-in HTTP middleware."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import gzip
+import importlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, Dict, FrozenSet, Hashable, Iterator, List, Optional, Sequence, Set, Tuple, Union, cast
+
+from nitric.context import HttpContext, HttpMiddleware, Record
+from nitric.executor import handler_executor
+
+Encoder = Callable[[bytes], bytes]
+
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "text/*",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+)
+
+
+def _header(headers: Record, name: str) -> Optional[str]:
+    """Return a header's value, joining repeated values, looking its name up case-insensitively."""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value if isinstance(value, str) else ",".join(value)
+    return None
+
+
+def _set_header(headers: Record, name: str, value: str) -> None:
+    """Set a header, replacing any existing value under a differently cased name."""
+    for key in [key for key in headers if key.lower() == name.lower()]:
+        del headers[key]
+    headers[name] = [value]
+
+
+def _add_vary(headers: Record, field: str) -> None:
+    vary = _header(headers, "Vary")
+    if vary is None:
+        _set_header(headers, "Vary", field)
+        return
+    fields = [f.strip().lower() for f in vary.split(",")]
+    if field.lower() not in fields and "*" not in fields:
+        _set_header(headers, "Vary", f"{vary}, {field}")
+
+
+def _gzip_encoder() -> Encoder:
+    return lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _import(*modules: str) -> Optional[ModuleType]:
+    """Import the first of modules that's installed."""
+    for module in modules:
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            continue
+    return None
+
+
+def _brotli_encoder() -> Optional[Encoder]:
+    brotli = _import("brotli", "brotlicffi")
+    if brotli is None:
+        return None
+    return lambda data: brotli.compress(data, quality=4)
+
+
+def _zstd_encoder() -> Optional[Encoder]:
+    zstd = _import("compression.zstd")
+    if zstd is not None:
+        return lambda data: zstd.compress(data, level=3)
+    zstandard = _import("zstandard")
+    if zstandard is not None:
+        # compressors aren't thread safe, and large bodies are compressed concurrently on the thread pool
+        return lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+    return None
+
+
+def available_encoders() -> Dict[str, Encoder]:
+    """Return the content encodings that can be compressed with, by preference, gzip is always available."""
+    candidates = [("zstd", _zstd_encoder()), ("br", _brotli_encoder()), ("gzip", _gzip_encoder())]
+    return {name: encoder for (name, encoder) in candidates if encoder is not None}
+
+
+def _accepted_encodings(accept_encoding: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-Encoding header into its codings and their quality values."""
+    accepted = []
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted.append((coding.lower(), quality))
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str], supported: Sequence[str]) -> Optional[str]:
+    """Choose the supported encoding the client prefers, breaking ties by the order of supported."""
+    if not accept_encoding:
+        return None
+    accepted = _accepted_encodings(accept_encoding)
+    qualities = dict(accepted)
+    wildcard = qualities.get("*")
+    best: Optional[str] = None
+    best_quality = 0.0
+    for encoding in supported:
+        quality = qualities.get(encoding, wildcard if wildcard is not None else 0.0)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _is_compressible(content_type: Optional[str], allowed: Sequence[str]) -> bool:
+    if content_type is None:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    for pattern in allowed:
+        if pattern.endswith("/*") and media_type.startswith(pattern[:-1]):
+            return True
+        if media_type == pattern:
+            return True
+    return False
+
+
+def compression(
+    min_size: int = 1024,
+    content_types: Sequence[str] = DEFAULT_COMPRESSIBLE_TYPES,
+    encodings: Optional[Sequence[str]] = None,
+    offload_size: int = 64 * 1024,
+) -> HttpMiddleware:
+    """
+    Create a middleware that compresses response bodies with the best encoding the client accepts.
+
+    Responses are compressed when their body is at least min_size bytes and their Content-Type matches content_types,
+    where "type/*" matches a whole type. encodings lists the encodings to use, in order of preference, defaulting to
+    zstd, br and gzip, whichever are installed. Bodies of at least offload_size bytes are compressed on the handler
+    thread pool, so compressing them doesn't block the event loop.
+    """
+    encoders = available_encoders()
+    if encodings is not None:
+        unavailable = [encoding for encoding in encodings if encoding not in encoders]
+        if unavailable:
+            raise ValueError(f"Unsupported or uninstalled content encodings: {', '.join(unavailable)}")
+        encoders = {encoding: encoders[encoding] for encoding in encodings}
+    supported = list(encoders)
+    allowed = [content_type.lower() for content_type in content_types]
+
+    async def compress(ctx: HttpContext, nxt: Optional[HttpMiddleware]) -> HttpContext:
+        ctx = await nxt(ctx) if nxt else ctx
+        res = ctx.res
+        body = res.body
+        if len(body) < min_size or res.status < 200 or res.status in (204, 304):
+            return ctx
+        if not _is_compressible(_header(res.headers, "Content-Type"), allowed):
+            return ctx
+        if _header(res.headers, "Content-Encoding") is not None:
+            return ctx
+
+        # the response depends on Accept-Encoding, whether it's compressed or not
+        _add_vary(res.headers, "Accept-Encoding")
+        encoding = negotiate_encoding(_header(ctx.req.headers, "Accept-Encoding"), supported)
+        if encoding is None:
+            return ctx
+
+        encoder = encoders[encoding]
+        compressed = await handler_executor.run(encoder, body) if len(body) >= offload_size else encoder(body)
+        if len(compressed) >= len(body):
+            return ctx
+
+        res.body = compressed
+        _set_header(res.headers, "Content-Encoding", encoding)
+        if _header(res.headers, "Content-Length") is not None:
+            _set_header(res.headers, "Content-Length", str(len(compressed)))
+        return ctx
+
+    # compress's nxt has no default, which is how compose_middleware tells middleware from handlers
+    return cast(HttpMiddleware, compress)
+
+
+CACHEABLE_STATUSES = frozenset({200, 203, 204, 300, 301, 308, 404, 410})
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A response stored in a ResponseCache."""
+
+    status: int
+    headers: Record
+    body: bytes
+    stored_at: float
+    expires_at: float
+    tags: FrozenSet[str]
+
+
+def _cache_lifetime(cache_control: Optional[str], default_ttl: float, authorized: bool) -> Optional[float]:
+    """
+    Return how long a response may be cached for given its Cache-Control header, or None if it mustn't be.
+
+    As the cache is shared, responses to authorized requests are only cached if they're explicitly public, have an
+    s-maxage or must be revalidated (RFC 9111, section 3.5).
+    """
+    directives: Dict[str, Optional[str]] = {}
+    for directive in (cache_control or "").split(","):
+        key, _, value = directive.strip().partition("=")
+        if key.strip():
+            directives[key.strip().lower()] = value.strip().strip('"') or None
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+    if authorized and not {"public", "s-maxage", "must-revalidate"} & directives.keys():
+        return None
+    # the cache is shared by every client, so s-maxage takes precedence over max-age
+    for key in ("s-maxage", "max-age"):
+        seconds = directives.get(key)
+        if seconds is not None:
+            try:
+                return max(float(seconds), 0.0)
+            except ValueError:
+                return None
+    return default_ttl
+
+
+class ResponseCache:
+    """
+    An in-process LRU cache of HTTP responses, which can be invalidated by tag.
+
+    A cache can be shared by the cache middleware of any number of routes, each with its own TTL. Once it holds
+    max_entries responses, the least recently used are evicted. Expired responses are evicted when they're next looked
+    up. The number of hits and misses are tracked.
+    """
+
+    max_entries: int
+    hits: int
+    misses: int
+    _entries: OrderedDict[Hashable, CachedResponse]
+    _tagged: Dict[str, Set[Hashable]]
+    _filling: Dict[Hashable, asyncio.Future[None]]
+
+    def __init__(self, max_entries: int = 1024):
+        """Construct a new ResponseCache."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tagged = {}
+        self._filling = {}
+
+    def __len__(self) -> int:
+        """Return the number of responses in the cache, including any that have expired but not been evicted."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Return the unexpired response cached for key."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, entry: CachedResponse) -> None:
+        """Cache a response for key, evicting the least recently used responses if the cache is full."""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> int:
+        """Remove the responses cached with any of the tags, returning the number removed."""
+        keys = set().union(*(self._tagged.get(tag, set()) for tag in tags))
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        self._entries.clear()
+        self._tagged.clear()
+
+    @contextlib.contextmanager
+    def filling(self, key: Hashable) -> Iterator[None]:
+        """Mark key as being filled, so concurrent lookups wait for its response instead of running the handler."""
+        filled = asyncio.get_running_loop().create_future()
+        self._filling[key] = filled
+        try:
+            yield
+        finally:
+            if self._filling.get(key) is filled:
+                del self._filling[key]
+            filled.set_result(None)
+
+    async def wait_for_fill(self, key: Hashable) -> Optional[CachedResponse]:
+        """Wait for a response being filled for key, and return it if it was cached."""
+        filled = self._filling.get(key)
+        if filled is None:
+            return None
+        # shielded, so a waiter being cancelled doesn't cancel the others
+        await asyncio.shield(filled)
+        return self.get(key)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+Tags = Union[Sequence[str], Callable[[HttpContext], Sequence[str]]]
+
+
+def cache(
+    ttl: float,
+    vary: Sequence[str] = (),
+    tags: Tags = (),
+    store: Optional[ResponseCache] = None,
+) -> HttpMiddleware:
+    """
+    Create a middleware that caches the responses to GET and HEAD requests, skipping the handler on a hit.
+
+    Responses are cached by method, Host, path and query, Cookie, and the values of the vary request headers, for ttl
+    seconds. A Cache-Control header on the response can shorten or extend that with max-age or s-maxage, or prevent
+    caching with no-store, no-cache or private. Responses that set cookies, or vary on headers not listed in vary,
+    aren't cached, and neither are responses to requests with an Authorization header, unless they're public.
+    tags, or a function returning the tags for a request, label the cached responses so they can be invalidated
+    together with store.invalidate(). Each cache has its own store, unless one is given to share, e.g. to invalidate the
+    responses of several routes together.
+    """
+    store = store if store is not None else ResponseCache()
+    vary_names = sorted({name.lower() for name in vary})
+
+    def key_for(ctx: HttpContext) -> Hashable:
+        req = ctx.req
+        query = tuple(
+            sorted(
+                (name, tuple(values) if isinstance(values, list) else (values,)) for (name, values) in req.query.items()
+            )
+        )
+        return (
+            req.method.upper(),
+            _header(req.headers, "Host"),
+            req.path,
+            query,
+            _header(req.headers, "Cookie"),
+            tuple(_header(req.headers, name) for name in vary_names),
+        )
+
+    def hit(ctx: HttpContext, entry: CachedResponse) -> HttpContext:
+        store.hits += 1
+        ctx.res.status = entry.status
+        ctx.res.headers = {name: list(values) for (name, values) in entry.headers.items()}
+        ctx.res.headers["Age"] = [str(int(time.monotonic() - entry.stored_at))]
+        ctx.res.body = entry.body
+        return ctx
+
+    def entry_for(ctx: HttpContext) -> Optional[CachedResponse]:
+        res = ctx.res
+        if res.status not in CACHEABLE_STATUSES or _header(res.headers, "Set-Cookie") is not None:
+            return None
+        response_vary = _header(res.headers, "Vary")
+        if response_vary is not None:
+            fields = {field.strip().lower() for field in response_vary.split(",") if field.strip()}
+            if not fields.issubset(vary_names):
+                return None
+        authorized = _header(ctx.req.headers, "Authorization") is not None
+        lifetime = _cache_lifetime(_header(res.headers, "Cache-Control"), ttl, authorized)
+        if not lifetime:
+            return None
+        now = time.monotonic()
+        return CachedResponse(
+            status=res.status,
+            headers={
+                name: HttpContext._ensure_value_is_list(values)  # pylint: disable=protected-access
+                for (name, values) in res.headers.items()
+            },
+            body=res.body,
+            stored_at=now,
+            expires_at=now + lifetime,
+            tags=frozenset(tags(ctx) if callable(tags) else tags),
+        )
+
+    async def cached(ctx: HttpContext, nxt: Optional[HttpMiddleware]) -> HttpContext:
+        if ctx.req.method.upper() not in ("GET", "HEAD"):
+            return await nxt(ctx) if nxt else ctx
+
+        key = key_for(ctx)
+        entry = store.get(key)
+        if entry is not None:
+            return hit(ctx, entry)
+
+        entry = await store.wait_for_fill(key)
+        if entry is not None:
+            return hit(ctx, entry)
+
+        store.misses += 1
+        with store.filling(key):
+            ctx = await nxt(ctx) if nxt else ctx
+            entry = entry_for(ctx)
+            if entry is not None:
+                store.set(key, entry)
+        return ctx
+
+    # cached's nxt has no default, which is how compose_middleware tells middleware from handlers
+    return cast(HttpMiddleware, cached)
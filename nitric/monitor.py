@@ -0,0 +1,108 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from nitric.config import settings
+from nitric.metrics import loop_blocked, loop_lag
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs scheduled callbacks, and reports what blocked it.
+
+    A heartbeat on the loop records its lag every interval seconds. A watchdog thread checks the heartbeat, and when
+    it's more than threshold seconds late captures the stack of the loop's thread and the name of the task running on
+    it. Dispatched handler tasks are named after their worker (e.g. "api main GET /customers"), so the block is
+    attributed to that handler, logged and counted.
+    """
+
+    interval: float
+    threshold: float
+    _loop: Optional[asyncio.AbstractEventLoop]
+    _loop_thread_id: Optional[int]
+    _last_beat: float
+    _blocked_by: Optional[str]
+    _heartbeat: Optional[asyncio.Task[None]]
+    _stopped: threading.Event
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        """Construct a new LoopLagMonitor, defaulting to the configured interval and threshold."""
+        self.interval = interval if interval is not None else settings.LOOP_LAG_INTERVAL
+        self.threshold = threshold if threshold is not None else settings.LOOP_LAG_THRESHOLD
+        if self.interval <= 0 or self.threshold <= 0:
+            raise ValueError("interval and threshold must be greater than 0")
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._blocked_by = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = self._loop.create_task(self._beat(), name="nitric loop lag monitor")
+        threading.Thread(target=self._watch, name="nitric-loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop monitoring."""
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            # attribute the lag to whatever the watchdog caught blocking the loop, if anything
+            blocked_by, self._blocked_by = self._blocked_by, None
+            loop_lag.record(blocked_by or "", max(0.0, now - expected))
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(min(self.interval, self.threshold) / 2):
+            last_beat = self._last_beat
+            lag = time.monotonic() - last_beat - self.interval
+            # report each block once, however long it lasts
+            if lag > self.threshold and last_beat != reported_beat:
+                reported_beat = last_beat
+                self._report(lag)
+
+    def _report(self, lag: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)  # type: ignore
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        handler = task.get_name() if task is not None else "unknown"
+        self._blocked_by = handler
+
+        loop_blocked.add(handler)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+        logging.warning("The event loop has been blocked for %.3fs by %s, currently at:\n%s", lag, handler, stack)
@@ -20,8 +20,9 @@
 
 from nitric.resources.apis import Api, api, ApiOptions, ApiDetails, JwtSecurityDefinition, oidc_rule
 from nitric.resources.buckets import Bucket, bucket, BucketNotificationContext, FileNotificationContext
+from nitric.resources.http import HttpWorker, http
 from nitric.resources.kv import KeyValueStoreRef, kv
-from nitric.resources.schedules import ScheduleServer, schedule
+from nitric.resources.schedules import OverlapPolicy, ScheduleServer, schedule
 from nitric.resources.secrets import Secret, secret
 from nitric.resources.topics import Topic, topic
 from nitric.resources.websockets import Websocket, websocket
@@ -39,6 +40,8 @@ __all__ = [
     "Bucket",
     "BucketNotificationContext",
     "FileNotificationContext",
+    "http",
+    "HttpWorker",
     "kv",
     "KeyValueStoreRef",
     "job",
@@ -46,6 +49,7 @@ __all__ = [
     "oidc_rule",
     "queue",
     "Queue",
+    "OverlapPolicy",
     "ScheduleServer",
     "schedule",
     "secret",
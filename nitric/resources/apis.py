@@ -19,15 +19,16 @@
 from __future__ import annotations
 
 import logging
-from dataclasses import dataclass
-from typing import Callable, Concatenate, Dict, List, Optional, ParamSpec, TypeVar, Union
+import math
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Concatenate, Dict, List, Optional, ParamSpec, Tuple, TypeVar, Union
 
 import betterproto
-import grpclib
 from grpclib import GRPCError
 
 from nitric.application import Nitric
-from nitric.bidi import AsyncNotifierList
+from nitric.asgi import AsgiApp, Lifespan, call_asgi
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
 from nitric.context import (
     FunctionServer,
     HttpContext,
@@ -35,10 +36,12 @@ from nitric.context import (
     HttpMethod,
     HttpMiddleware,
     HttpRequest,
-    Record,
     compose_middleware,
 )
-from nitric.exception import exception_from_grpc_error
+from nitric.dispatch import Dispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException, exception_from_grpc_error
+from nitric.metrics import requests_shed
+from nitric.router import Router
 from nitric.proto.apis.v1 import (
     ApiDetailsRequest,
     ApiStub,
@@ -46,6 +49,7 @@ from nitric.proto.apis.v1 import (
     ApiWorkerScopes,
     ClientMessage,
     HeaderValue,
+    ServerMessage,
 )
 from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
 from nitric.proto.apis.v1 import HttpResponse as ProtoHttpResponse
@@ -62,6 +66,8 @@ from nitric.proto.resources.v1 import (
 from nitric.resources.resource import Resource as BaseResource
 from nitric.channel import ChannelManager
 
+HttpResponder = Callable[[ProtoHttpRequest], Awaitable[ProtoHttpResponse]]
+
 
 @dataclass
 class ApiDetails:
@@ -93,26 +99,61 @@ class MethodOptions:
     Represents options when defining a method handler.
 
     security (dict[str, List[str]])
+    max_in_flight (int): the maximum number of requests handled concurrently, defaults to the API's setting
+    timeout (float): seconds a request may take before it's cancelled and answered with a 504, no limit by default
+    weight (float): the route's share of the process-wide adaptive concurrency limit, relative to other workers
+    reserved (int): slots of the process-wide adaptive concurrency limit kept free for this route's requests
+    max_queue_depth (int): requests that arrive while this many are already waiting are rejected with a 503
+    max_queue_wait (float): requests that waited longer than this many seconds are rejected with a 503
     """
 
     security: Optional[List[ScopedOidcOptions]] = None
+    max_in_flight: Optional[int] = None
+    timeout: Optional[float] = None
+    weight: float = 1.0
+    reserved: int = 0
+    max_queue_depth: Optional[int] = None
+    max_queue_wait: Optional[float] = None
 
 
 # SecurityDefinition = JwtSecurityDefinition
 
 
 class ApiOptions:
-    """Represents options when creating an API, such as middleware to be applied to all HTTP request to the API."""
+    """
+    Represents options when creating an API, such as middleware to be applied to all HTTP request to the API.
+
+    With router enabled, the API registers a single wildcard route, over one stream, and routes requests to their
+    handlers in process. Routes can't have their own security, concurrency or load shedding options in this mode.
+    The API's security applies to all of them, and its weight, reserved, max_queue_depth and max_queue_wait (see
+    MethodOptions) to the router's worker, which handles every route's requests. The worker handles up to
+    router_max_in_flight requests at once, across all routes, which defaults to max_in_flight for each route, so the
+    API handles as many requests at once as it would without the router.
+    """
 
     path: str
     middleware: Optional[Union[HttpMiddleware, List[HttpMiddleware]]]
     security: Optional[List[ScopedOidcOptions]]
+    max_in_flight: int
+    router: bool
+    weight: float
+    reserved: int
+    max_queue_depth: Optional[int]
+    max_queue_wait: Optional[float]
+    router_max_in_flight: Optional[int]
 
     def __init__(
         self,
         path: str = "",
         middleware: Optional[Union[HttpMiddleware, List[HttpMiddleware]]] = None,
         security: Optional[List[ScopedOidcOptions]] = None,
+        max_in_flight: int = 1,
+        router: bool = False,
+        weight: float = 1.0,
+        reserved: int = 0,
+        max_queue_depth: Optional[int] = None,
+        max_queue_wait: Optional[float] = None,
+        router_max_in_flight: Optional[int] = None,
     ):
         """Construct a new API options object."""
         if middleware is None:
@@ -122,6 +163,13 @@ class ApiOptions:
         self.middleware = middleware
         self.security = security
         self.path = path
+        self.max_in_flight = max_in_flight
+        self.router = router
+        self.weight = weight
+        self.reserved = reserved
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self.router_max_in_flight = router_max_in_flight
 
 
 class RouteOptions:
@@ -161,7 +209,12 @@ class Api(BaseResource):
     middleware: List[HttpMiddleware]
     routes: List[Route]
     security: Optional[List[ScopedOidcOptions]]
+    max_in_flight: int
+    router: bool
     _api_stub: ApiStub
+    _router: Optional[ApiRouter]
+    _router_options: MethodOptions
+    _router_slots_per_route: int
 
     def __init__(self, name: str, opts: Optional[ApiOptions] = None):
         """Construct a new HTTP API."""
@@ -178,6 +231,18 @@ class Api(BaseResource):
         self.path = opts.path
         self.routes = []
         self.security = opts.security
+        self.max_in_flight = opts.max_in_flight
+        self.router = opts.router
+        self._router = None
+        # without an explicit limit, the router's worker gets max_in_flight more slots for each route it handles
+        self._router_slots_per_route = opts.max_in_flight if opts.router_max_in_flight is None else 0
+        self._router_options = MethodOptions(
+            max_in_flight=opts.max_in_flight if opts.router_max_in_flight is None else opts.router_max_in_flight,
+            weight=opts.weight,
+            reserved=opts.reserved,
+            max_queue_depth=opts.max_queue_depth,
+            max_queue_wait=opts.max_queue_wait,
+        )
 
     async def _register(self) -> None:
         try:
@@ -307,6 +372,24 @@ class Api(BaseResource):
 
         return decorator
 
+    def mount(self, prefix: str, app: AsgiApp, opts: Optional[MethodOptions] = None) -> None:
+        """
+        Serve every request under prefix with an ASGI application, such as a Starlette or FastAPI app.
+
+        The app sees the API's path and the prefix as its root_path. API middleware doesn't apply to mounted apps.
+        """
+        if opts is None:
+            opts = MethodOptions()
+        if opts.max_in_flight is None:
+            opts = replace(opts, max_in_flight=self.max_in_flight)
+        AsgiRouteWorker(api_name=self.name, root_path=(self.path + prefix).replace("//", "/"), app=app, options=opts)
+
+    def _get_router(self) -> ApiRouter:
+        """Return the in-process router for this API, creating it and its wildcard route worker on first use."""
+        if self._router is None:
+            self._router = ApiRouter(self, self._router_options, self._router_slots_per_route)
+        return self._router
+
     async def _details(self) -> ApiDetails:
         """Get the API deployment details."""
         try:
@@ -376,6 +459,88 @@ class Route:
         return self.method([HttpMethod.OPTIONS], *middleware, opts=opts)
 
 
+# Matches every path under an API's base path, when the API routes requests in process
+ROUTER_WILDCARD = "/*"
+
+
+class ApiRouter:
+    """
+    Routes the requests an API receives on its wildcard route to the handlers registered for their paths.
+
+    The router's worker registers the wildcard route for every method, so the API only opens one stream however many
+    routes it has. Paths use the same syntax as routes registered individually, their :param segments are matched
+    here and set as the request's params.
+    """
+
+    server: ApiRouteWorker
+    _api_name: str
+    _routes: Router[Tuple[HttpHandler, MethodOptions, str]]
+    _route_count: int
+    _slots_per_route: int
+
+    def __init__(self, api: Api, options: MethodOptions, slots_per_route: int = 0):
+        """
+        Construct a new ApiRouter, and the worker for its wildcard route, which is given options.
+
+        The worker's max_in_flight covers the first route, and grows by slots_per_route for each route added after it.
+        """
+        self._api_name = api.name
+        self._routes = Router()
+        self._route_count = 0
+        self._slots_per_route = slots_per_route
+        self.server = ApiRouteWorker(
+            api_name=api.name,
+            path=(api.path + ROUTER_WILDCARD).replace("//", "/"),
+            methods=list(HttpMethod),
+            handler=self._route,
+            options=options,
+        )
+
+    def add(self, path: str, methods: List[HttpMethod], handler: HttpHandler, opts: MethodOptions) -> None:
+        """Route requests for path, with any of the methods, to handler."""
+        if opts.security is not None:
+            raise ValueError(f"{path} sets its own security, which isn't supported by APIs that route in process")
+        unsupported = [
+            name
+            for (name, value, default) in [
+                ("max_in_flight", opts.max_in_flight, None),
+                ("weight", opts.weight, 1.0),
+                ("reserved", opts.reserved, 0),
+                ("max_queue_depth", opts.max_queue_depth, None),
+                ("max_queue_wait", opts.max_queue_wait, None),
+            ]
+            if value != default
+        ]
+        if unsupported:
+            raise ValueError(
+                f"{path} sets its own {', '.join(unsupported)}, which APIs that route in process only support as "
+                "ApiOptions"
+            )
+        # named like the route's own worker would be, to keep metrics the same
+        name = f"api {self._api_name} {','.join(method.value for method in methods)} {path}"
+        self._routes.add(path, [method.value for method in methods], (handler, opts, name))
+        if self._route_count and self._slots_per_route:
+            self.server._dispatcher.add_slots(self._slots_per_route)
+        self._route_count += 1
+
+    async def _route(self, ctx: HttpContext) -> HttpContext:
+        match = self._routes.match(ctx.req.method, ctx.req.path)
+        if match is None:
+            ctx.res.status = 404
+            ctx.res.body = b"Not Found"
+            return ctx
+        if match.value is None:
+            ctx.res.status = 405
+            ctx.res.headers["Allow"] = match.allowed
+            ctx.res.body = b"Method Not Allowed"
+            return ctx
+
+        handler, opts, name = match.value
+        ctx.req.params = match.params
+        result = await run_handler(handler, ctx, opts.timeout, name)
+        return result if result else ctx
+
+
 class Method:
     """A method handler."""
 
@@ -397,26 +562,34 @@ class Method:
 
         handler = compose_middleware(*middleware)
 
+        if self.route.api.router:
+            router = self.route.api._get_router()
+            router.add(self.route.path, self.methods, handler, opts)
+            self.server = router.server
+            return
+
+        if opts.max_in_flight is None:
+            opts = replace(opts, max_in_flight=self.route.api.max_in_flight)
+
         self.server = ApiRouteWorker(
             api_name=self.route.api.name, path=self.route.path, methods=self.methods, handler=handler, options=opts
         )
 
 
+def _responder_for(handler: HttpHandler) -> HttpResponder:
+    """Return a function that runs handler for a request, with an HttpContext, and returns its response."""
+
+    async def respond(request: ProtoHttpRequest) -> ProtoHttpResponse:
+        ctx = _http_context_from_proto(request)
+        result = await handler(ctx)
+        return _http_context_to_proto_response(result if result else ctx)
+
+    return respond
+
+
 def _http_context_from_proto(msg: ProtoHttpRequest) -> HttpContext:
     """Construct a new HttpContext from a Http trigger from the Nitric Membrane."""
-    headers: Record = {k: v.value for (k, v) in msg.headers.items()}
-    query: Record = {k: v.value for (k, v) in msg.query_params.items()}
-
-    return HttpContext(
-        request=HttpRequest(
-            data=msg.body,
-            method=msg.method,
-            query=query,
-            path=msg.path,
-            params=dict(msg.path_params.items()),
-            headers=headers,
-        )
-    )
+    return HttpContext(request=HttpRequest._from_proto(msg))  # pylint: disable=protected-access
 
 
 def _http_context_to_proto_response(ctx: HttpContext) -> ProtoHttpResponse:
@@ -436,30 +609,44 @@ def _http_context_to_proto_response(ctx: HttpContext) -> ProtoHttpResponse:
 
 
 class ApiRouteWorker(FunctionServer):
-    """A worker for handling HTTP requests for a specific API route."""
+    """
+    A worker for handling HTTP requests for a specific API route.
+
+    Requests are served by respond, which defaults to running the handler with an HttpContext for each request. Workers
+    that serve the protobuf requests themselves, rather than through an HttpHandler, pass their own respond instead.
+    """
 
-    _handler: HttpHandler
+    _respond: HttpResponder
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
     _options: MethodOptions
+    _dispatcher: Dispatcher
+    _supervisor: StreamSupervisor
 
     def __init__(
         self,
         api_name: str,
         path: str,
         methods: List[HttpMethod],
-        handler: HttpHandler,
+        handler: Optional[HttpHandler],
         options: MethodOptions,
+        *,
+        respond: Optional[HttpResponder] = None,
     ):
-        """Construct a new ApiRouteWorker."""
+        """Construct a new ApiRouteWorker, which serves requests with either handler or respond."""
+        if respond is None and handler is not None:
+            respond = _responder_for(handler)
+        elif respond is None or handler is not None:
+            raise ValueError("An ApiRouteWorker needs exactly one of handler or respond")
+
         sec = {opt.name: ApiWorkerScopes(scopes=opt.scopes) for opt in options.security} if options.security else {}
         reg_options = ApiWorkerOptions(
             security=sec,
             security_disabled=True if options.security == [] else False,
         )
 
-        self._handler = handler
-        self._responses = AsyncNotifierList()
+        self._respond = respond
+        self._responses = BoundedAsyncQueue()
         self._options = options
         self._registration_request = RegistrationRequest(
             api=api_name,
@@ -467,53 +654,147 @@ class ApiRouteWorker(FunctionServer):
             methods=[method.value for method in methods],
             options=reg_options,
         )
+        name = f"api {api_name} {','.join(method.value for method in methods)} {path}"
+        self._dispatcher = Dispatcher(
+            max_in_flight=options.max_in_flight if options.max_in_flight is not None else 1,
+            name=name,
+            weight=options.weight,
+            reserved=options.reserved,
+        )
+        self._supervisor = StreamSupervisor(name)
 
         Nitric._register_worker(self)
 
-    async def _route_request_iterator(self):
+    async def _route_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this API route handler and handle http requests."""
+    async def _handle_request(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run the handler for a single http request and queue its response."""
+        response: ClientMessage
+        try:
+            http_response = await run_handler(
+                self._respond, server_msg.http_request, self._options.timeout, self._supervisor.name
+            )
+            response = ClientMessage(id=server_msg.id, http_response=http_response)
+        except HandlerTimeoutException as e:
+            logging.warning(e)
+            timeout_http_response = ProtoHttpResponse(
+                status=504,
+                body=b"Gateway Timeout",
+            )
+            response = ClientMessage(id=server_msg.id, http_response=timeout_http_response)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in an api route handler: %s", e)
+            failed_http_response = ProtoHttpResponse(
+                status=500,
+                body=b"Internal Server Error",
+            )
+            response = ClientMessage(id=server_msg.id, http_response=failed_http_response)
+        await responses.add_item(response)
+
+    @property
+    def _sheds_load(self) -> bool:
+        return self._options.max_queue_depth is not None or self._options.max_queue_wait is not None
+
+    async def _shed(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Reject a request with a 503, without running middleware or the handler."""
+        requests_shed.add(self._supervisor.name)
+        retry_after = math.ceil(self._options.max_queue_wait) if self._options.max_queue_wait else 1
+        shed_http_response = ProtoHttpResponse(
+            status=503,
+            headers={"Retry-After": HeaderValue(value=[str(retry_after)])},
+            body=b"Service Unavailable",
+        )
+        await responses.add_item(ClientMessage(id=server_msg.id, http_response=shed_http_response))
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this route and handle http requests until the stream ends."""
         channel = ChannelManager.get_channel()
         server = ApiStub(channel=channel)
-
-        # Attach security rules for this route
-        for security_rule in self._options.security if self._options.security else []:
-            _attach_oidc(api_name=self._registration_request.api, options=security_rule)
+        # responses are only valid on the stream their requests arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in server.serve(self._route_request_iterator()):
+            async for server_msg in server.serve(self._route_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
+                    continue
+                if msg_type != "http_request":
                     continue
-                if msg_type == "http_request":
-                    ctx = _http_context_from_proto(server_msg.http_request)
-                    response: ClientMessage
-                    try:
-                        result = await self._handler(ctx)
-                        ctx = result if result else ctx
-                        response = ClientMessage(id=server_msg.id, http_response=_http_context_to_proto_response(ctx))
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in an api route handler: %s", e)
-                        failed_http_response = ProtoHttpResponse(
-                            status=500,
-                            body=b"Internal Server Error",
-                        )
-                        response = ClientMessage(id=server_msg.id, http_response=failed_http_response)
-                    await self._responses.add_item(response)
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
+                if self._supervisor.stopped:
+                    # draining, ask the client to retry against another instance
+                    await self._shed(server_msg, responses)
+                elif not self._sheds_load:
+                    await self._dispatcher.submit(self._handle_request, server_msg, responses)
+                elif self._options.max_queue_depth is not None and (
+                    self._dispatcher.waiting >= self._options.max_queue_depth
+                ):
+                    await self._shed(server_msg, responses)
+                else:
+                    self._dispatcher.enqueue(
+                        self._handle_request,
+                        server_msg,
+                        responses,
+                        max_wait=self._options.max_queue_wait,
+                        expired=self._shed,
+                    )
         finally:
-            print("Closing client stream")
-            channel.close()
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this API route handler and handle http requests."""
+        # Attach security rules for this route
+        for security_rule in self._options.security if self._options.security else []:
+            _attach_oidc(api_name=self._registration_request.api, options=security_rule)
+
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop handling new requests and wait for in-flight requests to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
+
+
+class AsgiRouteWorker(ApiRouteWorker):
+    """A worker that serves the HTTP requests for an API path prefix with an ASGI application."""
+
+    _app: AsgiApp
+    _root_path: str
+    _lifespan: Lifespan
+
+    def __init__(self, api_name: str, root_path: str, app: AsgiApp, options: MethodOptions):
+        """Construct a new AsgiRouteWorker, for every request under root_path."""
+        self._app = app
+        self._root_path = root_path.rstrip("/")
+        self._lifespan = Lifespan(app)
+        super().__init__(
+            api_name=api_name,
+            path=self._root_path + ROUTER_WILDCARD,
+            methods=list(HttpMethod),
+            handler=None,
+            options=options,
+            respond=self._call_app,
+        )
+
+    async def _call_app(self, request: ProtoHttpRequest) -> ProtoHttpResponse:
+        """Serve a request with the ASGI app, without translating it into an HttpContext."""
+        return await call_asgi(self._app, request, self._root_path, self._lifespan.state)
+
+    async def start(self) -> None:
+        """Run the ASGI app's startup handlers, then register its route and handle http requests."""
+        await self._lifespan.startup()
+        await super().start()
+
+    async def drain(self, grace_period: float) -> None:
+        """Wait for in-flight requests to complete, then run the ASGI app's shutdown handlers."""
+        await super().drain(grace_period)
+        await self._lifespan.shutdown()
 
 
 def api(name: str, opts: Optional[ApiOptions] = None) -> Api:
@@ -26,14 +26,14 @@ from typing import Callable, List, Literal, Optional, Union, cast
 from warnings import warn
 
 import betterproto
-import grpclib
 from grpclib import GRPCError
 from grpclib.client import Channel
 
 from nitric.application import Nitric
-from nitric.bidi import AsyncNotifierList
-from nitric.context import FunctionServer, Handler, Middleware
-from nitric.exception import InvalidArgumentException, exception_from_grpc_error
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.context import FunctionServer, Handler, Middleware, _as_async_handler
+from nitric.dispatch import KeyedDispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException, InvalidArgumentException, exception_from_grpc_error
 from nitric.proto.resources.v1 import Action, ResourceDeclareRequest, ResourceIdentifier, ResourceType
 from nitric.proto.storage.v1 import (
     BlobEventRequest,
@@ -41,6 +41,7 @@ from nitric.proto.storage.v1 import (
     BlobEventType,
     ClientMessage,
     RegistrationRequest,
+    ServerMessage,
     StorageDeleteRequest,
     StorageExistsRequest,
     StorageListBlobsRequest,
@@ -170,9 +171,18 @@ class BucketRef(object):
         return resp.exists
 
     def on(
-        self, notification_type: str, notification_prefix_filter: str
+        self,
+        notification_type: str,
+        notification_prefix_filter: str,
+        max_in_flight: int = 1,
+        timeout: Optional[float] = None,
     ) -> Callable[[BucketNotificationHandler], None]:
-        """Create and return a bucket notification decorator for this bucket."""
+        """
+        Create and return a bucket notification decorator for this bucket.
+
+        Events for different keys are handled concurrently, up to max_in_flight, events for the same key are always
+        handled in order. Handlers running longer than timeout seconds are cancelled and the event marked as failed.
+        """
 
         def decorator(func: BucketNotificationHandler) -> None:
             Listener(
@@ -180,6 +190,8 @@ class BucketRef(object):
                 notification_type=notification_type,
                 notification_prefix_filter=notification_prefix_filter,
                 handler=func,
+                max_in_flight=max_in_flight,
+                timeout=timeout,
             )
 
         return decorator
@@ -373,9 +385,18 @@ class Bucket(SecureResource):
         return BucketRef(self.name)
 
     def on(
-        self, notification_type: str, notification_prefix_filter: str
+        self,
+        notification_type: str,
+        notification_prefix_filter: str,
+        max_in_flight: int = 1,
+        timeout: Optional[float] = None,
     ) -> Callable[[BucketNotificationHandler], None]:
-        """Create and return a bucket notification decorator for this bucket."""
+        """
+        Create and return a bucket notification decorator for this bucket.
+
+        Events for different keys are handled concurrently, up to max_in_flight, events for the same key are always
+        handled in order. Handlers running longer than timeout seconds are cancelled and the event marked as failed.
+        """
 
         def decorator(func: BucketNotificationHandler) -> None:
             Listener(
@@ -383,6 +404,8 @@ class Bucket(SecureResource):
                 notification_type=notification_type,
                 notification_prefix_filter=notification_prefix_filter,
                 handler=func,
+                max_in_flight=max_in_flight,
+                timeout=timeout,
             )
 
         return decorator
@@ -393,7 +416,10 @@ class Listener(FunctionServer):
 
     _handler: BucketNotificationHandler
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
+    _dispatcher: KeyedDispatcher
+    _timeout: Optional[float]
+    _supervisor: StreamSupervisor
 
     def __init__(
         self,
@@ -401,10 +427,15 @@ class Listener(FunctionServer):
         notification_type: str,
         notification_prefix_filter: str,
         handler: BucketNotificationHandler,
+        max_in_flight: int = 1,
+        timeout: Optional[float] = None,
     ):
         """Construct a new bucket event listener."""
-        self._handler = handler
-        self._responses = AsyncNotifierList()
+        self._handler = _as_async_handler(handler)
+        self._responses = BoundedAsyncQueue()
+        name = f"bucket {bucket_name} {notification_type} listener"
+        self._dispatcher = KeyedDispatcher(max_in_flight=max_in_flight, name=name)
+        self._timeout = timeout
 
         event_type = BlobEventType.Created
         if "del" in notification_type:
@@ -415,57 +446,77 @@ class Listener(FunctionServer):
             blob_event_type=event_type,
             key_prefix_filter=notification_prefix_filter,
         )
+        self._supervisor = StreamSupervisor(name)
 
         # noinspection PyProtectedMember
         Nitric._register_worker(self)
 
-    async def _listener_request_iterator(self):
+    async def _listener_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this bucket listener and listen for events."""
+    async def _handle_event(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run the handler for a single blob event and queue its response."""
+        ctx = BucketNotificationContext(
+            request=BucketNotifyRequest(
+                bucket_name=server_msg.blob_event_request.bucket_name,
+                key=server_msg.blob_event_request.blob_event.key,
+                notification_type=server_msg.blob_event_request.blob_event.type,
+            )
+        )
+        response: ClientMessage
+        try:
+            result = await run_handler(self._handler, ctx, self._timeout, self._supervisor.name)
+            ctx = result if result else ctx
+            be = BlobEventResponse(success=ctx.res.success)
+            response = ClientMessage(id=server_msg.id, blob_event_response=be)
+        except HandlerTimeoutException as e:
+            logging.warning(e)
+            be = BlobEventResponse(success=False)
+            response = ClientMessage(id=server_msg.id, blob_event_response=be)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in a bucket event listener: %s", e)
+            be = BlobEventResponse(success=False)
+            response = ClientMessage(id=server_msg.id, blob_event_response=be)
+        await responses.add_item(response)
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this listener and handle events until the stream ends."""
         channel = ChannelManager.get_channel()
         server = StorageListenerStub(channel=channel)
+        # responses are only valid on the stream their events arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in server.listen(self._listener_request_iterator()):
+            async for server_msg in server.listen(self._listener_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
                     continue
                 if msg_type == "blob_event_request":
-                    ctx = BucketNotificationContext(
-                        request=BucketNotifyRequest(
-                            bucket_name=server_msg.blob_event_request.bucket_name,
-                            key=server_msg.blob_event_request.blob_event.key,
-                            notification_type=server_msg.blob_event_request.blob_event.type,
-                        )
+                    if self._supervisor.stopped:
+                        # draining, fail the event so it's redelivered
+                        nack = BlobEventResponse(success=False)
+                        await responses.add_item(ClientMessage(id=server_msg.id, blob_event_response=nack))
+                        continue
+                    await self._dispatcher.submit_keyed(
+                        server_msg.blob_event_request.blob_event.key, self._handle_event, server_msg, responses
                     )
-                    response: ClientMessage
-                    try:
-                        result = await self._handler(ctx)
-                        ctx = result if result else ctx
-                        be = BlobEventResponse(success=ctx.res.success)
-                        response = ClientMessage(id=server_msg.id, blob_event_response=be)
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in a bucket event listener: %s", e)
-                        be = BlobEventResponse(success=False)
-                        response = ClientMessage(id=server_msg.id, blob_event_response=be)
-                    await self._responses.add_item(response)
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
-        except KeyboardInterrupt:
-            print("Keyboard interrupt")
         finally:
-            print("Closing client stream")
-            channel.close()
-        print("Listener stopped")
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this bucket listener and listen for events."""
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop handling new events and wait for in-flight events to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
 
 
 def bucket(name: str) -> Bucket:
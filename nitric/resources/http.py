@@ -0,0 +1,160 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import importlib.util
+from typing import Any, Callable, Coroutine, Optional
+
+from nitric.application import Nitric
+from nitric.bidi import StreamSupervisor
+from nitric.channel import ChannelManager
+from nitric.context import FunctionServer
+from nitric.proto.http.v1 import ClientMessage, HttpProxyRequest, HttpStub
+
+HttpServer = Callable[[Any, str, int, asyncio.Event], Coroutine[Any, Any, None]]
+"""Serves an app on a host and port until the event is set, then finishes its in-flight requests and returns."""
+
+
+async def serve_uvicorn(app: Any, host: str, port: int, shutdown: asyncio.Event) -> None:
+    """Serve an ASGI app with uvicorn until shutdown is set."""
+    import uvicorn  # pylint: disable=import-outside-toplevel
+
+    class Server(uvicorn.Server):
+        # signals are handled by Nitric, which drains the worker and so shuts the server down
+        def install_signal_handlers(self) -> None:
+            pass
+
+        @contextlib.contextmanager
+        def capture_signals(self):
+            yield
+
+    server = Server(uvicorn.Config(app, host=host, port=port))
+    serving = asyncio.create_task(server.serve())
+    stopping = asyncio.create_task(shutdown.wait())
+    try:
+        await asyncio.wait([serving, stopping], return_when=asyncio.FIRST_COMPLETED)
+        server.should_exit = True
+        await serving
+    finally:
+        stopping.cancel()
+
+
+async def serve_hypercorn(app: Any, host: str, port: int, shutdown: asyncio.Event) -> None:
+    """Serve an ASGI app with hypercorn until shutdown is set."""
+    from hypercorn.asyncio import serve  # pylint: disable=import-outside-toplevel
+    from hypercorn.config import Config  # pylint: disable=import-outside-toplevel
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    await serve(app, config, shutdown_trigger=shutdown.wait)
+
+
+def _default_server() -> HttpServer:
+    if importlib.util.find_spec("uvicorn") is not None:
+        return serve_uvicorn
+    if importlib.util.find_spec("hypercorn") is not None:
+        return serve_hypercorn
+    raise ImportError(
+        "Serving an app over HTTP requires uvicorn or hypercorn, install nitric[uvicorn] or nitric[hypercorn], "
+        "or provide a server"
+    )
+
+
+class HttpWorker(FunctionServer):
+    """
+    A worker that runs an HTTP server in process, and registers it with the Nitric Membrane to proxy requests to.
+
+    Requests reach the server directly over HTTP, instead of being marshalled into messages on a stream. The proxy
+    stream only registers the server's address, and is kept open for as long as the server should receive requests.
+    """
+
+    _app: Any
+    _host: str
+    _port: int
+    _server: HttpServer
+    _shutdown: asyncio.Event
+    _proxy_closed: asyncio.Event
+    _server_task: Optional[asyncio.Task[None]]
+    _supervisor: StreamSupervisor
+
+    def __init__(self, app: Any, host: str, port: int, server: Optional[HttpServer] = None):
+        """Construct a new HttpWorker, defaulting to uvicorn or hypercorn, whichever is installed, as the server."""
+        self._app = app
+        self._host = host
+        self._port = port
+        self._server = server if server is not None else _default_server()
+        self._shutdown = asyncio.Event()
+        self._proxy_closed = asyncio.Event()
+        self._server_task = None
+        self._supervisor = StreamSupervisor(f"http {host}:{port}")
+
+        Nitric._register_worker(self)
+
+    async def _proxy_request_iterator(self):
+        yield ClientMessage(request=HttpProxyRequest(host=f"{self._host}:{self._port}"))
+        # the membrane doesn't reply to the proxy request, so the stream counts as registered once it's been sent
+        self._supervisor.registered()
+        # the stream is kept open until the worker drains
+        await self._proxy_closed.wait()
+
+    async def _proxy(self) -> None:
+        """Open a single stream and register the server's address, until the stream ends."""
+        server = HttpStub(channel=ChannelManager.get_channel())
+        async for _ in server.proxy(self._proxy_request_iterator()):
+            pass
+
+    async def start(self) -> None:
+        """Start the HTTP server and register it with the Nitric Membrane."""
+        self._server_task = asyncio.create_task(
+            self._server(self._app, self._host, self._port, self._shutdown), name=f"{self._supervisor.name} server"
+        )
+        proxy = asyncio.create_task(self._supervisor.run(self._proxy))
+        try:
+            done, _ = await asyncio.wait([self._server_task, proxy], return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            self._server_task.cancel()
+            proxy.cancel()
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop proxying requests to the server, and wait for it to finish the requests it's handling."""
+        self._supervisor.stop()
+        self._proxy_closed.set()
+        self._shutdown.set()
+        if self._server_task is None:
+            return
+        try:
+            async with asyncio.timeout(grace_period):
+                await asyncio.wait([self._server_task])
+        except TimeoutError:
+            print(f"Drain of {self._supervisor.name} timed out after {grace_period}s")
+            self._server_task.cancel()
+
+
+def http(app: Any, host: str = "localhost", port: int = 8000, server: Optional[HttpServer] = None) -> HttpWorker:
+    """
+    Serve an app with an HTTP server in process, and have the Nitric Membrane proxy HTTP requests to it.
+
+    By default the app must be an ASGI app, served with uvicorn or hypercorn. Other apps can be served by providing a
+    server, an async function that serves the app on the host and port until the event it's given is set.
+    """
+    return HttpWorker(app, host=host, port=port, server=server)
@@ -7,8 +7,15 @@ from nitric.proto.resources.v1 import (
     ResourceIdentifier,
     ResourceType,
 )
-from nitric.context import JobContext
+from nitric.context import JobContext, JobRequest
+import asyncio
 import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import betterproto
 from nitric.proto.batch.v1 import (
     BatchStub,
@@ -19,28 +26,63 @@ from nitric.proto.batch.v1 import (
     ClientMessage,
     JobResponse as ProtoJobResponse,
     JobResourceRequirements,
+    ServerMessage,
 )
-from nitric.exception import exception_from_grpc_error
+from nitric.dispatch import Dispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException, exception_from_grpc_error
 from grpclib import GRPCError
 from grpclib.client import Channel
-from typing import Callable, Any, Optional, Literal, List
-from nitric.context import FunctionServer, Handler
+from typing import Awaitable, Callable, Any, Dict, Optional, Literal, List
+from nitric.context import FunctionServer, Handler, _as_async_handler
 from nitric.channel import ChannelManager
-from nitric.bidi import AsyncNotifierList
-from nitric.utils import struct_from_dict
-import grpclib
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.utils import dict_from_struct_bytes, struct_from_dict
 
 
 JobPermission = Literal["submit"]
 JobHandle = Handler[JobContext]
 
+# Handlers that run in a process pool are looked up by job name in the pool's forked processes,
+# the job decorator doesn't return them so they can't be pickled by reference.
+_process_handlers: Dict[str, JobHandle] = {}
+
+
+def _init_job_process() -> None:
+    """Prepare a forked job pool process, which can't share the parent's channel or signal handling."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    ChannelManager._detach()
+
+
+async def _on_own_loop(coro: Awaitable[Any]) -> Any:
+    # each async handler runs on a new loop, which the channel the process inherited has to be moved to
+    ChannelManager._bind_to_loop(asyncio.get_running_loop())
+    return await coro
+
+
+def _run_job_in_process(job_name: str, data: bytes) -> bool:
+    """Run a job's handler in a pool process, returning whether the job succeeded."""
+    ctx = JobContext(request=JobRequest(data=dict_from_struct_bytes(data)))
+    result = _process_handlers[job_name](ctx)
+    resp_ctx: Optional[JobContext]
+    if result is None or isinstance(result, JobContext):
+        resp_ctx = result
+    else:
+        resp_ctx = asyncio.run(_on_own_loop(result))
+    return (resp_ctx if resp_ctx else ctx).res.success
+
 
 class JobHandler(FunctionServer):
     """Function worker for Jobs."""
 
     _handler: JobHandle
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
+    _timeout: Optional[float]
+    _dispatcher: Dispatcher
+    _supervisor: StreamSupervisor
+    _job_name: str
+    _pool_size: Optional[int]
+    _pool: Optional[ProcessPoolExecutor]
 
     def __init__(
         self,
@@ -49,10 +91,26 @@ class JobHandler(FunctionServer):
         cpus: float | None = None,
         memory: int | None = None,
         gpus: int | None = None,
+        timeout: float | None = None,
+        process_pool: bool = False,
     ):
-        """Construct a new JobHandler."""
-        self._handler = handler
-        self._responses = AsyncNotifierList()
+        """
+        Construct a new JobHandler.
+
+        With process_pool, tasks run in a pool of forked processes with one process per requested cpu (or per
+        available cpu if none were requested), and up to that many tasks are handled concurrently. The pool is forked
+        from a process that's already running threads, which the forked processes don't inherit, so a lock held by one
+        of them at the time stays locked in the pool processes.
+        """
+        self._handler = _as_async_handler(handler)
+        self._timeout = timeout
+        self._job_name = job_name
+        self._pool = None
+        self._pool_size = None
+        if process_pool:
+            _process_handlers[job_name] = handler
+            self._pool_size = max(1, math.ceil(cpus)) if cpus else (os.cpu_count() or 1)
+        self._responses = BoundedAsyncQueue()
         self._registration_request = RegistrationRequest(
             job_name=job_name,
             requirements=JobResourceRequirements(
@@ -61,49 +119,104 @@ class JobHandler(FunctionServer):
                 gpus=gpus if gpus is not None else 0,
             ),
         )
+        name = f"job {job_name}"
+        self._dispatcher = Dispatcher(max_in_flight=self._pool_size if self._pool_size is not None else 1, name=name)
+        self._supervisor = StreamSupervisor(name)
 
-    async def _message_request_iterator(self):
+    async def _message_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this job handler and listen for tasks."""
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            if threading.active_count() > 1:
+                # Python 3.12+ also warns about this with a DeprecationWarning
+                logging.warning(
+                    "Forking the process pool for job %s while %d threads are running, locks held by those threads "
+                    "will stay locked in the pool's processes",
+                    self._job_name,
+                    threading.active_count() - 1,
+                )
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._pool_size,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_job_process,
+            )
+        return self._pool
+
+    async def _run_in_pool(self, data: bytes) -> bool:
+        """
+        Run the handler in the process pool, returning whether the job succeeded.
+
+        The request data is sent as its serialized bytes and only decoded in the pool process. Exceptions raised by
+        the handler are re-raised here. A timeout stops waiting for the result, but can't interrupt the process.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), _run_job_in_process, self._job_name, data)
+
+    async def _handle_job(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run the handler for a single job request and queue its response."""
+        response: ClientMessage
+        try:
+            if self._pool_size is not None:
+                data = bytes(server_msg.job_request.data.struct)
+                success = await run_handler(self._run_in_pool, data, self._timeout, self._supervisor.name)
+            else:
+                ctx = JobContext._from_request(server_msg)
+                resp_ctx = await run_handler(self._handler, ctx, self._timeout, self._supervisor.name)
+                if resp_ctx is None:
+                    resp_ctx = ctx
+                success = resp_ctx.res.success
+
+            response = ClientMessage(
+                id=server_msg.id,
+                job_response=ProtoJobResponse(success=success),
+            )
+        except HandlerTimeoutException as e:
+            logging.warning(e)
+            response = ClientMessage(id=server_msg.id, job_response=ProtoJobResponse(success=False))
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in a job event handler: %s", e)
+            response = ClientMessage(id=server_msg.id, job_response=ProtoJobResponse(success=False))
+        await responses.add_item(response)
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this job handler and handle tasks until the stream ends."""
         channel = ChannelManager.get_channel()
         server = JobStub(channel=channel)
+        # responses are only valid on the stream their requests arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in server.handle_job(self._message_request_iterator()):
+            async for server_msg in server.handle_job(self._message_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
                     continue
                 if msg_type == "job_request":
-                    ctx = JobContext._from_request(server_msg)
-
-                    response: ClientMessage
-                    try:
-                        resp_ctx = await self._handler(ctx)
-                        if resp_ctx is None:
-                            resp_ctx = ctx
-
-                        response = ClientMessage(
-                            id=server_msg.id,
-                            job_response=ProtoJobResponse(success=ctx.res.success),
-                        )
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in a job event handler: %s", e)
-                        response = ClientMessage(id=server_msg.id, job_response=ProtoJobResponse(success=False))
-                    await self._responses.add_item(response)
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
+                    if self._supervisor.stopped:
+                        # draining, fail the job so it can be retried elsewhere
+                        nack = ProtoJobResponse(success=False)
+                        await responses.add_item(ClientMessage(id=server_msg.id, job_response=nack))
+                        continue
+                    await self._dispatcher.submit(self._handle_job, server_msg, responses)
         finally:
-            print("Closing client stream")
-            channel.close()
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this job handler and listen for tasks."""
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop accepting new jobs and wait for the current ones to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
 
 
 class JobRef:
@@ -169,12 +282,27 @@ class Job(SecureResource):
         return ResourceIdentifier(name=self.name, type=ResourceType.Job)
 
     def __call__(
-        self, cpus: Optional[float] = None, memory: Optional[int] = None, gpus: Optional[int] = None
+        self,
+        cpus: Optional[float] = None,
+        memory: Optional[int] = None,
+        gpus: Optional[int] = None,
+        timeout: Optional[float] = None,
+        process_pool: bool = False,
     ) -> Callable[[JobHandle], None]:
-        """Define the handler for this job definition."""
+        """
+        Define the handler for this job definition.
+
+        Tasks running longer than timeout seconds are cancelled and reported as failed.
+
+        With process_pool, the handler runs in a pool of forked processes sized from cpus, so CPU-bound jobs can use
+        every core they've requested. The request data and the handler's result are passed between processes, so the
+        handler should only depend on its context and module level state. The pool is forked from a process that's
+        already running threads (e.g. the handler thread pool and telemetry exporters), so the handler shouldn't use
+        anything those threads may hold a lock on, such as a logging handler or client shared with them.
+        """
 
         def decorator(function: JobHandle) -> None:
-            wrkr = JobHandler(self.name, function, cpus, memory, gpus)
+            wrkr = JobHandler(self.name, function, cpus, memory, gpus, timeout, process_pool)
             Nitric._register_worker(wrkr)
 
         return decorator
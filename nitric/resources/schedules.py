@@ -19,20 +19,24 @@
 from __future__ import annotations
 
 import logging
+import time
 from datetime import timedelta
 from enum import Enum
-from typing import Callable, List
+from typing import Callable, List, Optional, Union
 
 import betterproto
-import grpclib.exceptions
 
 from nitric.application import Nitric
-from nitric.bidi import AsyncNotifierList
-from nitric.context import FunctionServer, IntervalContext, IntervalHandler
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.context import FunctionServer, IntervalContext, IntervalHandler, _as_async_handler
+from nitric.dispatch import Dispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException
+from nitric.metrics import schedule_run_duration, schedule_skipped_ticks
 from nitric.proto.schedules.v1 import (
     ClientMessage,
     IntervalResponse,
     RegistrationRequest,
+    ServerMessage,
     ScheduleCron,
     ScheduleEvery,
     SchedulesStub,
@@ -40,21 +44,54 @@ from nitric.proto.schedules.v1 import (
 from nitric.channel import ChannelManager
 
 
+class OverlapPolicy(Enum):
+    """
+    What a schedule does with a tick that arrives while an earlier run is still active.
+
+    SKIP acknowledges the tick without running it.
+    QUEUE runs it once the active run completes, optionally only while fewer than max_queued ticks are waiting.
+    CONCURRENT runs it alongside the active runs, up to max_concurrent at once, and skips it beyond that.
+    """
+
+    SKIP = "skip"
+    QUEUE = "queue"
+    CONCURRENT = "concurrent"
+
+
 class ScheduleServer(FunctionServer):
     """A schedule for running functions on a cadence."""
 
     description: str
 
     handler: IntervalHandler
+    timeout: Optional[float]
+    overlap: OverlapPolicy
+    max_queued: Optional[int]
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
+    _dispatcher: Dispatcher
+    _supervisor: StreamSupervisor
 
     def __init__(self, description: str):
         """Create a schedule for running functions on a cadence."""
         self.description = description
-        self._responses = AsyncNotifierList()
-
-    def every(self, rate_description: str, handler: IntervalHandler) -> None:
+        self.timeout = None
+        self.overlap = OverlapPolicy.QUEUE
+        self.max_queued = None
+        self._responses = BoundedAsyncQueue()
+        name = f"schedule {description}"
+        self._dispatcher = Dispatcher(name=name)
+        self._supervisor = StreamSupervisor(name)
+
+    def every(
+        self,
+        rate_description: str,
+        handler: IntervalHandler,
+        timeout: Optional[float] = None,
+        overlap: Union[OverlapPolicy, str] = OverlapPolicy.QUEUE,
+        max_queued: Optional[int] = None,
+        max_concurrent: int = 1,
+    ) -> None:
         """
         Register a function to be run at the specified rate.
 
@@ -64,12 +101,17 @@ class ScheduleServer(FunctionServer):
             schedule_name=self.description,
             every=ScheduleEvery(rate=rate_description.lower()),
         )
-
-        self.handler = handler
-
-        Nitric._register_worker(self)  # type: ignore pylint: disable=protected-access
-
-    def cron(self, cron_expression: str, handler: IntervalHandler) -> None:
+        self._register(handler, timeout, overlap, max_queued, max_concurrent)
+
+    def cron(
+        self,
+        cron_expression: str,
+        handler: IntervalHandler,
+        timeout: Optional[float] = None,
+        overlap: Union[OverlapPolicy, str] = OverlapPolicy.QUEUE,
+        max_queued: Optional[int] = None,
+        max_concurrent: int = 1,
+    ) -> None:
         """
         Register a function to be run at the specified cron schedule.
 
@@ -79,44 +121,98 @@ class ScheduleServer(FunctionServer):
             schedule_name=self.description,
             cron=ScheduleCron(expression=cron_expression),
         )
-
-        self.handler = handler
+        self._register(handler, timeout, overlap, max_queued, max_concurrent)
+
+    def _register(
+        self,
+        handler: IntervalHandler,
+        timeout: Optional[float],
+        overlap: Union[OverlapPolicy, str],
+        max_queued: Optional[int],
+        max_concurrent: int,
+    ) -> None:
+        self.handler = _as_async_handler(handler)
+        self.timeout = timeout
+        self.overlap = OverlapPolicy(overlap)
+        self.max_queued = max_queued
+        if self.overlap == OverlapPolicy.CONCURRENT:
+            self._dispatcher = Dispatcher(max_in_flight=max_concurrent, name=self._supervisor.name)
 
         Nitric._register_worker(self)  # type: ignore pylint: disable=protected-access
 
-    async def _schedule_request_iterator(self):
+    async def _schedule_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this schedule and start listening for requests."""
+    async def _handle_interval(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run the handler for a single interval and acknowledge it."""
+        ctx = IntervalContext(server_msg)
+        started = time.monotonic()
+        try:
+            await run_handler(self.handler, ctx, self.timeout, self._supervisor.name)
+        except HandlerTimeoutException as e:
+            logging.warning(e)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in a scheduled function: %s", e)
+        schedule_run_duration.record(self._supervisor.name, time.monotonic() - started)
+        resp = IntervalResponse()
+        await responses.add_item(ClientMessage(id=server_msg.id, interval_response=resp))
+
+    async def _skip(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Acknowledge an interval without running the handler."""
+        schedule_skipped_ticks.add(self._supervisor.name)
+        await responses.add_item(ClientMessage(id=server_msg.id, interval_response=IntervalResponse()))
+
+    async def _dispatch_interval(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run, queue or skip an interval, following the overlap policy."""
+        dispatcher = self._dispatcher
+        if self.overlap == OverlapPolicy.QUEUE:
+            if self.max_queued is None:
+                await dispatcher.submit(self._handle_interval, server_msg, responses)
+            elif dispatcher.in_flight + dispatcher.waiting < dispatcher.max_in_flight + self.max_queued:
+                dispatcher.enqueue(self._handle_interval, server_msg, responses)
+            else:
+                await self._skip(server_msg, responses)
+        elif dispatcher.in_flight + dispatcher.waiting < dispatcher.max_in_flight:
+            dispatcher.enqueue(self._handle_interval, server_msg, responses)
+        else:
+            await self._skip(server_msg, responses)
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this schedule and handle intervals until the stream ends."""
         channel = ChannelManager.get_channel()
         schedules_stub = SchedulesStub(channel=channel)
+        # responses are only valid on the stream their requests arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in schedules_stub.schedule(self._schedule_request_iterator()):
+            async for server_msg in schedules_stub.schedule(self._schedule_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
                     continue
                 if msg_type == "interval_request":
-                    ctx = IntervalContext(server_msg)
-                    try:
-                        await self.handler(ctx)
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in a scheduled function: %s", e)
-                    resp = IntervalResponse()
-                    await self._responses.add_item(ClientMessage(id=server_msg.id, interval_response=resp))
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
+                    if self._supervisor.stopped:
+                        # draining, intervals aren't redelivered so this one is skipped
+                        print(f"Skipping interval for {self._supervisor.name} while draining")
+                        await responses.add_item(ClientMessage(id=server_msg.id, interval_response=IntervalResponse()))
+                        continue
+                    await self._dispatch_interval(server_msg, responses)
         finally:
-            print("Closing client stream")
-            channel.close()
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this schedule and start listening for requests."""
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop running new intervals and wait for the current one to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
 
 
 class Frequency(Enum):
@@ -158,30 +254,62 @@ class Schedule:
         """Create a new schedule resource."""
         self.description = description
 
-    def every(self, every: str) -> Callable[[IntervalHandler], ScheduleServer]:
+    def every(
+        self,
+        every: str,
+        timeout: Optional[float] = None,
+        overlap: Union[OverlapPolicy, str] = OverlapPolicy.QUEUE,
+        max_queued: Optional[int] = None,
+        max_concurrent: int = 1,
+    ) -> Callable[[IntervalHandler], ScheduleServer]:
         """
         Set the schedule interval.
 
         e.g. every('3 days').
+
+        overlap decides what happens to ticks that arrive while a run is still active, see OverlapPolicy.
         """
 
         def decorator(func: IntervalHandler) -> ScheduleServer:
             r = ScheduleServer(self.description)
-            r.every(every, func)
+            r.every(
+                every,
+                func,
+                timeout=timeout,
+                overlap=overlap,
+                max_queued=max_queued,
+                max_concurrent=max_concurrent,
+            )
             return r
 
         return decorator
 
-    def cron(self, cron: str) -> Callable[[IntervalHandler], ScheduleServer]:
+    def cron(
+        self,
+        cron: str,
+        timeout: Optional[float] = None,
+        overlap: Union[OverlapPolicy, str] = OverlapPolicy.QUEUE,
+        max_queued: Optional[int] = None,
+        max_concurrent: int = 1,
+    ) -> Callable[[IntervalHandler], ScheduleServer]:
         """
         Set the schedule interval.
 
         e.g. cron('3 * * * *').
+
+        overlap decides what happens to ticks that arrive while a run is still active, see OverlapPolicy.
         """
 
         def decorator(func: IntervalHandler) -> ScheduleServer:
             r = ScheduleServer(self.description)
-            r.cron(cron, func)
+            r.cron(
+                cron,
+                func,
+                timeout=timeout,
+                overlap=overlap,
+                max_queued=max_queued,
+                max_concurrent=max_concurrent,
+            )
             return r
 
         return decorator
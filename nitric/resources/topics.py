@@ -19,28 +19,29 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Callable, List, Literal
+from typing import Any, Callable, Hashable, List, Literal, Optional
 
 import betterproto
-import grpclib
 from grpclib import GRPCError
 from grpclib.client import Channel
 
 from nitric.application import Nitric
-from nitric.bidi import AsyncNotifierList
-from nitric.context import EventHandler, FunctionServer, MessageContext, MessageRequest
-from nitric.exception import exception_from_grpc_error
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.context import EventHandler, FunctionServer, MessageContext, MessageRequest, _as_async_handler
+from nitric.dispatch import KeyedDispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException, exception_from_grpc_error
 from nitric.proto.resources.v1 import Action, ResourceDeclareRequest, ResourceIdentifier, ResourceType
 from nitric.proto.topics.v1 import ClientMessage, TopicMessage
 from nitric.proto.topics.v1 import MessageRequest as ProtoMessageRequest
 from nitric.proto.topics.v1 import MessageResponse as ProtoMessageResponse
-from nitric.proto.topics.v1 import RegistrationRequest, SubscriberStub
+from nitric.proto.topics.v1 import RegistrationRequest, ServerMessage, SubscriberStub
 from nitric.proto.topics.v1 import TopicPublishRequest, TopicsStub
 from nitric.resources.resource import SecureResource
 from nitric.utils import dict_from_struct, struct_from_dict
 from nitric.channel import ChannelManager
 
 TopicPermission = Literal["publish"]
+OrderingKey = Callable[[dict[str, Any]], Optional[Hashable]]
 
 
 class TopicRef:
@@ -117,13 +118,24 @@ class Topic(SecureResource):
 
         return TopicRef(self.name)
 
-    def subscribe(self) -> Callable[[EventHandler], None]:
-        """Create and return a subscription decorator for this topic."""
+    def subscribe(
+        self, max_in_flight: int = 1, ordering_key: Optional[OrderingKey] = None, timeout: Optional[float] = None
+    ) -> Callable[[EventHandler], None]:
+        """
+        Create and return a subscription decorator for this topic.
+
+        :param max_in_flight: the maximum number of messages handled concurrently
+        :param ordering_key: extracts a key from each message's data, messages with the same key are handled in order
+        :param timeout: seconds a message may take before its handler is cancelled and it's marked as failed
+        """
 
         def decorator(func: EventHandler) -> None:
             Subscriber(
                 topic_name=self.name,
                 handler=func,
+                max_in_flight=max_in_flight,
+                ordering_key=ordering_key,
+                timeout=timeout,
             )
 
         return decorator
@@ -143,55 +155,101 @@ class Subscriber(FunctionServer):
 
     _handler: EventHandler
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
+    _dispatcher: KeyedDispatcher
+    _ordering_key: Optional[OrderingKey]
+    _timeout: Optional[float]
+    _supervisor: StreamSupervisor
 
-    def __init__(self, topic_name: str, handler: EventHandler):
+    def __init__(
+        self,
+        topic_name: str,
+        handler: EventHandler,
+        max_in_flight: int = 1,
+        ordering_key: Optional[OrderingKey] = None,
+        timeout: Optional[float] = None,
+    ):
         """Construct a new WebsocketHandler."""
-        self._handler = handler
-        self._responses = AsyncNotifierList()
+        self._handler = _as_async_handler(handler)
+        self._responses = BoundedAsyncQueue()
+        name = f"topic {topic_name} subscriber"
+        self._dispatcher = KeyedDispatcher(max_in_flight=max_in_flight, name=name)
+        self._ordering_key = ordering_key
+        self._timeout = timeout
         self._registration_request = RegistrationRequest(topic_name=topic_name)
+        self._supervisor = StreamSupervisor(name)
 
         Nitric._register_worker(self)
 
-    async def _message_request_iterator(self):
+    async def _message_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this subscriber and listen for messages."""
+    def _key_for(self, ctx: MessageContext) -> Optional[Hashable]:
+        """Return the ordering key for a message, or None if it doesn't need to be ordered."""
+        if self._ordering_key is None:
+            return None
+        try:
+            return self._ordering_key(ctx.req.data)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("Unable to extract an ordering key from a topic message, it will not be ordered: %s", e)
+            return None
+
+    async def _handle_message(
+        self, server_msg: ServerMessage, ctx: MessageContext, responses: BoundedAsyncQueue[ClientMessage]
+    ) -> None:
+        """Run the handler for a single topic message and queue its response."""
+        response: ClientMessage
+        try:
+            result = await run_handler(self._handler, ctx, self._timeout, self._supervisor.name)
+            ctx = result if result else ctx
+            response = ClientMessage(id=server_msg.id, message_response=ProtoMessageResponse(success=ctx.res.success))
+        except HandlerTimeoutException as e:
+            logging.warning(e)
+            response = ClientMessage(id=server_msg.id, message_response=ProtoMessageResponse(success=False))
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("An unhandled error occurred in a subscription event handler: %s", e)
+            response = ClientMessage(id=server_msg.id, message_response=ProtoMessageResponse(success=False))
+        await responses.add_item(response)
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this subscriber and handle messages until the stream ends."""
         channel = ChannelManager.get_channel()
         server = SubscriberStub(channel=channel)
+        # responses are only valid on the stream their messages arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in server.subscribe(self._message_request_iterator()):
+            async for server_msg in server.subscribe(self._message_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
                     continue
                 if msg_type == "message_request":
+                    if self._supervisor.stopped:
+                        # draining, nack the message so it's redelivered
+                        nack = ProtoMessageResponse(success=False)
+                        await responses.add_item(ClientMessage(id=server_msg.id, message_response=nack))
+                        continue
                     ctx = _message_context_from_proto(server_msg.message_request)
-
-                    response: ClientMessage
-                    try:
-                        result = await self._handler(ctx)
-                        ctx = result if result else ctx
-                        response = ClientMessage(
-                            id=server_msg.id, message_response=ProtoMessageResponse(success=ctx.res.success)
-                        )
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in a subscription event handler: %s", e)
-                        response = ClientMessage(id=server_msg.id, message_response=ProtoMessageResponse(success=False))
-                    await self._responses.add_item(response)
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
+                    await self._dispatcher.submit_keyed(
+                        self._key_for(ctx), self._handle_message, server_msg, ctx, responses
+                    )
         finally:
-            print("Closing client stream")
-            channel.close()
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this subscriber and listen for messages."""
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop handling new messages and wait for in-flight messages to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
 
 
 def topic(name: str) -> Topic:
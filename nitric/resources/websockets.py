@@ -19,15 +19,14 @@
 from __future__ import annotations
 
 import logging
-from typing import Callable, Literal
+from typing import Callable, Literal, Optional
 
 import betterproto
-import grpclib
 from grpclib import GRPCError
 from grpclib.client import Channel
 
 from nitric.application import Nitric
-from nitric.bidi import AsyncNotifierList
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
 from nitric.context import (
     FunctionServer,
     Record,
@@ -37,10 +36,12 @@ from nitric.context import (
     WebsocketHandler,
     WebsocketMessageRequest,
     WebsocketRequest,
+    _as_async_handler,
 )
-from nitric.exception import exception_from_grpc_error
+from nitric.dispatch import KeyedDispatcher, drain, run_handler
+from nitric.exception import HandlerTimeoutException, exception_from_grpc_error
 from nitric.proto.resources.v1 import Action, PolicyResource, ResourceDeclareRequest, ResourceIdentifier, ResourceType
-from nitric.proto.websockets.v1 import ClientMessage, RegistrationRequest
+from nitric.proto.websockets.v1 import ClientMessage, RegistrationRequest, ServerMessage
 from nitric.proto.websockets.v1 import WebsocketConnectionResponse as ProtoWebsocketConnectionResponse
 from nitric.proto.websockets.v1 import (
     WebsocketEventRequest,
@@ -130,14 +131,23 @@ class Websocket(BaseResource):
         """Send a message to a connection on this socket."""
         await self._websocket.send(socket=self.name, connection_id=connection_id, data=data)
 
-    def on(self, event_type: WebsocketEventType) -> Callable[[WebsocketHandler], None]:
-        """Create and return a worker decorator for this socket."""
+    def on(
+        self, event_type: WebsocketEventType, max_in_flight: int = 1, timeout: Optional[float] = None
+    ) -> Callable[[WebsocketHandler], None]:
+        """
+        Create and return a worker decorator for this socket.
+
+        Events for the same connection are always handled in order, up to max_in_flight connections are handled
+        concurrently. Handlers running longer than timeout seconds are cancelled, rejecting connection events.
+        """
 
         def decorator(func: WebsocketHandler) -> None:
             WebsocketWorker(
                 socket_name=self.name,
                 event_type=event_type,
                 handler=func,
+                max_in_flight=max_in_flight,
+                timeout=timeout,
             )
 
         return decorator
@@ -183,58 +193,95 @@ class WebsocketWorker(FunctionServer):
 
     _handler: WebsocketHandler
     _registration_request: RegistrationRequest
-    _responses: AsyncNotifierList[ClientMessage]
+    _responses: BoundedAsyncQueue[ClientMessage]
+    _dispatcher: KeyedDispatcher
+    _timeout: Optional[float]
+    _supervisor: StreamSupervisor
 
     def __init__(
-        self, socket_name: str, event_type: Literal["connect", "disconnect", "message"], handler: WebsocketHandler
+        self,
+        socket_name: str,
+        event_type: Literal["connect", "disconnect", "message"],
+        handler: WebsocketHandler,
+        max_in_flight: int = 1,
+        timeout: Optional[float] = None,
     ):
         """Construct a new WebsocketHandler."""
-        self._handler = handler
-        self._responses = AsyncNotifierList()
+        self._handler = _as_async_handler(handler)
+        self._responses = BoundedAsyncQueue()
+        # Each connection gets its own lane, which is evicted as soon as its events have been handled,
+        # so lanes for disconnected clients never outlive their final event.
+        name = f"websocket {socket_name} {event_type} handler"
+        self._dispatcher = KeyedDispatcher(max_in_flight=max_in_flight, name=name)
+        self._timeout = timeout
         self._registration_request = RegistrationRequest(
             socket_name=socket_name, event_type=_to_grpc_event_type(event_type)
         )
+        self._supervisor = StreamSupervisor(name)
 
         Nitric._register_worker(self)
 
-    async def _ws_request_iterator(self):
+    async def _ws_request_iterator(self, responses: BoundedAsyncQueue[ClientMessage]):
         # Register with the server
         yield ClientMessage(registration_request=self._registration_request)
         # wait for any responses for the server and send them
-        async for response in self._responses:
+        async for response in responses:
             yield response
 
-    async def start(self) -> None:
-        """Register this websocket handler and listen for messages."""
+    async def _handle_event(self, server_msg: ServerMessage, responses: BoundedAsyncQueue[ClientMessage]) -> None:
+        """Run the handler for a single websocket event and queue its response."""
+        ctx = _websocket_context_from_proto(server_msg.websocket_event_request)
+
+        response: ClientMessage
+        try:
+            result = await run_handler(self._handler, ctx, self._timeout, self._supervisor.name)
+            ctx = result if result else ctx
+            response = ClientMessage(id=server_msg.id, websocket_event_response=WebsocketEventResponse())
+            if isinstance(ctx.res, WebsocketConnectionResponse):
+                response.websocket_event_response.connection_response.reject = ctx.res.reject
+        except Exception as e:  # pylint: disable=broad-except
+            if isinstance(e, HandlerTimeoutException):
+                logging.warning(e)
+            else:
+                logging.exception("An unhandled error occurred in a websocket event handler: %s", e)
+            response = ClientMessage(id=server_msg.id, websocket_event_response=WebsocketEventResponse())
+            if isinstance(ctx.req, WebsocketConnectionRequest):
+                response.websocket_event_response.connection_response.reject = True
+        await responses.add_item(response)
+
+    async def _serve(self) -> None:
+        """Open a single stream, register this websocket handler and handle events until the stream ends."""
         channel = ChannelManager.get_channel()
         server = WebsocketHandlerStub(channel=channel)
+        # responses are only valid on the stream their events arrived on
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+        self._responses = responses
 
         try:
-            async for server_msg in server.handle_events(self._ws_request_iterator()):
+            async for server_msg in server.handle_events(self._ws_request_iterator(responses)):
                 msg_type, _ = betterproto.which_one_of(server_msg, "content")
 
                 if msg_type == "registration_response":
+                    self._supervisor.registered()
                     continue
                 if msg_type == "websocket_event_request":
-                    ctx = _websocket_context_from_proto(server_msg.websocket_event_request)
-
-                    response: ClientMessage
-                    try:
-                        result = await self._handler(ctx)
-                        ctx = result if result else ctx
-                        response = ClientMessage(id=server_msg.id, websocket_event_response=WebsocketEventResponse())
-                        if isinstance(ctx.res, WebsocketConnectionResponse):
-                            response.websocket_event_response.connection_response.reject = ctx.res.reject
-                    except Exception as e:  # pylint: disable=broad-except
-                        logging.exception("An unhandled error occurred in a websocket event handler: %s", e)
-                        response = ClientMessage(id=server_msg.id, websocket_event_response=WebsocketEventResponse())
-                        if isinstance(ctx.req, WebsocketConnectionRequest):
-                            response.websocket_event_response.connection_response.reject = True
-                    await self._responses.add_item(response)
-        except grpclib.exceptions.GRPCError as e:
-            print(f"Stream terminated: {e.message}")
-        except grpclib.exceptions.StreamTerminatedError:
-            print("Stream from membrane closed.")
+                    evt_type, _ = betterproto.which_one_of(server_msg.websocket_event_request, "websocket_event")
+                    if self._supervisor.stopped and evt_type == "connection":
+                        # draining, events for existing connections are still handled but new ones are refused
+                        reject = WebsocketEventResponse()
+                        reject.connection_response.reject = True
+                        await responses.add_item(ClientMessage(id=server_msg.id, websocket_event_response=reject))
+                        continue
+                    await self._dispatcher.submit_keyed(
+                        server_msg.websocket_event_request.connection_id, self._handle_event, server_msg, responses
+                    )
         finally:
-            print("Closing client stream")
-            channel.close()
+            responses.close()
+
+    async def start(self) -> None:
+        """Register this websocket handler and listen for messages."""
+        await self._supervisor.run(self._serve)
+
+    async def drain(self, grace_period: float) -> None:
+        """Stop accepting new connections and wait for in-flight events to complete."""
+        await drain(self._supervisor, self._dispatcher, self._responses, grace_period)
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Generic, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class RouteMatch(Generic[T]):
+    """
+    The result of matching a request against a Router.
+
+    value (T): the value registered for the request's path and method, None if the path only has other methods
+    params (Dict[str, str]): the values of the path's :param segments
+    allowed (List[str]): the methods registered for the path
+    """
+
+    value: Optional[T]
+    params: Dict[str, str]
+    allowed: List[str]
+
+
+class _Node(Generic[T]):
+    """A path segment in the router's trie."""
+
+    __slots__ = ("static", "param", "param_name", "values")
+
+    static: Dict[str, _Node[T]]
+    param: Optional[_Node[T]]
+    param_name: Optional[str]
+    values: Dict[str, T]
+
+    def __init__(self) -> None:
+        self.static = {}
+        self.param = None
+        self.param_name = None
+        self.values = {}
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class Router(Generic[T]):
+    """
+    Matches request paths and methods to registered values, using the same path syntax as API routes.
+
+    Paths are stored as a trie of segments, where a segment starting with ":" captures a path param, e.g.
+    "/customers/:id". Static segments take priority over params. Paths without any params are also indexed directly,
+    so matching them is a single lookup.
+    """
+
+    _root: _Node[T]
+    _static: Dict[str, Dict[str, T]]
+
+    def __init__(self) -> None:
+        """Construct a new, empty Router."""
+        self._root = _Node()
+        self._static = {}
+
+    def add(self, path: str, methods: Iterable[str], value: T) -> None:
+        """Register a value for requests to path with any of the given methods."""
+        segments = _segments(path)
+        node = self._root
+        for segment in segments:
+            if not segment.startswith(":"):
+                node = node.static.setdefault(segment, _Node())
+                continue
+
+            name = segment[1:]
+            if node.param is None:
+                node.param = _Node()
+                node.param_name = name
+            elif node.param_name != name:
+                raise ValueError(f"{path} names the path param :{name}, but another route names it :{node.param_name}")
+            node = node.param
+
+        for method in methods:
+            if method in node.values:
+                raise ValueError(f"A {method} route for {path} has already been registered")
+            node.values[method] = value
+
+        if not any(segment.startswith(":") for segment in segments):
+            self._static["/" + "/".join(segments)] = node.values
+
+    def match(self, method: str, path: str) -> Optional[RouteMatch[T]]:
+        """Return the value and params registered for a request, or None if no route matches its path."""
+        params: Dict[str, str] = {}
+        values = self._static.get(path)
+        if values is None:
+            node = self._match(self._root, _segments(path), 0, params)
+            if node is None:
+                return None
+            values = node.values
+
+        return RouteMatch(value=values.get(method), params=params, allowed=list(values))
+
+    def _match(self, node: _Node[T], segments: List[str], index: int, params: Dict[str, str]) -> Optional[_Node[T]]:
+        if index == len(segments):
+            return node if node.values else None
+
+        segment = segments[index]
+        static = node.static.get(segment)
+        if static is not None:
+            matched = self._match(static, segments, index + 1, params)
+            if matched is not None:
+                return matched
+
+        if node.param is not None and node.param_name is not None:
+            matched = self._match(node.param, segments, index + 1, params)
+            if matched is not None:
+                params[node.param_name] = segment
+                return matched
+
+        return None
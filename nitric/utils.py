@@ -32,8 +32,13 @@ def dict_from_struct(struct: Optional[Struct]) -> dict[Any, Any]:
     # in order to use the MessageToDict function to safely create a dict.
     if struct is None:
         return {}
+    return dict_from_struct_bytes(bytes(struct))
+
+
+def dict_from_struct_bytes(data: bytes) -> dict[Any, Any]:
+    """Construct a dict from the serialized bytes of a Struct."""
     gpb_struct = WorkingStruct()
-    gpb_struct.ParseFromString(bytes(struct))
+    gpb_struct.ParseFromString(data)
     return MessageToDict(gpb_struct)
 
 
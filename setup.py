@@ -52,6 +52,12 @@ setuptools.setup(
         "opentelemetry-instrumentation-grpc",
     ],
     extras_require={
+        "uvloop": ["uvloop>=0.17; sys_platform != 'win32'"],
+        "uvicorn": ["uvicorn>=0.22"],
+        "hypercorn": ["hypercorn>=0.14"],
+        "orjson": ["orjson>=3.9"],
+        "msgspec": ["msgspec>=0.18"],
+        "compression": ["brotli>=1.0", "zstandard>=0.21"],
         "dev": [
             "tox==3.20.1",
             "twine==3.2.0",
@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, AsyncMock
 
@@ -37,14 +38,17 @@ from nitric.proto.resources.v1 import (
     ApiScopes,
 )
 
-from nitric.proto.apis.v1 import ApiDetailsResponse, ApiDetailsRequest, ApiWorkerScopes
+from nitric.proto.apis.v1 import ApiDetailsResponse, ApiDetailsRequest, ApiWorkerScopes, ServerMessage
+from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
+from nitric.proto.apis.v1 import HttpResponse as ProtoHttpResponse
 
 from nitric.context import (
     HttpContext,
     HttpMethod,
 )
 
-from nitric.resources.apis import Method, Route, RouteOptions, Api
+from nitric.resources.apis import Method, Route, RouteOptions, Api, ApiRouteWorker
+from nitric.metrics import handler_timeouts, requests_shed
 
 # pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
 
@@ -375,3 +379,380 @@ class ApiTest(IsolatedAsyncioTestCase):
 
         assert len(test_api.routes) == 1
         assert test_api.routes[0].path == "/api/v2/hello"
+
+    async def test_route_worker_dispatches_requests_concurrently(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-concurrent", ApiOptions(max_in_flight=2))
+
+        release = asyncio.Event()
+        in_flight = []
+
+        async def handler(ctx: HttpContext):
+            in_flight.append(ctx.req.path)
+            await release.wait()
+            ctx.res.body = ctx.req.path
+
+        test_route = Route(test_api, "/slow", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions()).server
+
+        assert server._dispatcher.max_in_flight == 2
+
+        async def serve(_stub, _requests):
+            for i in range(2):
+                yield ServerMessage(id=str(i), http_request=ProtoHttpRequest(method="GET", path=f"/slow/{i}"))
+            # both requests are in flight before either completes
+            await asyncio.sleep(0)
+            assert in_flight == ["/slow/0", "/slow/1"]
+            release.set()
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        responses = list(server._responses.items)
+        assert sorted(r.id for r in responses) == ["0", "1"]
+        assert all(r.http_response.status == 200 for r in responses)
+
+    def test_route_rejects_max_in_flight_below_one(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-no-slots")
+            no_slots_api = api("test-api-no-slots-default", ApiOptions(max_in_flight=0))
+
+        with pytest.raises(ValueError):
+            test_api.get("/none", opts=MethodOptions(max_in_flight=0))(AsyncMock())
+        with pytest.raises(ValueError):
+            no_slots_api.get("/none")(AsyncMock())
+
+    async def test_route_worker_times_out_slow_requests(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-timeout")
+
+        async def handler(ctx: HttpContext):
+            await asyncio.sleep(10)
+
+        test_route = Route(test_api, "/slow", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions(timeout=0.01)).server
+
+        async def serve(_stub, _requests):
+            yield ServerMessage(id="1", http_request=ProtoHttpRequest(method="GET", path="/slow"))
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        [response] = list(server._responses.items)
+        assert response.http_response.status == 504
+        assert handler_timeouts.get(server._supervisor.name) == 1
+
+    async def test_route_worker_sheds_requests_beyond_max_queue_depth(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-shed-depth")
+
+        release = asyncio.Event()
+
+        async def handler(ctx: HttpContext):
+            await release.wait()
+
+        test_route = Route(test_api, "/busy", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions(max_queue_depth=1)).server
+
+        async def serve(_stub, _requests):
+            # the first request runs, the second waits and the third is rejected
+            for i in range(3):
+                yield ServerMessage(id=str(i), http_request=ProtoHttpRequest(method="GET", path="/busy"))
+                await asyncio.sleep(0)
+            release.set()
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        statuses = {r.id: r.http_response.status for r in server._responses.items}
+        assert statuses == {"0": 200, "1": 200, "2": 503}
+        [shed] = [r for r in server._responses.items if r.id == "2"]
+        assert shed.http_response.headers["Retry-After"].value == ["1"]
+        assert requests_shed.get(server._supervisor.name) == 1
+
+    async def test_route_worker_sheds_requests_that_waited_too_long(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-shed-wait")
+
+        handled = []
+
+        async def handler(ctx: HttpContext):
+            handled.append(ctx.req.path)
+            await asyncio.sleep(0.05)
+
+        test_route = Route(test_api, "/slow", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions(max_queue_wait=0.01)).server
+
+        async def serve(_stub, _requests):
+            for i in range(2):
+                yield ServerMessage(id=str(i), http_request=ProtoHttpRequest(method="GET", path=f"/slow/{i}"))
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        statuses = {r.id: r.http_response.status for r in server._responses.items}
+        assert statuses == {"0": 200, "1": 503}
+        assert handled == ["/slow/0"]
+
+    async def test_sheds_requests_queued_behind_a_blocked_handler_when_their_wait_expires(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-blocked")
+
+        release = asyncio.Event()
+
+        async def handler(ctx: HttpContext):
+            await release.wait()
+
+        test_route = Route(test_api, "/blocked", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions(max_queue_wait=0.01)).server
+        statuses_while_blocked = {}
+
+        async def serve(_stub, _requests):
+            for i in range(2):
+                yield ServerMessage(id=str(i), http_request=ProtoHttpRequest(method="GET", path="/blocked"))
+            await asyncio.sleep(0.05)
+            statuses_while_blocked.update({r.id: r.http_response.status for r in server._responses.items})
+            release.set()
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        assert statuses_while_blocked == {"1": 503}
+        assert server._dispatcher.waiting == 0
+        assert {r.id: r.http_response.status for r in server._responses.items} == {"0": 200, "1": 503}
+
+    async def test_route_worker_serves_requests_with_its_own_respond(self):
+        async def respond(request: ProtoHttpRequest) -> ProtoHttpResponse:
+            return ProtoHttpResponse(status=202, body=request.path.encode())
+
+        server = ApiRouteWorker("test-api-respond", "/raw", [HttpMethod.GET], None, MethodOptions(), respond=respond)
+
+        async def serve(_stub, _requests):
+            yield ServerMessage(id="0", http_request=ProtoHttpRequest(method="GET", path="/raw"))
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        [response] = [r.http_response for r in server._responses.items if r.id == "0"]
+        assert response.status == 202
+        assert response.body == b"/raw"
+
+        with pytest.raises(ValueError):
+            ApiRouteWorker(
+                "test-api-respond", "/raw", [HttpMethod.GET], AsyncMock(), MethodOptions(), respond=respond
+            )
+
+    async def test_draining_route_rejects_new_requests_and_completes_in_flight_ones(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-drain", ApiOptions(max_in_flight=2))
+
+        async def handler(ctx: HttpContext):
+            await asyncio.sleep(0.01)
+            ctx.res.body = "done"
+
+        test_route = Route(test_api, "/drain", opts=RouteOptions())
+        server = Method(test_route, [HttpMethod.GET], handler, opts=MethodOptions()).server
+        sent = []
+
+        async def serve(_stub, requests):
+            async def send():
+                async for msg in requests:
+                    sent.append(msg)
+
+            sending = asyncio.ensure_future(send())
+            yield ServerMessage(id="0", http_request=ProtoHttpRequest(method="GET", path="/drain"))
+            await asyncio.sleep(0)
+            draining = asyncio.ensure_future(server.drain(1))
+            await asyncio.sleep(0)
+            yield ServerMessage(id="1", http_request=ProtoHttpRequest(method="GET", path="/drain"))
+            await draining
+            await sending
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        statuses = {msg.id: msg.http_response.status for msg in sent if msg.id}
+        assert statuses == {"0": 200, "1": 503}
+        assert server._supervisor.stopped
+
+    async def test_router_mode_serves_every_route_over_one_stream(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-router", ApiOptions(path="/v1", router=True, max_in_flight=4))
+
+        @test_api.get("/customers/:id")
+        async def get_customer(ctx: HttpContext):
+            ctx.res.body = f"customer {ctx.req.params['id']}"
+
+        @test_api.post("/customers")
+        async def create_customer(ctx: HttpContext):
+            ctx.res.status = 201
+
+        server = test_api._router.server
+        assert server._registration_request.path == "/v1/*"
+        assert server._registration_request.methods == [method.value for method in HttpMethod]
+
+        requests = [
+            ProtoHttpRequest(method="GET", path="/v1/customers/42"),
+            ProtoHttpRequest(method="POST", path="/v1/customers"),
+            ProtoHttpRequest(method="DELETE", path="/v1/customers"),
+            ProtoHttpRequest(method="GET", path="/v1/orders"),
+        ]
+
+        async def serve(_stub, _requests):
+            for i, request in enumerate(requests):
+                yield ServerMessage(id=str(i), http_request=request)
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        responses = {r.id: r.http_response for r in server._responses.items}
+        assert responses["0"].status == 200
+        assert responses["0"].body == b"customer 42"
+        assert responses["1"].status == 201
+        assert responses["2"].status == 405
+        assert responses["2"].headers["Allow"].value == ["POST"]
+        assert responses["3"].status == 404
+
+    async def test_router_mode_sheds_requests_beyond_the_apis_max_queue_depth(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-router-shed", ApiOptions(router=True, max_queue_depth=1))
+
+        release = asyncio.Event()
+
+        @test_api.get("/busy")
+        async def busy(ctx: HttpContext):
+            await release.wait()
+
+        server = test_api._router.server
+
+        async def serve(_stub, _requests):
+            # the first request runs, the second waits and the third is rejected
+            for i in range(3):
+                yield ServerMessage(id=str(i), http_request=ProtoHttpRequest(method="GET", path="/busy"))
+                await asyncio.sleep(0)
+            release.set()
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        statuses = {r.id: r.http_response.status for r in server._responses.items}
+        assert statuses == {"0": 200, "1": 200, "2": 503}
+
+    async def test_router_mode_runs_different_routes_at_the_same_time(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-router-concurrent", ApiOptions(router=True))
+            limited_api = api("test-api-router-limited", ApiOptions(router=True, router_max_in_flight=1))
+
+        for router_api in (test_api, limited_api):
+            started = []
+            both_started = asyncio.Event()
+
+            async def handler(ctx: HttpContext):
+                started.append(ctx.req.path)
+                if len(started) == 2:
+                    both_started.set()
+                await asyncio.wait_for(both_started.wait(), 0.1)
+
+            router_api.get("/customers")(handler)
+            router_api.get("/orders")(handler)
+            server = router_api._router.server
+
+            async def serve(_stub, _requests):
+                yield ServerMessage(id="0", http_request=ProtoHttpRequest(method="GET", path="/customers"))
+                yield ServerMessage(id="1", http_request=ProtoHttpRequest(method="GET", path="/orders"))
+                await server._dispatcher.join()
+
+            with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch(
+                "nitric.channel.ChannelManager.get_channel"
+            ):
+                await server._serve()
+
+            statuses = {r.id: r.http_response.status for r in server._responses.items}
+            if router_api is test_api:
+                # each route has a slot of its own, as it would without the router
+                assert server._dispatcher.max_in_flight == 2
+                assert statuses == {"0": 200, "1": 200}
+            else:
+                # the first request gives up waiting for the second, which can't start until it's done
+                assert server._dispatcher.max_in_flight == 1
+                assert statuses == {"0": 500, "1": 200}
+
+    def test_router_mode_rejects_route_concurrency_and_shedding_options(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-router-route-options", ApiOptions(router=True))
+
+        for opts in [
+            MethodOptions(max_in_flight=2),
+            MethodOptions(weight=2.0),
+            MethodOptions(reserved=1),
+            MethodOptions(max_queue_depth=1),
+            MethodOptions(max_queue_wait=1.0),
+        ]:
+            with pytest.raises(ValueError):
+                test_api.get("/limited", opts=opts)(AsyncMock())
+
+    def test_router_mode_rejects_route_security(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-router-security", ApiOptions(router=True))
+
+        with pytest.raises(ValueError):
+            test_api.get("/secure", opts=MethodOptions(security=[]))(AsyncMock())
+
+    async def test_mount_asgi_app(self):
+        mock_declare = AsyncMock()
+
+        with patch("nitric.proto.resources.v1.ResourcesStub.declare", mock_declare):
+            test_api = api("test-api-asgi", ApiOptions(path="/v1"))
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": f"{scope['root_path']} {scope['path']}".encode()})
+
+        with patch("nitric.application.Nitric._register_worker") as mock_register:
+            test_api.mount("/app", app)
+        server = mock_register.call_args.args[0]
+
+        assert server._registration_request.path == "/v1/app/*"
+
+        async def serve(_stub, _requests):
+            yield ServerMessage(id="0", http_request=ProtoHttpRequest(method="GET", path="/v1/app/items"))
+            await server._dispatcher.join()
+
+        with patch("nitric.proto.apis.v1.ApiStub.serve", serve), patch("nitric.channel.ChannelManager.get_channel"):
+            await server._serve()
+
+        response = server._responses.items[0].http_response
+        assert response.status == 200
+        assert response.body == b"/v1/app /v1/app/items"
@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 from datetime import timedelta
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, patch
@@ -26,6 +27,10 @@ from grpclib import GRPCError, Status
 from nitric.exception import UnknownException
 from nitric.proto.resources.v1 import Action, PolicyResource, ResourceDeclareRequest, ResourceIdentifier, ResourceType
 from nitric.proto.storage.v1 import (
+    BlobEvent,
+    BlobEventRequest,
+    BlobEventType,
+    ServerMessage,
     StorageDeleteRequest,
     StoragePreSignUrlRequest,
     StoragePreSignUrlRequestOperation,
@@ -36,7 +41,7 @@ from nitric.proto.storage.v1 import (
 
 # from nitric.proto.storage.v1 import StorageWriteRequest
 from nitric.resources import bucket
-from nitric.resources.buckets import BucketRef
+from nitric.resources.buckets import BucketNotificationContext, BucketRef, Listener
 
 # pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
 
@@ -334,3 +339,42 @@ class BucketTest(IsolatedAsyncioTestCase):
                 ),
             )
         )
+
+    async def test_listener_serializes_events_per_key(self):
+        events = []
+
+        async def handler(ctx: BucketNotificationContext):
+            label = f"{ctx.req.key}:{ctx.req.notification_type.name}"
+            events.append(f"start {label}")
+            await asyncio.sleep(0.01 if label == "a:Created" else 0)
+            events.append(f"end {label}")
+
+        listener = Listener(
+            bucket_name="test-bucket",
+            notification_type="write",
+            notification_prefix_filter="",
+            handler=handler,
+            max_in_flight=3,
+        )
+
+        async def listen(_stub, _requests):
+            for i, (key, event_type) in enumerate(
+                [("a", BlobEventType.Created), ("a", BlobEventType.Deleted), ("b", BlobEventType.Created)]
+            ):
+                yield ServerMessage(
+                    id=str(i),
+                    blob_event_request=BlobEventRequest(
+                        bucket_name="test-bucket", blob_event=BlobEvent(key=key, type=event_type)
+                    ),
+                )
+            await listener._dispatcher.join()
+
+        with patch("nitric.proto.storage.v1.StorageListenerStub.listen", listen), patch(
+            "nitric.channel.ChannelManager.get_channel"
+        ):
+            await listener._serve()
+
+        # the delete of "a" is never reordered ahead of its write, "b" is handled alongside
+        assert events.index("end a:Created") < events.index("start a:Deleted")
+        assert events.index("start b:Created") < events.index("end a:Created")
+        assert len(listener._responses.items) == 3
@@ -0,0 +1,88 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import pytest
+
+from nitric.resources.http import HttpWorker, http, serve_hypercorn, serve_uvicorn
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class HttpWorkerTest(IsolatedAsyncioTestCase):
+    async def test_registers_the_server_and_drains(self):
+        served = []
+        proxied = []
+
+        async def server(app, host, port, shutdown):
+            served.append((app, host, port))
+            await shutdown.wait()
+            served.append("shutdown")
+
+        async def proxy(_stub, requests):
+            async for request in requests:
+                proxied.append(request.request.host)
+            return
+            yield
+
+        app = object()
+        with patch("nitric.application.Nitric._register_worker"):
+            worker = http(app, host="127.0.0.1", port=9000, server=server)
+
+        with patch("nitric.proto.http.v1.HttpStub.proxy", proxy), patch("nitric.channel.ChannelManager.get_channel"):
+            started = asyncio.create_task(worker.start())
+            await asyncio.sleep(0.01)
+            assert served == [(app, "127.0.0.1", 9000)]
+            assert proxied == ["127.0.0.1:9000"]
+            # the membrane never replies to the proxy request
+            assert worker._supervisor.connected
+
+            await worker.drain(1)
+            await asyncio.wait_for(started, 1)
+
+        assert served[-1] == "shutdown"
+
+    async def test_server_failure_stops_the_worker(self):
+        async def server(app, host, port, shutdown):
+            raise OSError("address already in use")
+
+        async def proxy(_stub, requests):
+            async for _ in requests:
+                pass
+            return
+            yield
+
+        with patch("nitric.application.Nitric._register_worker"):
+            worker = HttpWorker(object(), host="localhost", port=9000, server=server)
+
+        with patch("nitric.proto.http.v1.HttpStub.proxy", proxy), patch("nitric.channel.ChannelManager.get_channel"):
+            with pytest.raises(OSError):
+                await asyncio.wait_for(worker.start(), 1)
+
+    def test_default_server(self):
+        with patch("nitric.application.Nitric._register_worker"):
+            with patch("importlib.util.find_spec", lambda name: object() if name == "hypercorn" else None):
+                assert HttpWorker(object(), "localhost", 9000)._server is serve_hypercorn
+            with patch("importlib.util.find_spec", lambda name: object()):
+                assert HttpWorker(object(), "localhost", 9000)._server is serve_uvicorn
+            with patch("importlib.util.find_spec", lambda name: None):
+                with pytest.raises(ImportError):
+                    HttpWorker(object(), "localhost", 9000)
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import pytest
+
+from nitric.bidi import BoundedAsyncQueue
+from nitric.context import JobContext
+from nitric.proto.batch.v1 import ClientMessage, JobData, JobRequest, ServerMessage
+from nitric.resources.job import JobHandler
+from nitric.utils import struct_from_dict
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+PARENT_PID = os.getpid()
+
+
+async def sums_in_child_process(ctx: JobContext) -> JobContext:
+    ctx.res.success = os.getpid() != PARENT_PID and sum(ctx.req.data["values"]) == 6
+    return ctx
+
+
+def fails(ctx: JobContext) -> None:
+    raise ValueError("bad input")
+
+
+def returns_failed_context(ctx: JobContext) -> JobContext:
+    failed = JobContext(request=ctx.req)
+    failed.res.success = False
+    return failed
+
+
+def job_request(msg_id: str, data: dict) -> ServerMessage:
+    return ServerMessage(id=msg_id, job_request=JobRequest(data=JobData(struct=struct_from_dict(data))))
+
+
+# the job pool is forked from the test process, which runs other threads, as documented on JobHandler
+forks_with_threads = pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+
+
+class JobHandlerTest(IsolatedAsyncioTestCase):
+    def test_pool_is_sized_from_cpus(self):
+        handler = JobHandler("test-job-sized", sums_in_child_process, cpus=2.5, process_pool=True)
+
+        assert handler._pool_size == 3
+        assert handler._dispatcher.max_in_flight == 3
+
+    @forks_with_threads
+    async def test_runs_handler_in_process_pool(self):
+        handler = JobHandler("test-job-pool", sums_in_child_process, cpus=1, process_pool=True)
+
+        async def serve(_stub, _requests):
+            yield job_request("1", {"values": [1, 2, 3]})
+            await handler._dispatcher.join()
+
+        try:
+            with patch("nitric.proto.batch.v1.JobStub.handle_job", serve), patch(
+                "nitric.channel.ChannelManager.get_channel"
+            ):
+                await handler._serve()
+        finally:
+            await handler.drain(1)
+
+        [response] = list(handler._responses.items)
+        assert response.id == "1"
+        assert response.job_response.success
+
+    @forks_with_threads
+    async def test_process_pool_exceptions_fail_the_job(self):
+        handler = JobHandler("test-job-pool-fails", fails, cpus=1, process_pool=True)
+        responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+
+        try:
+            with self.assertLogs(level="ERROR") as logs:
+                await handler._handle_job(job_request("1", {}), responses)
+        finally:
+            await handler.drain(1)
+
+        [response] = list(responses.items)
+        assert not response.job_response.success
+        assert "bad input" in logs.output[0]
+
+    @forks_with_threads
+    async def test_returned_context_decides_success_in_both_modes(self):
+        for process_pool in (False, True):
+            handler = JobHandler(f"test-job-returned-{process_pool}", returns_failed_context, process_pool=process_pool)
+            responses: BoundedAsyncQueue[ClientMessage] = BoundedAsyncQueue()
+
+            try:
+                await handler._handle_job(job_request("1", {}), responses)
+            finally:
+                await handler.drain(1)
+
+            [response] = list(responses.items)
+            assert not response.job_response.success
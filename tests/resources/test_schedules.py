@@ -16,9 +16,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
 
-from nitric.resources import schedule, ScheduleServer
+from nitric.metrics import schedule_run_duration, schedule_skipped_ticks
+from nitric.proto.schedules.v1 import IntervalRequest, ServerMessage
+from nitric.resources import OverlapPolicy, schedule, ScheduleServer
 
 
 # pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
@@ -108,3 +112,96 @@ class ApiTest(IsolatedAsyncioTestCase):
     #         pytest.fail()
     #     except Exception as e:
     #         assert str(e).startswith("invalid rate expression, frequency") is True
+
+
+class OverlapPolicyTest(IsolatedAsyncioTestCase):
+    async def _serve_ticks(self, schedule_server: ScheduleServer, ticks: int) -> list:
+        async def serve(_stub, _requests):
+            for i in range(ticks):
+                yield ServerMessage(id=str(i), interval_request=IntervalRequest(schedule_name="test"))
+                await asyncio.sleep(0)
+            await schedule_server._dispatcher.join()
+
+        with patch("nitric.proto.schedules.v1.SchedulesStub.schedule", serve), patch(
+            "nitric.channel.ChannelManager.get_channel"
+        ):
+            await schedule_server._serve()
+
+        return [r.id for r in schedule_server._responses.items]
+
+    async def test_skip_acknowledges_ticks_while_running(self):
+        release = asyncio.Event()
+        runs = []
+
+        async def handler(ctx):
+            runs.append(ctx)
+            await release.wait()
+
+        schedule_server = schedule("test-schedule-skip").every("5 minutes", overlap="skip")(handler)
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        acked = await self._serve_ticks(schedule_server, 3)
+
+        assert len(runs) == 1
+        # the skipped ticks are acknowledged straight away, before the run completes
+        assert acked == ["1", "2", "0"]
+        assert schedule_skipped_ticks.get(schedule_server._supervisor.name) == 2
+        assert schedule_run_duration.count(schedule_server._supervisor.name) == 1
+
+    async def test_queue_is_bounded(self):
+        release = asyncio.Event()
+        runs = []
+
+        async def handler(ctx):
+            runs.append(ctx)
+            await release.wait()
+
+        schedule_server = schedule("test-schedule-queue").every("5 minutes", overlap=OverlapPolicy.QUEUE, max_queued=1)(
+            handler
+        )
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        acked = await self._serve_ticks(schedule_server, 3)
+
+        assert len(runs) == 2
+        assert acked == ["2", "0", "1"]
+
+    async def test_queue_of_zero_runs_ticks_while_idle(self):
+        runs = []
+
+        async def handler(ctx):
+            runs.append(ctx)
+
+        schedule_server = schedule("test-schedule-queue-zero").every(
+            "5 minutes", overlap=OverlapPolicy.QUEUE, max_queued=0
+        )(handler)
+
+        async def serve(_stub, _requests):
+            for i in range(3):
+                yield ServerMessage(
+                    id=str(i), interval_request=IntervalRequest(schedule_name="test-schedule-queue-zero")
+                )
+                await schedule_server._dispatcher.join()
+
+        with patch("nitric.proto.schedules.v1.SchedulesStub.schedule", serve), patch(
+            "nitric.channel.ChannelManager.get_channel"
+        ):
+            await schedule_server._serve()
+
+        assert len(runs) == 3
+
+    async def test_concurrent_runs_up_to_max_concurrent(self):
+        release = asyncio.Event()
+        running = []
+
+        async def handler(ctx):
+            running.append(ctx)
+            await release.wait()
+
+        schedule_server = schedule("test-schedule-concurrent").cron(
+            "* * * * *", overlap=OverlapPolicy.CONCURRENT, max_concurrent=2
+        )(handler)
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        acked = await self._serve_ticks(schedule_server, 3)
+
+        assert len(running) == 2
+        assert sorted(acked) == ["0", "1", "2"]
+        assert schedule_skipped_ticks.get(schedule_server._supervisor.name) == 1
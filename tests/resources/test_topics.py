@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, Mock, patch
 
@@ -24,9 +25,11 @@ from grpclib import GRPCError, Status
 
 from nitric.exception import UnknownException
 from nitric.proto.resources.v1 import Action, PolicyResource, ResourceDeclareRequest, ResourceIdentifier, ResourceType
-from nitric.proto.topics.v1 import TopicMessage, TopicPublishRequest
+from nitric.context import MessageContext
+from nitric.proto.topics.v1 import MessageRequest as ProtoMessageRequest
+from nitric.proto.topics.v1 import ServerMessage, TopicMessage, TopicPublishRequest
 from nitric.resources import topic
-from nitric.resources.topics import TopicRef
+from nitric.resources.topics import Subscriber, TopicRef
 from nitric.utils import struct_from_dict
 
 # pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
@@ -106,3 +109,39 @@ class TopicTest(IsolatedAsyncioTestCase):
                 ),
             )
         )
+
+    async def test_subscriber_orders_messages_by_key(self):
+        events = []
+
+        async def handler(ctx: MessageContext):
+            events.append(f"start {ctx.req.data['id']}")
+            await asyncio.sleep(0.01 if ctx.req.data["id"] == "a1" else 0)
+            events.append(f"end {ctx.req.data['id']}")
+
+        subscriber = Subscriber(
+            topic_name="test-topic-ordered",
+            handler=handler,
+            max_in_flight=3,
+            ordering_key=lambda data: data["id"][0],
+        )
+
+        async def subscribe(_stub, _requests):
+            for msg_id in ["a1", "a2", "b1"]:
+                yield ServerMessage(
+                    id=msg_id,
+                    message_request=ProtoMessageRequest(
+                        topic_name="test-topic-ordered",
+                        message=TopicMessage(struct_payload=struct_from_dict({"id": msg_id})),
+                    ),
+                )
+            await subscriber._dispatcher.join()
+
+        with patch("nitric.proto.topics.v1.SubscriberStub.subscribe", subscribe), patch(
+            "nitric.channel.ChannelManager.get_channel"
+        ):
+            await subscriber._serve()
+
+        assert events.index("end a1") < events.index("start a2")
+        assert events.index("start b1") < events.index("end a1")
+        assert len(subscriber._responses.items) == 3
+        assert all(r.message_response.success for r in subscriber._responses.items)
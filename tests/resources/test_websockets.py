@@ -16,13 +16,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, Mock, patch
 
 from nitric.proto.resources.v1 import Action, PolicyResource, ResourceDeclareRequest, ResourceIdentifier, ResourceType
-from nitric.proto.websockets.v1 import WebsocketSendRequest
+from nitric.context import WebsocketContext
+from nitric.proto.websockets.v1 import (
+    ServerMessage,
+    WebsocketEventRequest,
+    WebsocketMessageEvent,
+    WebsocketSendRequest,
+)
 from nitric.resources import Websocket, websocket
-from nitric.resources.websockets import WebsocketRef
+from nitric.resources.websockets import WebsocketRef, WebsocketWorker
 
 # pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
 
@@ -77,6 +84,39 @@ class WebsocketTest(IsolatedAsyncioTestCase):
             )
         )
 
+    async def test_worker_orders_events_per_connection(self):
+        events = []
+
+        async def handler(ctx: WebsocketContext):
+            body = ctx.req.data.decode()
+            events.append(f"start {body}")
+            await asyncio.sleep(0.01 if body == "a1" else 0)
+            events.append(f"end {body}")
+
+        worker = WebsocketWorker(socket_name="test-websocket", event_type="message", handler=handler, max_in_flight=3)
+
+        async def handle_events(_stub, _requests):
+            for body in ["a1", "a2", "b1"]:
+                yield ServerMessage(
+                    id=body,
+                    websocket_event_request=WebsocketEventRequest(
+                        socket_name="test-websocket",
+                        connection_id=body[0],
+                        message=WebsocketMessageEvent(body=body.encode()),
+                    ),
+                )
+            await worker._dispatcher.join()
+
+        with patch("nitric.proto.websockets.v1.WebsocketHandlerStub.handle_events", handle_events), patch(
+            "nitric.channel.ChannelManager.get_channel"
+        ):
+            await worker._serve()
+
+        assert events.index("end a1") < events.index("start a2")
+        assert events.index("start b1") < events.index("end a1")
+        assert worker._dispatcher.lanes == 0
+        assert len(worker._responses.items) == 3
+
 
 class WebsocketClientTest(IsolatedAsyncioTestCase):
     async def test_send(self):
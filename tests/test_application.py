@@ -16,7 +16,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from unittest import IsolatedAsyncioTestCase
+import asyncio
+import os
+import signal
+import socket
+from unittest import IsolatedAsyncioTestCase, TestCase
 from unittest.mock import patch, AsyncMock, Mock
 
 import pytest
@@ -27,6 +31,8 @@ from nitric.proto.deployments.v1 import ScheduleEvery
 from nitric.proto.schedules.v1 import RegistrationRequest
 from nitric.resources import Bucket, schedule
 from nitric.application import Nitric
+from nitric.channel import ChannelManager
+from nitric.config import settings
 
 
 class Object(object):
@@ -59,6 +65,7 @@ class ApplicationTest(IsolatedAsyncioTestCase):
         mock_running_loop.side_effect = RuntimeError("loop is not running")
 
         mock_event_loop = Mock()
+        mock_event_loop.return_value.run_until_complete.side_effect = lambda coro: coro.close()
 
         with patch("asyncio.get_event_loop", mock_event_loop):
             with patch("asyncio.get_running_loop", mock_running_loop):
@@ -100,3 +107,168 @@ class ApplicationTest(IsolatedAsyncioTestCase):
 
                 mock_running_loop.assert_called_once()
                 mock_event_loop.assert_not_called()
+
+    def test_run_with_processes_forks_workers(self):
+        application = Nitric()
+        mock_prefork = Mock()
+
+        with patch("nitric.application.Nitric._run_prefork", mock_prefork):
+            application.run(processes=3)
+
+        mock_prefork.assert_called_once_with(3)
+
+    def test_prefork_restarts_crashed_processes(self):
+        exit_codes = iter([1, 0, 0])
+        started = []
+
+        def start_process(ctx, index):
+            proc = Mock()
+            proc.name = f"nitric-worker-{index}"
+            proc.exitcode = next(exit_codes)
+            proc.is_alive.return_value = False
+            started.append(index)
+            return proc
+
+        with patch("nitric.application.Nitric._start_worker_process", side_effect=start_process), patch(
+            "nitric.application.wait"
+        ), patch("nitric.application.time.sleep"):
+            Nitric._run_prefork(2)
+
+        # worker 0 crashed and was restarted, both then exited cleanly
+        assert started == [0, 1, 0]
+
+    def test_prefork_backs_off_and_exits_once_the_restart_limit_is_spent(self):
+        started = []
+        workers = []
+
+        def start_process(ctx, index):
+            proc = Mock()
+            proc.name = f"nitric-worker-{index}"
+            # worker 0 crashes as soon as it starts, worker 1 keeps running
+            proc.exitcode = 3 if index == 0 else None
+            proc.is_alive.return_value = index == 1
+            started.append(index)
+            workers.append(proc)
+            return proc
+
+        with patch("nitric.application.Nitric._start_worker_process", side_effect=start_process), patch(
+            "nitric.application.wait"
+        ), patch("nitric.application.time.sleep") as sleep, patch.object(settings, "PROCESS_RESTART_LIMIT", 6):
+            with pytest.raises(SystemExit) as exit_info:
+                Nitric._run_prefork(2)
+
+        assert exit_info.value.code == 3
+        assert started == [0, 1, 0, 0, 0, 0, 0, 0]
+        assert [call.args[0] for call in sleep.call_args_list] == [1, 2, 4, 8, 16, 30]
+        # the workers still running are stopped
+        workers[1].terminate.assert_called_once()
+
+    async def test_sigterm_drains_workers_before_closing_the_channel(self):
+        events = []
+
+        class Worker:
+            async def start(self):
+                events.append("started")
+                await asyncio.Event().wait()
+
+            async def drain(self, grace_period):
+                events.append(f"drained {grace_period}")
+
+        mock_close = Mock(side_effect=lambda: events.append("closed"))
+
+        async def terminate():
+            await asyncio.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        with patch.object(Nitric, "_workers", [Worker()]), patch.object(Nitric, "_handle", None), patch(
+            "nitric.channel.ChannelManager._close_channel", mock_close
+        ), patch("nitric.application.settings.DRAIN_GRACE_PERIOD", 5.0):
+            asyncio.ensure_future(terminate())
+            await asyncio.wait_for(Nitric._serve_until_terminated(), 1)
+
+        assert events == ["started", "drained 5.0", "closed"]
+
+    async def test_start_and_stop_on_the_running_loop(self):
+        events = []
+        running = asyncio.Event()
+
+        class Worker:
+            async def start(self):
+                events.append("started")
+                running.set()
+                await asyncio.Event().wait()
+
+            async def drain(self, grace_period):
+                events.append(f"drained {grace_period}")
+
+        with patch.object(Nitric, "_workers", [Worker()]), patch.object(Nitric, "_handle", None), patch(
+            "nitric.channel.ChannelManager._close_channel"
+        ):
+            handle = await Nitric.start()
+            # starting again returns the same handle
+            assert await Nitric.start() is handle
+
+            await asyncio.wait_for(running.wait(), 1)
+            assert not handle.done()
+
+            await Nitric.stop(grace_period=2)
+            await handle.stop()
+            await asyncio.wait_for(handle.wait(), 1)
+
+        assert handle.done()
+        assert events == ["started", "drained 2"]
+
+    async def test_handle_reports_unavailable_server(self):
+        class Worker:
+            async def start(self):
+                raise ConnectionRefusedError("refused")
+
+        with patch.object(Nitric, "_workers", [Worker()]), patch.object(Nitric, "_handle", None):
+            handle = await Nitric.start()
+            with pytest.raises(NitricUnavailableException):
+                await handle.wait()
+
+
+class EmbeddedStartTest(TestCase):
+    def test_start_in_asyncio_run_uses_the_channel_declared_on_another_loop(self):
+        # a listening socket accepts the channel's connection into its backlog, without serving it
+        server = socket.create_server(("127.0.0.1", 0))
+        host, port = server.getsockname()
+        declaring_loop = asyncio.new_event_loop()
+        connected = []
+
+        class Worker:
+            async def start(self):
+                channel = ChannelManager.get_channel()
+                await channel.__connect__()
+                connected.append(channel)
+                await asyncio.Event().wait()
+
+            async def drain(self, grace_period):
+                pass
+
+        async def embedded():
+            first = await Nitric.start()
+            await asyncio.sleep(0.01)
+            await Nitric.stop(grace_period=1)
+            # the app can be started again once it's been stopped
+            second = await Nitric.start()
+            await Nitric.stop(grace_period=1)
+            return first, second
+
+        try:
+            with patch.object(settings, "SERVICE_ADDRESS", f"{host}:{port}"), patch.object(
+                ChannelManager, "channel", None
+            ), patch.object(Nitric, "_workers", [Worker()]), patch.object(Nitric, "_handle", None):
+                # resources are declared, and create the channel, before the host application's loop is running
+                asyncio.set_event_loop(declaring_loop)
+                declared = ChannelManager.get_channel()
+
+                first, second = asyncio.run(embedded())
+        finally:
+            asyncio.set_event_loop(None)
+            declaring_loop.close()
+            server.close()
+
+        assert connected[0] is declared
+        assert first is not second
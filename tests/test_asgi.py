@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from unittest import IsolatedAsyncioTestCase
+
+import pytest
+
+from nitric.asgi import Lifespan, call_asgi, http_scope
+from nitric.proto.apis.v1 import HeaderValue, QueryValue
+from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class AsgiTest(IsolatedAsyncioTestCase):
+    def test_http_scope(self):
+        request = ProtoHttpRequest(
+            method="post",
+            path="/v1/app/items",
+            headers={
+                "Content-Type": HeaderValue(value=["text/plain"]),
+                "X-Forwarded-Proto": HeaderValue(value=["https"]),
+            },
+            query_params={"tag": QueryValue(value=["a", "b c"])},
+        )
+
+        scope = http_scope(request, "/v1/app", {"db": "connection"})
+
+        assert scope["type"] == "http"
+        assert scope["method"] == "POST"
+        assert scope["scheme"] == "https"
+        assert scope["path"] == "/v1/app/items"
+        assert scope["root_path"] == "/v1/app"
+        assert scope["query_string"] == b"tag=a&tag=b+c"
+        assert (b"content-type", b"text/plain") in scope["headers"]
+        assert scope["state"] == {"db": "connection"}
+
+    async def test_call_asgi_passes_the_body_without_copying(self):
+        body = b"x" * 1024
+        received = []
+
+        async def app(scope, receive, send):
+            message = await receive()
+            received.append(message["body"])
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 201,
+                    "headers": [(b"set-cookie", b"a"), (b"set-cookie", b"b")],
+                }
+            )
+            await send({"type": "http.response.body", "body": b"hello ", "more_body": True})
+            await send({"type": "http.response.body", "body": b"world"})
+            assert (await receive())["type"] == "http.disconnect"
+
+        response = await call_asgi(app, ProtoHttpRequest(method="POST", path="/", body=body), "")
+
+        assert received[0] is body
+        assert response.status == 201
+        assert response.body == b"hello world"
+        assert response.headers["set-cookie"].value == ["a", "b"]
+
+    async def test_call_asgi_requires_a_response(self):
+        async def app(scope, receive, send):
+            pass
+
+        with pytest.raises(RuntimeError):
+            await call_asgi(app, ProtoHttpRequest(method="GET", path="/"), "")
+
+    async def test_lifespan(self):
+        events = []
+
+        async def app(scope, receive, send):
+            assert scope["type"] == "lifespan"
+            while True:
+                message = await receive()
+                events.append(message["type"])
+                if message["type"] == "lifespan.startup":
+                    scope["state"]["ready"] = True
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        lifespan = Lifespan(app)
+        await lifespan.startup()
+        assert lifespan.state == {"ready": True}
+        await lifespan.shutdown()
+
+        assert events == ["lifespan.startup", "lifespan.shutdown"]
+
+    async def test_lifespan_unsupported(self):
+        async def app(scope, receive, send):
+            assert scope["type"] == "http"
+
+        lifespan = Lifespan(app)
+        await lifespan.startup()
+        await lifespan.shutdown()
+
+    async def test_lifespan_startup_failed(self):
+        async def app(scope, receive, send):
+            await receive()
+            await send({"type": "lifespan.startup.failed", "message": "no database"})
+
+        with pytest.raises(RuntimeError, match="no database"):
+            await Lifespan(app).startup()
@@ -0,0 +1,165 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import pytest
+from grpclib import GRPCError, Status
+
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class BoundedAsyncQueueTest(IsolatedAsyncioTestCase):
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            BoundedAsyncQueue(capacity=0)
+
+    async def test_items_are_returned_in_order(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue(capacity=3)
+        for i in range(3):
+            await queue.add_item(i)
+
+        assert queue.depth == 3
+        assert [await queue.__anext__() for _ in range(3)] == [0, 1, 2]
+        assert queue.depth == 0
+        assert queue.high_water_mark == 3
+
+    async def test_add_item_waits_when_full(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue(capacity=1)
+        await queue.add_item(1)
+
+        blocked = asyncio.ensure_future(queue.add_item(2))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        assert await queue.__anext__() == 1
+        await asyncio.wait_for(blocked, timeout=1)
+        assert await queue.__anext__() == 2
+        assert queue.high_water_mark == 1
+
+    async def test_consumer_waits_for_items(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue(capacity=2)
+
+        consumer = asyncio.ensure_future(queue.__anext__())
+        await asyncio.sleep(0)
+        assert not consumer.done()
+
+        await queue.add_item(7)
+        assert await asyncio.wait_for(consumer, timeout=1) == 7
+
+    async def test_close_ends_iteration_once_drained(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue(capacity=2)
+        await queue.add_item(1)
+        queue.close()
+
+        # items added after closing are discarded
+        await queue.add_item(2)
+
+        assert [item async for item in queue] == [1]
+
+    async def test_close_releases_blocked_producers(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue(capacity=1)
+        await queue.add_item(1)
+
+        blocked = asyncio.ensure_future(queue.add_item(2))
+        await asyncio.sleep(0)
+        queue.close()
+
+        await asyncio.wait_for(blocked, timeout=1)
+        assert list(queue.items) == [1]
+
+    async def test_flush_waits_for_the_consumer(self):
+        queue: BoundedAsyncQueue[int] = BoundedAsyncQueue()
+        await queue.flush()
+
+        await queue.add_item(1)
+        flushed = asyncio.ensure_future(queue.flush())
+        await asyncio.sleep(0)
+        assert not flushed.done()
+
+        await queue.__anext__()
+        await asyncio.wait_for(flushed, timeout=1)
+
+
+class StreamSupervisorTest(IsolatedAsyncioTestCase):
+    async def test_reopens_stream_until_stopped(self):
+        supervisor = StreamSupervisor("test-worker")
+        sessions = []
+
+        async def serve():
+            sessions.append(len(sessions))
+            supervisor.registered()
+            if len(sessions) == 1:
+                raise GRPCError(Status.UNAVAILABLE, "stream reset")
+            if len(sessions) == 3:
+                supervisor.stop()
+
+        with patch("nitric.bidi.asyncio.sleep") as mock_sleep:
+            await supervisor.run(serve)
+
+        assert sessions == [0, 1, 2]
+        assert supervisor.restarts == 2
+        assert mock_sleep.call_count == 2
+        assert supervisor.downtime >= 0
+
+    async def test_raises_when_server_never_reached(self):
+        supervisor = StreamSupervisor("test-worker")
+
+        async def serve():
+            raise ConnectionRefusedError("refused")
+
+        with pytest.raises(ConnectionRefusedError):
+            await supervisor.run(serve)
+
+        assert supervisor.restarts == 0
+
+    async def test_retries_refused_connections_after_first_registration(self):
+        supervisor = StreamSupervisor("test-worker")
+        attempts = []
+
+        async def serve():
+            attempts.append(1)
+            if len(attempts) == 1:
+                supervisor.registered()
+                return
+            if len(attempts) == 3:
+                supervisor.stop()
+            raise ConnectionRefusedError("refused")
+
+        with patch("nitric.bidi.asyncio.sleep"):
+            await supervisor.run(serve)
+
+        assert len(attempts) == 3
+        assert not supervisor.connected
+
+    def test_backoff_is_capped_and_jittered(self):
+        supervisor = StreamSupervisor("test-worker")
+
+        with patch("nitric.bidi.settings") as mock_settings:
+            mock_settings.STREAM_RECONNECT_INITIAL_BACKOFF = 1.0
+            mock_settings.STREAM_RECONNECT_MAX_BACKOFF = 4.0
+            delays = [supervisor._backoff() for _ in range(10)]
+
+        assert all(0 <= delay <= 4.0 for delay in delays)
+
+        supervisor.registered()
+        assert supervisor._attempt == 0
@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import dataclasses
+import datetime
+import decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from nitric.config import Settings, codecs
+from nitric.config.codecs import StdlibJsonCodec, json_codec, register_json_type, use_json_codec
+from nitric.context import HttpResponse
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+@dataclasses.dataclass
+class Order:
+    id: int
+    total: decimal.Decimal
+    placed: datetime.date
+
+
+class Money:
+    def __init__(self, cents: int):
+        self.cents = cents
+
+
+class JsonCodecTest(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, codecs, "_codec", codecs._codec)
+        self.addCleanup(codecs._type_encoders.pop, Money, None)
+
+    def test_stdlib_encodes_registered_types(self):
+        codec = use_json_codec("json")
+        register_json_type(Money, lambda money: money.cents / 100)
+
+        encoded = codec.dumps(
+            {"order": Order(1, decimal.Decimal("9.99"), datetime.date(2024, 1, 2)), "fee": Money(150)}
+        )
+
+        assert isinstance(encoded, bytes)
+        assert codec.loads(encoded) == {"order": {"id": 1, "total": "9.99", "placed": "2024-01-02"}, "fee": 1.5}
+
+    def test_stdlib_rejects_unknown_types(self):
+        with pytest.raises(TypeError):
+            use_json_codec("json").dumps(object())
+
+    def test_loads_views(self):
+        assert use_json_codec("json").loads(memoryview(b'{"a": [1]}')) == {"a": [1]}
+
+    def test_auto_falls_back_to_stdlib(self):
+        with patch("importlib.util.find_spec", return_value=None):
+            assert isinstance(use_json_codec("auto"), StdlibJsonCodec)
+            assert isinstance(use_json_codec("orjson"), StdlibJsonCodec)
+
+    def test_defaults_to_stdlib_when_optional_codecs_are_installed(self):
+        codecs._codec = None
+        with patch.dict("os.environ", clear=True), patch("importlib.util.find_spec", return_value=object()):
+            with patch.object(codecs, "settings", Settings()):
+                assert isinstance(json_codec(), StdlibJsonCodec)
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            use_json_codec("yaml")
+
+    def test_optional_codecs(self):
+        for name in ("orjson", "msgspec"):
+            if codecs.importlib.util.find_spec(name) is None:
+                continue
+            codec = use_json_codec(name)
+            assert codec.loads(codec.dumps({"placed": datetime.date(2024, 1, 2)})) == {"placed": "2024-01-02"}
+            with pytest.raises(ValueError):
+                codec.loads(b"not json")
+
+    def test_response_body_uses_the_codec(self):
+        use_json_codec("json")
+        response = HttpResponse()
+
+        response.body = {"total": decimal.Decimal("1.50")}
+
+        assert json_codec().loads(response.body) == {"total": "1.50"}
+        assert response.headers["Content-Type"] == ["application/json"]
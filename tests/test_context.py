@@ -0,0 +1,183 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from nitric import executor
+from nitric.config import settings
+from nitric.context import HttpContext, HttpRequest, compose_middleware
+from nitric.executor import HandlerExecutor
+from nitric.proto.apis.v1 import HeaderValue, QueryValue
+from nitric.proto.apis.v1 import HttpRequest as ProtoHttpRequest
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+def _ctx() -> HttpContext:
+    return HttpContext(HttpRequest(data=b"", method="GET", path="/", params={}, query={}, headers={}))
+
+
+class ComposeMiddlewareTest(IsolatedAsyncioTestCase):
+    async def test_async_middleware_chain(self):
+        calls = []
+
+        async def first(ctx, nxt):
+            calls.append("first")
+            return await nxt(ctx)
+
+        async def handler(ctx):
+            calls.append("handler")
+            ctx.res.status = 201
+            return ctx
+
+        ctx = await compose_middleware(first, handler)(_ctx())
+
+        assert calls == ["first", "handler"]
+        assert ctx.res.status == 201
+
+    async def test_handler_returning_none_keeps_context(self):
+        async def handler(ctx):
+            ctx.res.status = 204
+
+        ctx = _ctx()
+        assert await compose_middleware(handler)(ctx) is ctx
+        assert ctx.res.status == 204
+
+    async def test_sync_handler_runs_on_thread_pool(self):
+        loop_thread = threading.get_ident()
+        handler_threads = []
+
+        def handler(ctx):
+            handler_threads.append(threading.get_ident())
+            ctx.res.status = 202
+            return ctx
+
+        ctx = await compose_middleware(handler)(_ctx())
+
+        assert ctx.res.status == 202
+        assert handler_threads and handler_threads[0] != loop_thread
+
+    async def test_sync_middleware_can_call_async_next(self):
+        calls = []
+
+        def sync_middleware(ctx, nxt):
+            calls.append("sync")
+            return nxt(ctx)
+
+        async def handler(ctx):
+            calls.append("async")
+            ctx.res.status = 200
+            return ctx
+
+        ctx = await compose_middleware(sync_middleware, handler)(_ctx())
+
+        assert calls == ["sync", "async"]
+        assert ctx.res.status == 200
+
+    async def test_sync_middleware_and_handler_fill_the_pool(self):
+        def sync_middleware(ctx, nxt):
+            return nxt(ctx)
+
+        def handler(ctx):
+            ctx.res.status = 201
+
+        for pool_size in (1, 4):
+            with patch.object(settings, "THREAD_POOL_SIZE", pool_size), patch(
+                "nitric.context.handler_executor", HandlerExecutor()
+            ), patch("nitric.executor._middleware_executors", []):
+                # nested synchronous middleware each hold a thread while the rest of their chain runs
+                chain = compose_middleware(sync_middleware, sync_middleware, handler)
+                requests = [chain(_ctx()) for _ in range(pool_size)]
+                results = await asyncio.wait_for(asyncio.gather(*requests), 5)
+
+                assert [pool.max_workers for pool in executor._middleware_executors] == [pool_size] * 2
+
+            assert [ctx.res.status for ctx in results] == [201] * pool_size
+
+    async def test_chain_is_reused_across_calls(self):
+        seen_next = []
+
+        async def middleware(ctx, nxt):
+            seen_next.append(nxt)
+            return await nxt(ctx)
+
+        async def handler(ctx):
+            return ctx
+
+        composed = compose_middleware(middleware, handler)
+        await composed(_ctx())
+        await composed(_ctx())
+
+        assert len(seen_next) == 2
+        assert seen_next[0] is seen_next[1]
+
+    async def test_chain_ends_with_the_next_middleware_passed_in(self):
+        calls = []
+
+        async def middleware(ctx, nxt):
+            calls.append("middleware")
+            return await nxt(ctx)
+
+        async def tail(ctx):
+            calls.append("tail")
+            ctx.res.status = 418
+            return ctx
+
+        ctx = await compose_middleware(middleware)(_ctx(), tail)
+
+        assert calls == ["middleware", "tail"]
+        assert ctx.res.status == 418
+
+    async def test_empty_chain_returns_the_context(self):
+        ctx = _ctx()
+        assert await compose_middleware()(ctx) is ctx
+
+
+class HttpRequestTest(IsolatedAsyncioTestCase):
+    def test_translates_the_proto_lazily(self):
+        msg = ProtoHttpRequest(
+            method="GET",
+            path="/customers/1",
+            headers={"Accept": HeaderValue(value=["text/plain"])},
+            query_params={"page": QueryValue(value=["2"])},
+            path_params={"id": "1"},
+        )
+
+        request = HttpRequest._from_proto(msg)
+
+        assert request._headers is None and request._query is None and request._params is None
+        assert request.headers == {"Accept": ["text/plain"]}
+        assert request.query == {"page": ["2"]}
+        assert request.params == {"id": "1"}
+        assert request.headers is request.headers
+
+    def test_caches_decoded_body(self):
+        request = HttpRequest(data=b'{"name": "nitric"}', method="POST", path="/")
+
+        assert request.json == {"name": "nitric"}
+        assert request.json is request.json
+        assert request.body is request.body
+        assert request.data_view.obj is request.data
+
+        request.data = b"not json"
+        assert request.body == "not json"
+        assert request.json is None
+        assert request.headers == {}
@@ -0,0 +1,365 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import math
+import random
+from unittest import IsolatedAsyncioTestCase
+
+import pytest
+
+from nitric.bidi import BoundedAsyncQueue, StreamSupervisor
+from nitric.dispatch import AdaptiveLimiter, Dispatcher, KeyedDispatcher, LimiterClient, drain, run_handler
+from nitric.exception import HandlerTimeoutException
+from nitric.metrics import handler_timeouts
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class DispatcherTest(IsolatedAsyncioTestCase):
+    def test_invalid_max_in_flight(self):
+        with pytest.raises(ValueError):
+            Dispatcher(max_in_flight=0)
+
+    async def test_runs_up_to_max_in_flight_concurrently(self):
+        dispatcher = Dispatcher(max_in_flight=2)
+        release = asyncio.Event()
+        started = []
+
+        async def handler(n: int):
+            started.append(n)
+            await release.wait()
+
+        await dispatcher.submit(handler, 1)
+        await dispatcher.submit(handler, 2)
+        await asyncio.sleep(0)
+
+        assert started == [1, 2]
+        assert dispatcher.in_flight == 2
+
+        # a third submission must wait for a free slot
+        third = asyncio.ensure_future(dispatcher.submit(handler, 3))
+        await asyncio.sleep(0)
+        assert not third.done()
+
+        release.set()
+        await third
+        await dispatcher.join()
+
+        assert started == [1, 2, 3]
+        assert dispatcher.in_flight == 0
+
+    async def test_handler_errors_release_slot(self):
+        dispatcher = Dispatcher(max_in_flight=1)
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        await dispatcher.submit(failing)
+        await dispatcher.join()
+
+        # the slot was released, so this would block forever otherwise
+        await asyncio.wait_for(dispatcher.submit(failing), timeout=1)
+        await dispatcher.join()
+
+
+class KeyedDispatcherTest(IsolatedAsyncioTestCase):
+    async def test_same_key_runs_in_order(self):
+        dispatcher = KeyedDispatcher(max_in_flight=4)
+        events = []
+
+        async def handler(key: str, n: int):
+            events.append(f"start {key}{n}")
+            await asyncio.sleep(0.01 if n == 1 else 0)
+            events.append(f"end {key}{n}")
+
+        await dispatcher.submit_keyed("a", handler, "a", 1)
+        await dispatcher.submit_keyed("a", handler, "a", 2)
+        await dispatcher.submit_keyed("b", handler, "b", 1)
+
+        assert dispatcher.lanes == 2
+        assert dispatcher.in_flight == 3
+
+        await dispatcher.join()
+
+        # a2 never starts before a1 ends, but b1 runs alongside a1
+        assert events.index("end a1") < events.index("start a2")
+        assert events.index("start b1") < events.index("end a1")
+        assert dispatcher.lanes == 0
+        assert dispatcher.in_flight == 0
+
+    async def test_queued_invocations_count_towards_limit(self):
+        dispatcher = KeyedDispatcher(max_in_flight=2)
+        release = asyncio.Event()
+
+        async def handler():
+            await release.wait()
+
+        await dispatcher.submit_keyed("a", handler)
+        await dispatcher.submit_keyed("a", handler)
+
+        blocked = asyncio.ensure_future(dispatcher.submit_keyed("b", handler))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        release.set()
+        await blocked
+        await dispatcher.join()
+
+    async def test_none_key_is_unordered(self):
+        dispatcher = KeyedDispatcher(max_in_flight=2)
+        release = asyncio.Event()
+        started = []
+
+        async def handler(n: int):
+            started.append(n)
+            await release.wait()
+
+        await dispatcher.submit_keyed(None, handler, 1)
+        await dispatcher.submit_keyed(None, handler, 2)
+        await asyncio.sleep(0)
+
+        assert started == [1, 2]
+        assert dispatcher.lanes == 0
+
+        release.set()
+        await dispatcher.join()
+
+
+class AdaptiveLimiterTest(IsolatedAsyncioTestCase):
+    def test_invalid_limits(self):
+        with pytest.raises(ValueError):
+            AdaptiveLimiter(initial_limit=5, min_limit=10)
+
+    @staticmethod
+    def _complete_saturated(limiter: AdaptiveLimiter, client: LimiterClient, latency: float) -> None:
+        # complete an invocation while the whole limit is in use
+        while limiter.in_flight < limiter.limit:
+            limiter._admit(client)
+        limiter.release(client, latency)
+
+    def test_decreases_while_saturated_and_slow(self):
+        limiter = AdaptiveLimiter(initial_limit=10, max_limit=10)
+        client = limiter.client("worker")
+        for _ in range(10):
+            self._complete_saturated(limiter, client, 0.01)
+        assert limiter.limit == 10
+
+        # a single slow invocation isn't overload
+        self._complete_saturated(limiter, client, 0.1)
+        assert limiter.limit == 10
+
+        self._complete_saturated(limiter, client, 1.0)
+        assert limiter.limit == 9
+
+        # and it backs off at most once per limit's worth of invocations
+        for _ in range(8):
+            self._complete_saturated(limiter, client, 1.0)
+        assert limiter.limit == 9
+
+        for _ in range(40):
+            self._complete_saturated(limiter, client, 1.0)
+        assert limiter.limit == 5
+
+    def test_ignores_slow_invocations_when_the_limit_is_not_in_use(self):
+        limiter = AdaptiveLimiter(initial_limit=10)
+        client = limiter.client("worker")
+        for latency in [0.01] * 10 + [1.0] * 50:
+            limiter._admit(client)
+            limiter.release(client, latency)
+
+        assert limiter.limit == 10
+
+    def test_judges_latency_per_client(self):
+        limiter = AdaptiveLimiter(initial_limit=20, max_limit=20)
+        fast = limiter.client("fast")
+        slow = limiter.client("slow")
+        for _ in range(100):
+            self._complete_saturated(limiter, fast, 0.002)
+            self._complete_saturated(limiter, slow, 0.05)
+
+        assert limiter.limit == 20
+
+        for _ in range(20):
+            self._complete_saturated(limiter, fast, 0.05)
+
+        assert limiter.limit < 20
+
+    def test_noisy_healthy_latencies_dont_reduce_the_limit(self):
+        rng = random.Random(7)
+        for saturated in (False, True):
+            limiter = AdaptiveLimiter(initial_limit=20)
+            client = limiter.client("worker")
+            for _ in range(2000):
+                latency = rng.lognormvariate(math.log(0.01), 0.4)
+                if saturated:
+                    self._complete_saturated(limiter, client, latency)
+                else:
+                    limiter._admit(client)
+                    limiter.release(client, latency)
+
+            assert limiter.limit >= 20
+
+    def test_increases_while_saturated(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=3)
+        client = limiter.client("worker")
+        for _ in range(10):
+            limiter._admit(client)
+            limiter._admit(client)
+            limiter.release(client, 0.01)
+            limiter.release(client, 0.01)
+
+        assert limiter.limit == 3
+
+    async def test_shared_across_dispatchers(self):
+        limiter = AdaptiveLimiter(initial_limit=1)
+        first = Dispatcher(max_in_flight=5, name="first", adaptive_limiter=limiter)
+        second = Dispatcher(max_in_flight=5, name="second", adaptive_limiter=limiter)
+        release = asyncio.Event()
+        started = []
+
+        async def handler(name):
+            started.append(name)
+            await release.wait()
+
+        await first.submit(handler, "first")
+        await second.submit(handler, "second")
+        await asyncio.sleep(0.01)
+
+        assert started == ["first"]
+        assert limiter.in_flight == 1
+
+        release.set()
+        await first.join()
+        await second.join()
+
+        assert started == ["first", "second"]
+        assert limiter.in_flight == 0
+
+    async def test_reserved_slots_are_kept_for_their_client(self):
+        limiter = AdaptiveLimiter(initial_limit=3)
+        critical = limiter.client("critical", reserved=1)
+        other = limiter.client("other")
+
+        await limiter.acquire(other)
+        await limiter.acquire(other)
+        blocked = asyncio.ensure_future(limiter.acquire(other))
+        await asyncio.sleep(0)
+
+        assert not blocked.done()
+
+        await asyncio.wait_for(limiter.acquire(critical), 1)
+        assert critical.in_flight == 1
+
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+        assert limiter._waiters == []
+
+    async def test_freed_slots_go_to_the_least_loaded_weighted_client(self):
+        limiter = AdaptiveLimiter(initial_limit=4)
+        heavy = limiter.client("heavy", weight=3)
+        light = limiter.client("light")
+        for _ in range(2):
+            await limiter.acquire(heavy)
+            await limiter.acquire(light)
+
+        waiting_light = asyncio.ensure_future(limiter.acquire(light))
+        waiting_heavy = asyncio.ensure_future(limiter.acquire(heavy))
+        await asyncio.sleep(0)
+
+        limiter.release(light, 0.01)
+        await asyncio.sleep(0)
+
+        # heavy has 2/3 in flight for its weight, light would have 1/1
+        assert waiting_heavy.done()
+        assert not waiting_light.done()
+
+        waiting_light.cancel()
+
+
+class RunHandlerTest(IsolatedAsyncioTestCase):
+    async def test_returns_handler_result(self):
+        async def handler(ctx):
+            return ctx * 2
+
+        assert await run_handler(handler, 2, None, "test-handler") == 4
+        assert await run_handler(handler, 2, 1, "test-handler") == 4
+
+    async def test_cancels_and_counts_timeouts(self):
+        cancelled = asyncio.Event()
+
+        async def handler(ctx):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        before = handler_timeouts.get("test-slow-handler")
+        with pytest.raises(HandlerTimeoutException) as e:
+            await run_handler(handler, None, 0.01, "test-slow-handler")
+
+        assert e.value.handler == "test-slow-handler"
+        assert cancelled.is_set()
+        assert handler_timeouts.get("test-slow-handler") == before + 1
+
+    async def test_timeout_errors_from_the_handler_are_not_counted(self):
+        async def handler(ctx):
+            raise TimeoutError("downstream")
+
+        with pytest.raises(TimeoutError):
+            await run_handler(handler, None, 1, "test-raising-handler")
+
+        assert handler_timeouts.get("test-raising-handler") == 0
+
+
+class DrainTest(IsolatedAsyncioTestCase):
+    async def test_waits_for_in_flight_invocations_and_responses(self):
+        supervisor = StreamSupervisor("worker")
+        dispatcher = Dispatcher(max_in_flight=2)
+        responses: BoundedAsyncQueue[str] = BoundedAsyncQueue()
+        sent = []
+
+        async def handler(name):
+            await asyncio.sleep(0.01)
+            await responses.add_item(name)
+
+        async def sender():
+            async for response in responses:
+                sent.append(response)
+
+        sending = asyncio.ensure_future(sender())
+        await dispatcher.submit(handler, "a")
+        await dispatcher.submit(handler, "b")
+        await drain(supervisor, dispatcher, responses, grace_period=1)
+
+        assert supervisor.stopped
+        assert sorted(sent) == ["a", "b"]
+        assert responses.closed
+        await asyncio.wait_for(sending, 1)
+
+    async def test_gives_up_after_the_grace_period(self):
+        dispatcher = Dispatcher()
+        responses: BoundedAsyncQueue[str] = BoundedAsyncQueue()
+
+        await dispatcher.submit(asyncio.sleep, 10)
+        await drain(StreamSupervisor("worker"), dispatcher, responses, grace_period=0.01)
+
+        assert dispatcher.in_flight == 1
+        assert responses.closed
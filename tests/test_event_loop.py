@@ -0,0 +1,91 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import socket
+import sys
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import pytest
+
+from nitric.application import Nitric
+from nitric.channel import ChannelManager
+from nitric.config import settings
+from nitric.event_loop import resolve_loop_factory
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class ResolveLoopFactoryTest(TestCase):
+    def test_asyncio_uses_the_default_loop(self):
+        assert resolve_loop_factory("asyncio") is None
+
+    def test_uvloop_falls_back_when_not_installed(self):
+        with patch.dict(sys.modules, {"uvloop": None}):
+            assert resolve_loop_factory("uvloop") is None
+
+    def test_uvloop(self):
+        uvloop = Mock()
+        with patch.dict(sys.modules, {"uvloop": uvloop}):
+            assert resolve_loop_factory("uvloop") is uvloop.new_event_loop
+
+    def test_factory_by_path(self):
+        assert resolve_loop_factory("asyncio:new_event_loop") is asyncio.new_event_loop
+
+    def test_unknown_loop(self):
+        with pytest.raises(ValueError):
+            resolve_loop_factory("tokio")
+
+
+class RunWithLoopFactoryTest(TestCase):
+    def test_runs_workers_on_a_loop_from_the_factory_with_the_declared_channel(self):
+        # a listening socket accepts the channel's connection into its backlog, without serving it
+        server = socket.create_server(("127.0.0.1", 0))
+        host, port = server.getsockname()
+        declaring_loop = asyncio.new_event_loop()
+        loop = asyncio.new_event_loop()
+        factory = Mock(return_value=loop)
+        connected = []
+
+        class Worker:
+            async def start(self):
+                channel = ChannelManager.get_channel()
+                await channel.__connect__()
+                connected.append((channel, asyncio.get_running_loop()))
+
+        try:
+            with patch.object(settings, "SERVICE_ADDRESS", f"{host}:{port}"), patch.object(
+                ChannelManager, "channel", None
+            ):
+                # resources are declared, and create the channel, before Nitric.run()
+                asyncio.set_event_loop(declaring_loop)
+                declared = ChannelManager.get_channel()
+
+                with patch.object(Nitric, "_workers", [Worker()]), patch.object(Nitric, "_has_run", False):
+                    Nitric.run(loop_factory=factory)
+                declared.close()
+        finally:
+            Nitric._loop_factory = None
+            asyncio.set_event_loop(None)
+            loop.close()
+            declaring_loop.close()
+            server.close()
+
+        factory.assert_called_once()
+        assert connected == [(declared, loop)]
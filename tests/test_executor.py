@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+
+import pytest
+
+from nitric.executor import HandlerExecutor
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class HandlerExecutorTest(IsolatedAsyncioTestCase):
+    def test_invalid_max_workers(self):
+        with pytest.raises(ValueError):
+            HandlerExecutor(max_workers=0)
+
+    async def test_runs_off_the_event_loop_thread(self):
+        executor = HandlerExecutor(max_workers=2)
+        loop_thread = threading.get_ident()
+
+        result = await executor.run(lambda x: (x, threading.get_ident()), 5)
+
+        assert result[0] == 5
+        assert result[1] != loop_thread
+        assert executor.completed == 1
+        executor.shutdown()
+
+    async def test_tracks_utilisation(self):
+        executor = HandlerExecutor(max_workers=2)
+        release = threading.Event()
+
+        running = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0)
+
+        assert executor.active == 1
+        assert executor.utilisation == 0.5
+
+        release.set()
+        await running
+        assert executor.utilisation == 0
+        executor.shutdown()
@@ -0,0 +1,244 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import gzip
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import pytest
+
+from nitric.context import HttpContext, HttpRequest, compose_middleware
+from nitric.middleware import ResponseCache, cache, compression, negotiate_encoding
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+LISTING = b'{"items": [' + b",".join(b'{"id": %d, "name": "item"}' % i for i in range(100)) + b"]}"
+
+
+def _ctx(accept_encoding=None) -> HttpContext:
+    headers = {"accept-encoding": [accept_encoding]} if accept_encoding else {}
+    return HttpContext(HttpRequest(data=b"", method="GET", path="/items", headers=headers))
+
+
+def _respond(body: bytes = LISTING, content_type: str = "application/json; charset=utf-8"):
+    async def handler(ctx: HttpContext) -> HttpContext:
+        ctx.res.body = body
+        ctx.res.headers["Content-Type"] = [content_type]
+        return ctx
+
+    return handler
+
+
+class NegotiateEncodingTest(IsolatedAsyncioTestCase):
+    def test_prefers_highest_quality(self):
+        assert negotiate_encoding("gzip;q=0.5, br", ["zstd", "br", "gzip"]) == "br"
+
+    def test_breaks_ties_by_preference(self):
+        assert negotiate_encoding("gzip, br", ["br", "gzip"]) == "br"
+
+    def test_wildcard_and_refusals(self):
+        assert negotiate_encoding("*;q=0.1, gzip;q=0", ["gzip", "br"]) == "br"
+        assert negotiate_encoding("identity", ["gzip"]) is None
+        assert negotiate_encoding(None, ["gzip"]) is None
+
+
+class CompressionTest(IsolatedAsyncioTestCase):
+    async def test_compresses_accepted_responses(self):
+        chain = compose_middleware(compression(encodings=["gzip"]), _respond())
+
+        ctx = await chain(_ctx("gzip, deflate"))
+
+        assert ctx.res.headers["Content-Encoding"] == ["gzip"]
+        assert ctx.res.headers["Vary"] == ["Accept-Encoding"]
+        assert gzip.decompress(ctx.res.body) == LISTING
+
+    async def test_skips_small_and_uncompressible_responses(self):
+        small = await compose_middleware(compression(), _respond(b"{}"))(_ctx("gzip"))
+        image = await compose_middleware(compression(), _respond(content_type="image/png"))(_ctx("gzip"))
+
+        assert small.res.body == b"{}"
+        assert image.res.body == LISTING
+        assert "Content-Encoding" not in small.res.headers
+        assert "Content-Encoding" not in image.res.headers
+
+    async def test_varies_when_not_accepted(self):
+        ctx = await compose_middleware(compression(), _respond())(_ctx())
+
+        assert ctx.res.body == LISTING
+        assert ctx.res.headers["Vary"] == ["Accept-Encoding"]
+
+    async def test_offloads_large_bodies(self):
+        chain = compose_middleware(compression(encodings=["gzip"], offload_size=len(LISTING)), _respond())
+
+        with patch("nitric.middleware.handler_executor.run", side_effect=lambda fn, data: fn(data)) as run:
+            ctx = await chain(_ctx("gzip"))
+
+        run.assert_called_once()
+        assert gzip.decompress(ctx.res.body) == LISTING
+
+    def test_rejects_unavailable_encodings(self):
+        with pytest.raises(ValueError):
+            compression(encodings=["lzma"])
+
+
+class CacheTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store = ResponseCache(max_entries=2)
+        self.calls = 0
+
+    def _chain(self, response_headers=None, **kwargs):
+        async def handler(ctx: HttpContext) -> HttpContext:
+            self.calls += 1
+            await asyncio.sleep(0)
+            ctx.res.body = f"{ctx.req.path} {self.calls}"
+            ctx.res.headers.update(response_headers or {})
+            return ctx
+
+        return compose_middleware(cache(store=self.store, **kwargs), handler)
+
+    @staticmethod
+    def _request(path="/items", method="GET", query=None, headers=None) -> HttpContext:
+        return HttpContext(HttpRequest(data=b"", method=method, path=path, query=query or {}, headers=headers or {}))
+
+    async def test_serves_hits_without_the_handler(self):
+        chain = self._chain(ttl=60)
+
+        first = await chain(self._request(query={"page": ["1"]}))
+        second = await chain(self._request(query={"page": ["1"]}))
+        other = await chain(self._request(query={"page": ["2"]}))
+
+        assert second.res.body == first.res.body == b"/items 1"
+        assert second.res.headers["Age"] == ["0"]
+        assert other.res.body == b"/items 2"
+        assert (self.store.hits, self.store.misses) == (1, 2)
+
+    async def test_skips_other_methods(self):
+        chain = self._chain(ttl=60)
+
+        await chain(self._request(method="POST"))
+        await chain(self._request(method="POST"))
+
+        assert self.calls == 2
+        assert len(self.store) == 0
+
+    async def test_keys_on_vary_headers(self):
+        chain = self._chain(ttl=60, vary=["Accept-Language"])
+
+        english = await chain(self._request(headers={"Accept-Language": ["en"]}))
+        french = await chain(self._request(headers={"accept-language": ["fr"]}))
+
+        assert english.res.body != french.res.body
+
+    async def test_honours_cache_control(self):
+        await self._chain(ttl=60, response_headers={"Cache-Control": "no-store"})(self._request("/a"))
+        await self._chain(ttl=60, response_headers={"Cache-Control": "private, max-age=60"})(self._request("/b"))
+        await self._chain(ttl=60, response_headers={"Cache-Control": "max-age=0"})(self._request("/c"))
+        await self._chain(ttl=60, response_headers={"Vary": "Accept-Encoding"})(self._request("/d"))
+        await self._chain(ttl=0, response_headers={"Cache-Control": "public, s-maxage=60"})(self._request("/e"))
+
+        assert len(self.store) == 1
+        assert self.store.get(("GET", None, "/e", (), None, ())) is not None
+
+    async def test_expires_entries(self):
+        chain = self._chain(ttl=60, response_headers={"Cache-Control": "max-age=0.01"})
+
+        await chain(self._request())
+        await asyncio.sleep(0.02)
+        await chain(self._request())
+
+        assert self.calls == 2
+
+    async def test_evicts_least_recently_used(self):
+        chain = self._chain(ttl=60)
+
+        await chain(self._request("/a"))
+        await chain(self._request("/b"))
+        await chain(self._request("/a"))
+        await chain(self._request("/c"))
+        await chain(self._request("/a"))
+        await chain(self._request("/b"))
+
+        assert self.calls == 4
+
+    async def test_invalidates_by_tag(self):
+        chain = self._chain(ttl=60, tags=lambda ctx: ["items", ctx.req.path])
+
+        await chain(self._request("/a"))
+        await chain(self._request("/b"))
+
+        assert self.store.invalidate("/a") == 1
+        assert len(self.store) == 1
+        assert self.store.invalidate("items") == 1
+        assert len(self.store) == 0
+
+    async def test_coalesces_concurrent_misses(self):
+        chain = self._chain(ttl=60)
+
+        responses = await asyncio.gather(*(chain(self._request()) for _ in range(3)))
+
+        assert self.calls == 1
+        assert {ctx.res.body for ctx in responses} == {b"/items 1"}
+
+    async def test_caches_are_separate_by_default(self):
+        async def items(ctx: HttpContext) -> HttpContext:
+            ctx.res.body = "items"
+            return ctx
+
+        async def orders(ctx: HttpContext) -> HttpContext:
+            ctx.res.body = "orders"
+            return ctx
+
+        first = compose_middleware(cache(ttl=60), items)
+        second = compose_middleware(cache(ttl=60), orders)
+
+        assert (await first(self._request())).res.body == b"items"
+        assert (await second(self._request())).res.body == b"orders"
+
+    async def test_shared_stores_key_by_host(self):
+        chain = self._chain(ttl=60)
+
+        first = await chain(self._request(headers={"Host": "a.example.com"}))
+        second = await chain(self._request(headers={"Host": "b.example.com"}))
+
+        assert (first.res.body, second.res.body) == (b"/items 1", b"/items 2")
+
+    async def test_doesnt_share_responses_to_authorized_requests(self):
+        chain = self._chain(ttl=60)
+
+        alice = await chain(self._request(headers={"Authorization": "Bearer alice"}))
+        bob = await chain(self._request(headers={"Authorization": "Bearer bob"}))
+
+        assert (alice.res.body, bob.res.body) == (b"/items 1", b"/items 2")
+        assert len(self.store) == 0
+
+        # unless the response says it can be
+        public = self._chain(ttl=60, response_headers={"Cache-Control": "public"})
+        await public(self._request(headers={"Authorization": "Bearer alice"}))
+        shared = await public(self._request(headers={"Authorization": "Bearer bob"}))
+
+        assert shared.res.body == b"/items 3"
+
+    async def test_keys_by_cookie(self):
+        chain = self._chain(ttl=60)
+
+        alice = await chain(self._request(headers={"Cookie": "session=alice"}))
+        bob = await chain(self._request(headers={"Cookie": "session=bob"}))
+        again = await chain(self._request(headers={"Cookie": "session=alice"}))
+
+        assert (alice.res.body, bob.res.body, again.res.body) == (b"/items 1", b"/items 2", b"/items 1")
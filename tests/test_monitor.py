@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+
+import pytest
+
+from nitric.dispatch import Dispatcher
+from nitric.metrics import loop_blocked, loop_lag
+from nitric.monitor import LoopLagMonitor
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+def blocking_handler() -> None:
+    time.sleep(0.2)
+
+
+class LoopLagMonitorTest(IsolatedAsyncioTestCase):
+    def test_invalid_threshold(self):
+        with pytest.raises(ValueError):
+            LoopLagMonitor(interval=0.1, threshold=0)
+
+    async def test_attributes_blocking_to_the_dispatched_handler(self):
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        dispatcher = Dispatcher(name="api test GET /blocking")
+
+        async def handler():
+            blocking_handler()
+
+        monitor.start()
+        try:
+            with self.assertLogs(level="WARNING") as logs:
+                await asyncio.sleep(0.05)
+                await dispatcher.submit(handler)
+                await dispatcher.join()
+                # let the heartbeat record the lag
+                await asyncio.sleep(0.05)
+        finally:
+            monitor.stop()
+
+        assert loop_blocked.get("api test GET /blocking") == 1
+        assert loop_lag.count("api test GET /blocking") == 1
+        assert loop_lag.maximum("api test GET /blocking") > 0.1
+        # asyncio's debug mode also logs the slow callback
+        [message] = [output for output in logs.output if "event loop has been blocked" in output]
+        assert "api test GET /blocking" in message
+        assert "blocking_handler" in message
+
+    async def test_stop_ends_the_heartbeat(self):
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        monitor.stop()
+        await asyncio.sleep(0)
+
+        assert monitor._heartbeat is not None and monitor._heartbeat.cancelled()
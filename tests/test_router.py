@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2021 Nitric Technologies Pty Ltd.
+#
+# This file is part of Nitric Python 3 SDK.
+# See https://github.com/nitrictech/python-sdk for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from unittest import TestCase
+
+import pytest
+
+from nitric.router import Router
+
+# pylint: disable=protected-access,missing-function-docstring,missing-class-docstring
+
+
+class RouterTest(TestCase):
+    def setUp(self):
+        self.router: Router[str] = Router()
+        self.router.add("/customers", ["GET", "POST"], "customers")
+        self.router.add("/customers/:id", ["GET"], "customer")
+        self.router.add("/customers/:id/orders/:order", ["GET"], "order")
+        self.router.add("/customers/me", ["GET"], "me")
+
+    def test_matches_static_paths(self):
+        match = self.router.match("POST", "/customers")
+
+        assert match is not None
+        assert match.value == "customers"
+        assert match.params == {}
+        assert match.allowed == ["GET", "POST"]
+
+    def test_captures_params(self):
+        match = self.router.match("GET", "/customers/42/orders/7")
+
+        assert match is not None
+        assert match.value == "order"
+        assert match.params == {"id": "42", "order": "7"}
+
+    def test_static_segments_take_priority(self):
+        assert self.router.match("GET", "/customers/me").value == "me"
+        assert self.router.match("GET", "/customers/you").value == "customer"
+
+    def test_ignores_trailing_slashes(self):
+        assert self.router.match("GET", "/customers/42/").value == "customer"
+
+    def test_unregistered_method(self):
+        match = self.router.match("DELETE", "/customers/42")
+
+        assert match is not None
+        assert match.value is None
+        assert match.allowed == ["GET"]
+
+    def test_unknown_path(self):
+        assert self.router.match("GET", "/orders") is None
+        assert self.router.match("GET", "/customers/42/orders") is None
+
+    def test_conflicting_registrations(self):
+        with pytest.raises(ValueError):
+            self.router.add("/customers/:id", ["GET"], "again")
+        with pytest.raises(ValueError):
+            self.router.add("/customers/:name/profile", ["GET"], "profile")